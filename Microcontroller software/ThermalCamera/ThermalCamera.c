@@ -7,6 +7,9 @@
 #define MLX_OBJ_TEMP_ADDRESS	0x07	// Internal address of thermal sensor that contains object temperature
 #define MLX_AMB_TEMP_ADDRESS	0x06	// Internal address of thermal sensor that contains ambient temperature
 
+#define BINARY_LINE_START		'!'		// Start sign of binary scan line
+#define SCAN_MAX_RESOLUTION		128		// Size of scan line buffer (higher grids are sent as text data-points)
+
 #include "ThermalCamera.h"
 
 static inline bool readMLX(uint8_t address, uint16_t *temperature, uint8_t *pec);
@@ -19,14 +22,18 @@ static inline bool parse_rel_pos(uint8_t *command);
 static inline bool parse_servo_pos(uint8_t *command, uint8_t servoNr);
 static inline bool parse_csv_u16(uint8_t *char_array, uint8_t start, uint8_t length, uint8_t count, uint16_t *values);
 static inline bool parse_temp(uint8_t *command);
+static inline bool parse_protocol(uint8_t *command);
+static inline bool parse_scan(uint8_t *command);
+static inline bool parse_grid(uint8_t *command);
 
-static inline void send_datapoint( uint8_t posX, uint8_t posY, uint16_t temp);
+static inline void send_datapoint( uint16_t posX, uint16_t posY, uint16_t temp);
+static inline void send_scan_line( uint8_t posX, uint16_t *values, uint8_t count);
 
 static inline uint16_t getServoValue(uint8_t servoNr);
 static inline void setServoValue(uint8_t servoNr, uint16_t servoValue);
 
 static inline void scanStep();
-static inline void scanInit();
+static inline void scanInit(uint16_t x0, uint16_t y0, uint16_t x1, uint16_t y1, uint16_t stride);
 static inline void scanMoveServos();
 
 static inline void hardware_setup();
@@ -52,11 +59,23 @@ uint16_t scanCounter = 0;	//counter for timing
 bool scanning = false;	//Current scanning state
 bool scanInitialisation = false;	//True if scanning is about to begin (Servos are moving to starting position)
 //Current position
-uint8_t scanPosX = 0;				
-uint8_t scanPosY = 0;
+uint16_t scanPosX = 0;				
+uint16_t scanPosY = 0;
 
 uint8_t scanStepSize = 3;	// Step size
-uint8_t scanResolution = 64;	// scanning resolution
+uint16_t scanWidth = 64;	// scanning resolution (grid width - servo A)
+uint16_t scanHeight = 64;	// scanning resolution (grid height - servo B)
+
+//Scanned window (grid positions, inclusive) and step between scanned positions
+uint16_t scanX0 = 0;
+uint16_t scanY0 = 0;
+uint16_t scanX1 = 63;
+uint16_t scanY1 = 63;
+uint16_t scanStride = 1;
+bool scanLines = false;	// true if scan is sent as binary lines (binary protocol and whole columns are scanned)
+
+bool binaryProtocol = false;	// if true, scan data is sent as binary lines instead of text data-points
+uint16_t scanLine[SCAN_MAX_RESOLUTION];	// readings of current scan line (binary protocol)
 
 int main(void)
 {
@@ -116,13 +135,22 @@ int main(void)
 	}
 }
 
-static inline void scanInit(){
+static inline void scanInit(uint16_t x0, uint16_t y0, uint16_t x1, uint16_t y1, uint16_t stride){
+	scanX0 = x0;
+	scanY0 = y0;
+	scanX1 = x1;
+	scanY1 = y0 + (y1-y0)/stride*stride;	// last position that is reached
+	scanStride = stride;
+	// Binary lines always start from y=0 and have one value for every position
+	scanLines = binaryProtocol && y0 == 0 && y1 == scanHeight-1 && stride == 1
+		&& scanHeight <= SCAN_MAX_RESOLUTION && scanWidth <= 256;
+	
 	scanning = true;
 	scanInitialisation = true;
 	scanCounter = 0;
 	scanServoDir = 1;
-	scanPosX = 0;
-	scanPosY = 0;
+	scanPosX = x0;
+	scanPosY = y0;
 	scanMoveServos();
 }
 
@@ -132,32 +160,44 @@ static inline void scanStep(){
 	
 	//Take a reading
 	if(readMLX(MLX_OBJ_TEMP_ADDRESS, &temperature, &pec)){
-		send_datapoint(scanPosX, scanPosY, temperature);
+		if(scanLines)
+			scanLine[scanPosY] = temperature;
+		else
+			send_datapoint(scanPosX, scanPosY, temperature);
 	}
 	else{
 		//ERROR
 		//TODO: - retry?
-		USB_send_cmd("Scan","0");
+		if(scanLines)
+			scanLine[scanPosY] = 0;	// 0 marks a failed reading
+		else
+			USB_send_cmd("Scan","0");
 	}
+	uint16_t linePosX = scanPosX;
 	
 	//Calculate a new position
-	//If next step would make Y go over maximum
-	if(scanServoDir == 1 && scanPosY >= scanResolution-1){
-		scanPosY = scanResolution-1;
-		scanPosX++;
+	//If next step would make Y go over the end of window
+	if(scanServoDir == 1 && scanPosY >= scanY1){
+		scanPosY = scanY1;
+		scanPosX += scanStride;
 		scanServoDir = -1;
 	}
-	//If next step would make Y go below 0 (and underflow)
-	else if(scanServoDir == -1 && scanPosY == 0){
-		scanPosX++;
+	//If next step would make Y go over the start of window (and underflow)
+	else if(scanServoDir == -1 && scanPosY <= scanY0){
+		scanPosX += scanStride;
 		scanServoDir = 1;
 	}
 	//Normal step
 	else{
-		scanPosY += scanServoDir;
+		scanPosY += scanServoDir * (int16_t)scanStride;
 	}
 	
-	if(scanPosX >= scanResolution){
+	//Line is finished
+	if(scanLines && scanPosX != linePosX){
+		send_scan_line(linePosX, scanLine, scanHeight);
+	}
+	
+	if(scanPosX > scanX1){
 		//end scanning
 		scanning = false;
 		return;
@@ -174,15 +214,16 @@ static inline void scanMoveServos(){
 	//5 - 47
 	//4 - 58
 	//3 - 78
-	uint8_t padding = ((SERVO_MAX-SERVO_MIN) - scanResolution*scanStepSize) / 2;
+	uint16_t paddingX = ((SERVO_MAX-SERVO_MIN) - scanWidth*scanStepSize) / 2;
+	uint16_t paddingY = ((SERVO_MAX-SERVO_MIN) - scanHeight*scanStepSize) / 2;
 	
-	OCR1B = SERVO_MAX - padding - scanPosY*scanStepSize; //Flipped up-down
-	OCR1A = SERVO_MIN + padding + scanPosX*scanStepSize;
+	OCR1B = SERVO_MAX - paddingY - scanPosY*scanStepSize; //Flipped up-down
+	OCR1A = SERVO_MIN + paddingX + scanPosX*scanStepSize;
 }
 
-static inline void send_datapoint( uint8_t posX, uint8_t posY, uint16_t temp )
+static inline void send_datapoint( uint16_t posX, uint16_t posY, uint16_t temp )
 {
-	char output_string[16];
+	char output_string[20];
 	int cx = snprintf(	output_string, sizeof(output_string),
 						"%u:%u:%u",
 						posX, posY, temp);
@@ -194,6 +235,27 @@ static inline void send_datapoint( uint8_t posX, uint8_t posY, uint16_t temp )
 	USB_send_cmd("Scan",output_string);
 }
 
+/*
+// Sends a scan line in binary:
+// start sign, line number (posX), value count, values (uint16 little-endian), checksum
+// Checksum is XOR of all bytes after start sign.
+*/
+static inline void send_scan_line( uint8_t posX, uint16_t *values, uint8_t count )
+{
+	uint8_t checksum = posX ^ count;
+	putchar(BINARY_LINE_START);
+	putchar(posX);
+	putchar(count);
+	for(uint8_t i = 0; i < count; i++){
+		uint8_t low = values[i] & 0xFF;
+		uint8_t high = values[i] >> 8;
+		putchar(low);
+		putchar(high);
+		checksum ^= low ^ high;
+	}
+	putchar(checksum);
+}
+
 static inline void recieve_incoming_characters(){
 	int8_t recieved_char;
 	while(EOF != (recieved_char = getchar())){
@@ -247,8 +309,12 @@ static inline void parse_command(uint8_t *command){
 		break;
 		
 		case 's':
-			cmd_parsed = true;
-			scanInit();
+			cmd_parsed = parse_scan(command);
+		break;
+		
+		//Scanning grid
+		case 'g':
+			cmd_parsed = parse_grid(command);
 		break;
 		
 		//Move servos separately
@@ -265,6 +331,11 @@ static inline void parse_command(uint8_t *command){
 			cmd_parsed = parse_temp(command);
 		break;
 		
+		//Scan data protocol
+		case 'p':
+			cmd_parsed = parse_protocol(command);
+		break;
+		
 		default:
 			USB_send_warning("Unknown command.");
 		break;
@@ -276,7 +347,7 @@ static inline void parse_command(uint8_t *command){
 
 static inline bool parse_info(uint8_t *command){
 	if(command[1] == '?'){
-		USB_send_cmd("INFO", "dev=ThermalCamera");
+		USB_send_cmd("INFO", "dev=ThermalCamera,proto=bin1,scan=window");
 		return true;
 	}
 	return false;
@@ -367,6 +438,76 @@ static inline bool parse_temp( uint8_t *command )
 	return false;
 }
 
+static inline bool parse_protocol( uint8_t *command )
+{
+	if(command[1] == '='){
+		binaryProtocol = (command[2] == '1');
+	}
+	else if(command[1] != '?'){
+		return false;
+	}
+	USB_send_cmd("PROTO", binaryProtocol ? "1" : "0");
+	return true;
+}
+
+/*
+// "s" scans the whole grid,
+// "s=x0,y0,x1,y1,stride" scans window x0..x1, y0..y1 (inclusive), every stride-th position
+*/
+static inline bool parse_scan( uint8_t *command )
+{
+	if(command[1] == 0){
+		scanInit(0, 0, scanWidth-1, scanHeight-1, 1);
+		return true;
+	}
+	if(command[1] == '='){
+		uint16_t values[5];
+		if(parse_csv_u16(command, 2, USB_RX_CMD_LENGTH, 5, values)){
+			if(values[0] > values[2] || values[2] >= scanWidth || values[1] > values[3] || values[3] >= scanHeight || values[4] == 0){
+				USB_send_warning("Scan window has to be inside grid.");
+				return false;
+			}
+			scanInit(values[0], values[1], values[2], values[3], values[4]);
+			return true;
+		}
+	}
+	return false;
+}
+
+/*
+// "g=width,height,step" sets scanning grid (step is in servo units), "g?" asks it
+// answers "GRID:width,height,step"
+*/
+static inline bool parse_grid( uint8_t *command )
+{
+	if(command[1] == '='){
+		uint16_t values[3];
+		if(!parse_csv_u16(command, 2, USB_RX_CMD_LENGTH, 3, values)){
+			return false;
+		}
+		if(values[0] == 0 || values[1] == 0 || values[2] == 0 || values[2] > 255
+			|| (uint32_t)values[0]*values[2] > SERVO_MAX-SERVO_MIN || (uint32_t)values[1]*values[2] > SERVO_MAX-SERVO_MIN){
+			USB_send_warning("Grid has to fit into servo range.");
+			return false;
+		}
+		scanning = false;
+		scanWidth = values[0];
+		scanHeight = values[1];
+		scanStepSize = values[2];
+	}
+	else if(command[1] != '?'){
+		return false;
+	}
+	char output_string[20];
+	int cx = snprintf(output_string, sizeof(output_string), "%u,%u,%u", scanWidth, scanHeight, scanStepSize);
+	if(cx == -1)
+		USB_send_warning("snprintf error");
+	if(cx >= sizeof(output_string))
+		USB_send_warning("snprintf error - buffer is not large enough");
+	USB_send_cmd("GRID", output_string);
+	return true;
+}
+
 /*
 //gets comma separated numeric values from char_array, starting from "start" and with length "length".
 //
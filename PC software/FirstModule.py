@@ -4,7 +4,10 @@ Created on 04.07.2013
 @author: Mark
 '''
 # # Imports
+import time
 import logging
+import threading
+import argparse
 
 import numpy as np
 
@@ -19,44 +22,41 @@ from tkinter import ttk
 
 # PySerial
 import serial
-import serialHelpers
-
-import queue
 
 import mlx90614 as sensor
 
-from thermaldata import ThermalData
-from thermalcamera import ThermalCamera
-from cmdparser import CmdParser
+from acquisition import AcquisitionEngine, AUTO_SHIFT
+from imageprocessing import ShiftCorrector, MAXIMUM_SHIFT
+from instrumentation import FrameRateCounter, StatsRegistry, StatsLogger, StatsServer
+from postprocessing import PostProcessor
+from renderscheduler import RenderScheduler
 
-MAXIMUM_SHIFT = 8
+HISTOGRAM_BINS = 64
+AUTO_CONTRAST_PERCENTILES = (2, 98)  # temperature limits in auto contrast mode
+AUTO_CONTRAST_TOLERANCE = 0.05  # part of temperature range that limits can move before they are changed
+TEMP_LIMIT_GAP = 100  # smallest difference of temperature limits (readings)
+SMOOTH_IMAGE_MAX = 128  # larger images are drawn without (slow) bicubic interpolation
 
 class ThermalCamApp():
-    def __init__(self, parent, serialThermal):
+    def __init__(self, parent, serialThermal, fast_render = True, stats = None, grid = (64, 64), workers = 1):
         self.parent = parent
         self.serialThermal = serialThermal
+        # Statistics (instrumentation.StatsRegistry) of serial, parser and GUI ("gui" entry), None if disabled
+        self.init_state(fast_render, None if stats is None else stats.get("gui"))
 
+        # Serial monitor, command parser and thermal data run in acquisition engine, GUI is one of its consumers
+        (width, height) = grid
+        self.use_engine(AcquisitionEngine(self.serialThermal, width, stats = stats, height = height, shift = AUTO_SHIFT))
         self.connect_thermal_camera()
 
-        self.shift_ammount = 0
-
-        self.thermal_data = ThermalData(64)
-        self.thermal_data_updated = False
-        self.thermal_data.attach(self)  # attaching application as data observer (on notification, update_notification() will be called)
-
-        incoming = queue.Queue()
-        outgoing = queue.Queue()
-        # Start serial monitor
-        serial_monitor = serialHelpers.SerialMonitorThread(self.serialThermal, incoming, outgoing)
-        serial_monitor.setDaemon(True)
-        serial_monitor.start()
+        # Completed frames are analysed in worker processes (hot spot, statistics), not in cycle()
+        if workers > 0:
+            self.postprocessor = PostProcessor(self.thermal_data.data.shape, workers = workers)
+            self.postprocessor.add_result_callback(lambda number, results: self.wake_render_scheduler())
+            self.engine.add_frame_callback(self.postprocessor)
 
-        # Thread that parses incoming messages and edits thermal_data accordingly
-        cmd_parser = CmdParser(incoming, self.thermal_data)
-        cmd_parser.setDaemon(True)
-        cmd_parser.start()
-
-        self.thermal_camera = ThermalCamera(outgoing)
+        self.engine.start()
+        self.thermal_camera = self.engine.thermal_camera
 
         # Setup window size
         w = self.parent.winfo_screenwidth() - 20
@@ -86,9 +86,21 @@ class ThermalCamApp():
         # self.connect_button.pack(side = tk.LEFT)
 
         # Start scan button
-        self.connect_button = ttk.Button(self.frame, text = "Scan", command = self.thermal_camera.start_scan)
+        self.connect_button = ttk.Button(self.frame, text = "Scan", command = self.scan)
         self.connect_button.pack(side = tk.LEFT)
 
+        # Coarse scan, then hottest spot at full resolution
+        self.refine_button = ttk.Button(self.frame, text = "Hot spot", command = self.refined_scan)
+        self.refine_button.pack(side = tk.LEFT)
+
+        # Frame rate
+        self.fps_label = ttk.Label(self.frame, width = 20)
+        self.fps_label.pack(side = tk.LEFT)
+
+        # Hot spot of last completed frame
+        self.hot_spot_label = ttk.Label(self.frame, width = 24)
+        self.hot_spot_label.pack(side = tk.LEFT)
+
         # self.serial_text_widget = scrolledtext.ScrolledText(self.frame, width = 40, height = 10, state = 'disabled', wrap = tk.WORD, font = 'helvetica 9')
         # self.serial_text_widget.pack(side = tk.LEFT)
         # self.serial_text_widget.tag_configure('incoming', background = '#8AB8E6')
@@ -105,6 +117,16 @@ class ThermalCamApp():
         self.create_temp_limit_sliders()
         self.create_shift_slider()
 
+        # Shift is estimated from scans (acquisition engine) until slider is moved
+        self.auto_shift = tk.BooleanVar(value = True)
+        self.auto_shift_button = ttk.Checkbutton(self.frame, text = "Auto shift", variable = self.auto_shift, command = self.set_auto_shift)
+        self.auto_shift_button.pack(side = tk.LEFT)
+
+        # Temperature limits follow percentiles of data until temperature slider is moved
+        self.auto_contrast = tk.BooleanVar(value = True)
+        self.auto_contrast_button = ttk.Checkbutton(self.frame, text = "Auto contrast", variable = self.auto_contrast, command = self.request_redraw)
+        self.auto_contrast_button.pack(side = tk.LEFT)
+
         # Canvas
         # matplotlib setup
         self.fig = plt.figure(figsize = (14, 5), dpi = 100)
@@ -112,10 +134,47 @@ class ThermalCamApp():
         self.ren_canvas.show()
         self.ren_canvas.get_tk_widget().pack()
 
+        self.create_figure()
+
+        # cycle() is called when there can be something to draw, interval adapts to draw time and data rate,
+        # when nothing arrives it waits until new data wakes it
+        self.render_scheduler = RenderScheduler(self.parent.after, self.parent.after_cancel, self.cycle,
+                                                lambda: self.thermal_data.points_written, self.wakeup,
+                                                min_pixels = self.thermal_data.height, stats = self.stats)
+        self.render_scheduler.start()
+
+    def init_state(self, fast_render, stats):
+        """ state of drawing that does not depend on tk widgets or device (stats - instrumentation.Stats or None) """
+        # Fast render mode redraws only thermal image and histogram bars on a cached background (blitting)
+        self.fast_render = fast_render
+        self._background = None  # figure without animated artists (fast render mode)
+        self._full_redraw = True  # True if whole figure has to be drawn on next cycle
+        self.frame_rate = FrameRateCounter()
+        self.stats = stats
+        self.postprocessor = None
+        self.render_scheduler = None  # renderscheduler.RenderScheduler, calls cycle()
+
+        self.shift_ammount = 0
+        self.shift_corrector = ShiftCorrector(MAXIMUM_SHIFT)  # caches index maps, so slider moves are cheap
+        self._thermal_image = None  # shift corrected image buffer
+        self._thermal_image_shift = None  # shift that was used for image buffer
+        self._readings = None  # consistent copy of thermal data (see ThermalData.snapshot())
+        self._setting_contrast = False  # True while auto contrast moves temperature sliders
+
+    def use_engine(self, engine):
+        """ draws thermal data of acquisition engine """
+        self.engine = engine
+        self.thermal_data = engine.thermal_data
+        self.thermal_data_updated = False  # redraw requested (settings changed), data changes are seen from thermal_data.sequence
+        self._drawn_sequence = None  # thermal data sequence that was drawn last
+        self.thermal_data.attach(self)  # attaching application as data observer (on notification, update_notification() will be called)
+        self.thermal_data.track_changes(self)  # only changed columns of image are shift corrected again
+
+    def create_figure(self):
+        """ creates thermal image and histogram on figure of ren_canvas """
         self.create_thermal_image()
         self.create_histogram()
-
-        self.cycle();
+        self.ren_canvas.mpl_connect('draw_event', self.on_draw)
 
     def writeToLog(self, msg, tags):
         numlines = self.serial_text_widget.index('end - 1 line').split('.')[0]
@@ -128,7 +187,25 @@ class ThermalCamApp():
         self.serial_text_widget['state'] = 'disabled'
 
     def update_notification(self):
-        self.thermal_data_updated = True
+        # called from parser thread, data is drawn in cycle() when sequence of thermal data has changed
+        if self.stats is not None and self._drawn_sequence is not None and self.thermal_data.sequence - self._drawn_sequence > 2:
+            self.stats.count("coalesced_updates")  # previous update has not been drawn yet
+        self.wake_render_scheduler()
+
+    def wake_render_scheduler(self):
+        """ tells render scheduler that there is something new (called from other threads) """
+        if self.render_scheduler is not None:
+            self.render_scheduler.wake()
+
+    def wakeup(self, function):
+        """ runs function from tk event loop, can be called from any thread.
+            Tk call is made from a helper thread, so the caller (parser) never waits for tk """
+        def call():
+            try:
+                self.parent.after_idle(function)
+            except (RuntimeError, tk.TclError):
+                pass  # window has been closed
+        threading.Thread(target = call, daemon = True).start()
 
     def create_servo_sliders(self):
         self.servo_A_slider = ttk.Scale(self.frame,
@@ -153,15 +230,16 @@ class ThermalCamApp():
         self.thermal_camera.set_servo(1, value)
 
     def create_thermal_image(self):
-        self.ax_thermal_image = self.fig.add_subplot(1, 2, 1, axisbg = 'red')
+        self.ax_thermal_image = self.fig.add_subplot(1, 2, 1, facecolor = 'red')
         self.ax_thermal_image.set_title("Thermal image")
         self.ax_thermal_image.get_yaxis().set_visible(False)
         self.ax_thermal_image.get_xaxis().set_visible(False)
-        self.ax_thermal_image.get_axes().set_frame_on(True)
+        self.ax_thermal_image.set_frame_on(True)
 
-        thermal_image = self.generate_thermal_image(self.thermal_data.data)
+        thermal_image = self.generate_thermal_image()
 
-        self.im = self.ax_thermal_image.imshow(thermal_image, cmap = 'jet', interpolation = 'bicubic', vmin = sensor.MIN_READING, vmax = sensor.MAX_READING)
+        interpolation = 'bicubic' if max(thermal_image.shape) <= SMOOTH_IMAGE_MAX else 'nearest'
+        self.im = self.ax_thermal_image.imshow(thermal_image, cmap = 'jet', interpolation = interpolation, vmin = sensor.MIN_READING, vmax = sensor.MAX_READING, animated = self.fast_render)
         self.cbar = self.fig.colorbar(self.im)
         self.cbar.set_label('Temperature')
 
@@ -170,6 +248,25 @@ class ThermalCamApp():
         self.axHist.set_title("Temperature data histogram")
         # self.axHist.get_yaxis().set_visible(False)
 
+        if self.fast_render:
+            # bars are created once, later only their heights are changed
+            self.hist_counts = np.zeros(HISTOGRAM_BINS)
+            self.hist_bars = self.axHist.bar(np.zeros(HISTOGRAM_BINS), self.hist_counts,
+                                             width = 1, align = 'edge',
+                                             facecolor = 'MidnightBlue',
+                                             edgecolor = 'black',
+                                             animated = True)
+            self.set_histogram_range(self.temp_min_slider.get(), self.temp_max_slider.get())
+
+    def set_histogram_range(self, minT, maxT):
+        """ Moves histogram bars to cover range minT..maxT (fast render mode) """
+        edges = np.linspace(minT, maxT, HISTOGRAM_BINS + 1)
+        for (bar, left) in zip(self.hist_bars, edges):
+            bar.set_x(left)
+            bar.set_width(edges[1] - edges[0])
+        self.axHist.set_xlim([minT, maxT])
+        self._full_redraw = True
+
     def create_shift_slider(self):
         self.shift_slider = ttk.Scale(self.frame,
                                from_ = -MAXIMUM_SHIFT, to = MAXIMUM_SHIFT,
@@ -202,72 +299,178 @@ class ThermalCamApp():
         self.temp_min_slider.pack(side = tk.LEFT)
         self.temp_max_slider.pack(side = tk.LEFT)
 
-    def generate_thermal_image(self, data):
-        return self.shift_correction(data, self.shift_ammount)
-
-    def shift_correction(self, data, shift):
+    def generate_thermal_image(self):
+        # image buffers are reused (matplotlib and histogram do not keep them)
+        self._readings = self.thermal_data.snapshot()
+        if self._thermal_image is None or self._thermal_image.shape != self._readings.shape:
+            self._thermal_image = np.empty_like(self._readings)
+        self._thermal_image_shift = self.shift_ammount
+        return self.shift_correction(self._readings, self.shift_ammount, self._thermal_image)
+
+    def update_thermal_image(self):
+        """ Copies and shift corrects only columns of thermal data that have changed since last update """
+        changes = self.thermal_data.take_changes(self)
+        if self._readings is None or self._readings.shape != self.thermal_data.data.shape or self._thermal_image_shift != self.shift_ammount:
+            return self.generate_thermal_image()
+        if changes is not None:
+            (unused_rows, columns) = changes  # @UnusedVariable
+            self.thermal_data.snapshot(slice(None), columns, self._readings[:, columns])
+            self.shift_corrector.correct(self._readings, self.shift_ammount, self._thermal_image, columns)
+        return self._thermal_image
+
+    def shift_correction(self, data, shift, out = None):
         """ When images are scanned, columns are get shifted because of servo movement direction.
-            This method shifts data columns back.
-            Warning - messes up original data(give it a copy of original) """
-        # NOT ANYMORE! :)
-        templist = []
-        # transpose to access columns instead of rows with "roll"
-        for row in np.transpose(data):
-            # Kui paarisarv, siis liigutame kumbagi rida poole v6rra (shift on kordamooda posi- ja negatiivne)
-            # Kui paaritu, siis yhele poole yhe v6rra rohkem, kui teisel poole (negatiivse shifti puhul, muutub jagatava abs.v22rtus suuremaks ja positiivse puhul v2iksemaks)
-            shift_ammount = (shift - (shift % 2)) // 2
-            # delete over-rolling data
-            for index in range(min(0, -shift_ammount), max(0, -shift_ammount)):
-                pass
-                # row[index] = -1
-            # roll
-            templist.append(np.roll(row, shift_ammount))
-            shift = -shift
-
-        # transpose array back to original and return
-        return np.transpose(np.array(templist))
+            This method shifts data columns back (returns a corrected copy, see imageprocessing.ShiftCorrector). """
+        return self.shift_corrector.correct(data, shift, out)
 
     def quit(self):
-        # TODO : Cancel all pending starts (tk.after)
+        self.render_scheduler.stop()
         self.exited = True
+        self.engine.stop()
+        if self.postprocessor is not None:
+            self.postprocessor.close()
         self.parent.destroy()
 
     def cycle(self):
-        if self.thermal_data_updated:
+        """ draws new data and requested changes, returns true if something was drawn """
+        self.update_shift()
+        self.show_postprocessing_results()
+        sequence = self.thermal_data.sequence
+        drawn = self.thermal_data_updated or sequence != self._drawn_sequence
+        if drawn:
             self.thermal_data_updated = False
+            self._drawn_sequence = sequence  # writes after this are drawn on next cycle
+            start = time.perf_counter()
 
-            thermal_image = self.generate_thermal_image(self.thermal_data.data)
+            thermal_image = self.update_thermal_image()
             self.im.set_data(thermal_image)
 
-            self.redraw_histogram(thermal_image)
-
-            # TODO: Remove hack +10/-10
-            if self.thermal_data.maximum is not None:
-                self.temp_max_slider["from"] = self.thermal_data.maximum + 10
-                self.temp_min_slider["from"] = self.thermal_data.maximum + 10
-            if self.thermal_data.minimum is not None:
-                self.temp_max_slider["to"] = self.thermal_data.minimum - 10
-                self.temp_min_slider["to"] = self.thermal_data.minimum - 10
-
-
-            self.ren_canvas.draw()
-
-        self.parent.after(50, self.cycle)
-
-    def redraw_histogram(self, data):
+            # histogram and temperature limits come from statistics kept up to date by thermal data
+            statistics = self.thermal_data.statistics()
+            self.update_temp_limits(statistics)
+            if self.fast_render:
+                self.update_histogram(statistics)
+            else:
+                self.redraw_histogram(statistics)
+
+            if self.fast_render and not self._full_redraw and self._background is not None:
+                self.blit()
+                blitted = True
+            else:
+                self.ren_canvas.draw()
+                blitted = False
+
+            draw_time = time.perf_counter() - start
+            self.frame_rate.tick(draw_time)
+            if self.stats is not None:
+                self.stats.count("frames_blitted" if blitted else "frames_drawn")
+                self.stats.time("draw_time", draw_time)
+            self.fps_label["text"] = "{:.1f} fps, {:.1f} ms".format(self.frame_rate.fps, self.frame_rate.frame_time * 1000)
+        return drawn
+
+    def request_redraw(self):
+        """ asks for redraw on next cycle (many requests are drawn once) """
+        self.thermal_data_updated = True
+        self.render_scheduler.request()
+
+    def show_postprocessing_results(self):
+        """ Shows results of the latest post-processed frame """
+        if self.postprocessor is None or self.postprocessor.results.empty():
+            return
+        while not self.postprocessor.results.empty():
+            (unused_number, results) = self.postprocessor.results.get_nowait()  # @UnusedVariable
+        (x, y, reading) = results["hot_spot"]
+        self.hot_spot_label["text"] = "Hot spot {:.1f}\u00b0C at {}, {}".format(sensor.reading2celsius(reading), x, y)
+
+    def on_draw(self, event):
+        """ Called after every full draw of figure - remembers background for blitting """
+        self._full_redraw = False
+        if self.fast_render:
+            self._background = self.ren_canvas.copy_from_bbox(self.fig.bbox)
+            self.draw_animated()
+
+    def draw_animated(self):
+        self.ax_thermal_image.draw_artist(self.im)
+        for bar in self.hist_bars:
+            self.axHist.draw_artist(bar)
+
+    def blit(self):
+        """ Draws only animated artists on top of cached background """
+        self.ren_canvas.restore_region(self._background)
+        self.draw_animated()
+        self.ren_canvas.blit(self.fig.bbox)
+
+    def update_temp_limits(self, statistics):
+        """ Fits range of temperature sliders to data and in auto contrast mode
+            moves temperature limits to percentiles of data (if they have moved more than tolerance) """
+        extremes = statistics.percentiles(0, 100)
+        if extremes is None:
+            return
+        (minT, maxT) = (self.temp_min_slider.get(), self.temp_max_slider.get())
+        if self.auto_contrast.get():
+            (low, high) = statistics.percentiles(*AUTO_CONTRAST_PERCENTILES)
+            if high - low < TEMP_LIMIT_GAP:
+                middle = min(max((low + high) / 2, sensor.MIN_READING + TEMP_LIMIT_GAP / 2), sensor.MAX_READING - TEMP_LIMIT_GAP / 2)
+                (low, high) = (middle - TEMP_LIMIT_GAP / 2, middle + TEMP_LIMIT_GAP / 2)
+            tolerance = (maxT - minT) * AUTO_CONTRAST_TOLERANCE
+            if abs(low - minT) > tolerance or abs(high - maxT) > tolerance:
+                (minT, maxT) = (round(low), round(high))
+                self.set_temp_limits(minT, maxT)
+
+        # sliders cover data and current limits
+        self._setting_contrast = True
+        try:
+            for slider in (self.temp_min_slider, self.temp_max_slider):
+                slider["from"] = max(round(extremes[1]), maxT)
+                slider["to"] = min(round(extremes[0]), minT)
+            self.temp_min_slider.set(minT)
+            self.temp_max_slider.set(maxT)
+        finally:
+            self._setting_contrast = False
+
+    def update_histogram(self, statistics):
+        """ Changes heights of bars to counts of statistics (fast render mode) """
+        statistics.histogram(self.temp_min_slider.get(), self.temp_max_slider.get(), HISTOGRAM_BINS, self.hist_counts)
+        for (bar, count) in zip(self.hist_bars, self.hist_counts):
+            bar.set_height(count)
+
+        # y-axis has to be changed (and redrawn) only if bars do not fit or are too small
+        top = self.axHist.get_ylim()[1]
+        highest = self.hist_counts.max()
+        if highest > top or highest < top / 4:
+            self.axHist.set_ylim([0, max(highest, 1) * 1.25])
+            self._full_redraw = True
+
+    def redraw_histogram(self, statistics):
+        (minT, maxT) = (self.temp_min_slider.get(), self.temp_max_slider.get())
+        edges = np.linspace(minT, maxT, HISTOGRAM_BINS + 1)
         self.axHist.clear()
-        self.axHist.hist(np.ravel(data),
-                         64,
-                         range = [self.temp_min_slider.get(), self.temp_max_slider.get()],
-                         facecolor = 'MidnightBlue',
-                         edgecolor = 'black')  #  , histtype='stepfilled'
-        self.axHist.set_xlim([self.temp_min_slider.get(), self.temp_max_slider.get()])
+        self.axHist.bar(edges[:-1], statistics.histogram(minT, maxT, HISTOGRAM_BINS),
+                        width = edges[1] - edges[0], align = 'edge',
+                        facecolor = 'MidnightBlue',
+                        edgecolor = 'black')
+        self.axHist.set_xlim([minT, maxT])
 
     def start_scan(self):
         self.thermal_data.clear_data()
-        self.thermal_cam.start_scan()
+        self.engine.start_scan()
+        self.request_redraw()
+
+    def scan(self):
+        """ scans whole grid, data of previous scan stays until it is replaced """
+        self.engine.start_scan()
+        self.request_redraw()
+
+    def refined_scan(self):
+        """ coarse scan, then hottest spot at full resolution """
+        self.engine.start_refined_scan()
+        self.request_redraw()
 
     def set_temp_min_slider(self, event):
+        if self._setting_contrast:
+            return
+        # moving slider switches to manual temperature limits
+        self.auto_contrast.set(False)
         minT = self.temp_min_slider.get()
         maxT = self.temp_max_slider.get()
         # If user tries to move slider past the other one, move the other one too, so that (max > min)
@@ -282,6 +485,9 @@ class ThermalCamApp():
         self.setTemp(minT, maxT)
 
     def set_temp_max_slider(self, event):
+        if self._setting_contrast:
+            return
+        self.auto_contrast.set(False)
         minT = self.temp_min_slider.get()
         maxT = self.temp_max_slider.get()
         # If user tries to move slider past the other one, move the other one too, so that (max > min)
@@ -297,36 +503,75 @@ class ThermalCamApp():
 
 
     def setTemp(self, minT, maxT):
-        self.cbar.norm.vmin = minT
-        self.cbar.norm.vmax = maxT
-        # TODO: siin peaks olema veidi kenam uuendamise lahendus
-        self.cbar.draw_all()
-        self.im.set_norm(self.cbar.norm)
+        # whole figure is drawn on next cycle (slider moves are coalesced)
+        self.set_temp_limits(minT, maxT)
+        self.request_redraw()
 
-        self.axHist.set_xlim([minT, maxT])
+    def set_temp_limits(self, minT, maxT):
+        # colorbar follows limits of image
+        self.im.set_clim(minT, maxT)
 
-        self.ren_canvas.draw()
+        if self.fast_render:
+            self.set_histogram_range(minT, maxT)
+        else:
+            self.axHist.set_xlim([minT, maxT])
 
-        self.thermal_data_updated = True
-        # Why does the next one also work??
-        # self.cbar.patch.figure.canvas.draw()
+        self._full_redraw = True
 
     def setShift(self, event):
-        self.shift_ammount = round(self.shift_slider.get())
-        self.thermal_data_updated = True;
+        shift = round(self.shift_slider.get())
+        if shift == self.shift_ammount:
+            return
+        self.shift_ammount = shift
+        # moving slider switches to manual shift
+        self.auto_shift.set(False)
+        self.engine.shift = shift
+        self.request_redraw()
+
+    def set_auto_shift(self):
+        self.engine.shift = AUTO_SHIFT if self.auto_shift.get() else self.shift_ammount
+        self.request_redraw()
+
+    def update_shift(self):
+        """ In auto shift mode, follows shift estimated by acquisition engine """
+        shift = self.engine.frame_shift()
+        if self.engine.shift == AUTO_SHIFT and shift != self.shift_ammount:
+            self.shift_ammount = shift
+            self.shift_slider.set(shift)
+            self.thermal_data_updated = True
 
     def connect_thermal_camera(self):
-        serialHelpers.connect_device(self.serialThermal, "<INFO:dev=ThermalCamera>\r\n", "<i?>")
+        self.engine.connect()
 
 
 
 def main():
+    parser = argparse.ArgumentParser(description = "Thermal camera control")
+    parser.add_argument("--grid", default = "64x64", help = "scanning grid as WIDTHxHEIGHT")
+    parser.add_argument("--workers", type = int, default = 1, help = "post-processing worker processes (0 - no post-processing)")
+    parser.add_argument("--stats-interval", type = float, help = "log pipeline statistics every this many seconds")
+    parser.add_argument("--stats-port", type = int, help = "serve pipeline statistics as JSON on this local HTTP port")
+    args = parser.parse_args()
+
     logging.basicConfig(format = '%(levelname)s:%(message)s', level = logging.INFO)
 
+    stats = None
+    reporters = []
+    if args.stats_interval is not None or args.stats_port is not None:
+        stats = StatsRegistry()
+        if args.stats_interval is not None:
+            reporters.append(StatsLogger(stats, args.stats_interval))
+        if args.stats_port is not None:
+            reporters.append(StatsServer(stats, args.stats_port))
+
     with serial.Serial(timeout = 0, writeTimeout = 0) as serialThermal:
         root = tk.Tk()
-        ThermalCamApp(root, serialThermal)
+        ThermalCamApp(root, serialThermal, stats = stats, grid = tuple(int(n) for n in args.grid.lower().split('x')), workers = args.workers)
+        for reporter in reporters:
+            reporter.start()
         root.mainloop()
+        for reporter in reporters:
+            reporter.join()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,320 @@
+"""
+Headless acquisition - serial monitor, command parser and thermal data without GUI.
+Does not import tkinter or matplotlib.
+
+    python acquisition.py --scans 3 --output scans
+
+saves every completed scan as scans/frame_0000.npy, scans/frame_0001.npy, ...
+"""
+
+import os
+import logging
+import argparse
+import threading
+
+import serial
+import numpy as np
+
+import serialHelpers
+from recorder import FrameRecorder
+from framehistory import FrameHistory
+from postprocessing import PostProcessor
+from boundedqueue import BoundedQueue, BLOCK, DROP_NEWEST
+from serialcapture import CaptureSerial
+from instrumentation import StatsRegistry, StatsLogger, StatsServer
+from thermaldata import ThermalData
+from thermalcamera import ThermalCamera, DEFAULT_GRID, scan_points, window_around
+from imageprocessing import ShiftCorrector, ShiftEstimator
+from cmdparser import CmdParser
+
+# Handshake with the device
+INFO_QUESTION = "<i?>"
+INFO_RESPONSE = "<INFO:dev=ThermalCamera>\r\n"
+
+AUTO_SHIFT = "auto"  # shift of frames is estimated (see imageprocessing.ShiftEstimator)
+
+
+class AcquisitionEngine(object):
+    """
+    Wires serial monitor and command parser threads to thermal data.
+    Opened (or openable) serial port must be supplied (serial_port).
+
+    Completed frames (every data-point of grid received) are passed
+    to frame callbacks as copies. Callbacks are called from parser thread.
+    If stats (instrumentation.StatsRegistry) is given, threads collect statistics
+    into its "serial" and "parser" entries.
+
+    Queues are bounded (see boundedqueue.py): when parser falls behind, serial monitor
+    waits (and stops reading the port), commands that do not fit are dropped.
+
+    Grid is size x size positions, or size x height if height is given
+    (step_size - servo units between positions, largest that fits if not given).
+
+    shift - frames passed to callbacks are shift corrected (see imageprocessing.ShiftCorrector)
+    by this many positions, AUTO_SHIFT estimates it from whole grid scans whenever grid or stride
+    changes (frame_shift() tells the current one), None - not corrected.
+    """
+
+    def __init__(self, serial_port, size = 64, event_driven = True, binary = True, stats = None,
+                 incoming_size = 256, incoming_policy = BLOCK, outgoing_size = 64, outgoing_policy = DROP_NEWEST,
+                 height = None, step_size = None, shift = None):
+        self.serial_port = serial_port
+        self.binary = binary  # use binary scan protocol if device supports it
+        self.stats = stats
+        self.step_size = step_size
+        self.thermal_data = ThermalData(size, height)
+        self.thermal_data.attach(self)  # attaching engine as data observer (on notification, update_notification() will be called)
+
+        self.incoming = BoundedQueue(incoming_size, incoming_policy)  # lists of messages, one per serial read
+        self.outgoing = BoundedQueue(outgoing_size, outgoing_policy)
+        self.serial_monitor = serialHelpers.SerialMonitorThread(self.serial_port, self.incoming, self.outgoing, event_driven = event_driven,
+                                                                stats = None if stats is None else stats.get("serial"))
+        self.serial_monitor.daemon = True
+        # Thread that parses incoming messages and edits thermal_data accordingly
+        self.cmd_parser = CmdParser(self.incoming, self.thermal_data, event_driven = event_driven,
+                                    stats = None if stats is None else stats.get("parser"))
+        self.cmd_parser.daemon = True
+        self.cmd_parser.register_handler("PROTO", self._protocol_changed)
+        self.cmd_parser.register_handler("GRID", self._grid_changed)
+
+        self.thermal_camera = ThermalCamera(self.outgoing)
+        self.info = None  # fields of device info response (see connect()), None if device was not asked
+
+        self._frame_callbacks = []
+        self._refine = None  # (coarse stride, window size) while coarse part of refined scan is running
+        self._filling = False  # true while coarse scan is filled into grid
+        self._scan = (None, 1)  # window and stride of last scan
+
+        self.shift_estimator = ShiftEstimator()
+        if shift not in (None, AUTO_SHIFT) and abs(shift) > self.shift_estimator.max_shift:
+            raise ValueError(("shift must be between {} and {} but it is {}").format(-self.shift_estimator.max_shift, self.shift_estimator.max_shift, shift))
+        self.shift = shift
+        self.shift_corrector = ShiftCorrector(self.shift_estimator.max_shift)
+
+    def connect(self, parallel = True):
+        """ Finds the device, returns boolean - true if found
+            (parallel - probe all ports at the same time, see serialHelpers.discover_device) """
+        if parallel:
+            (success, found) = serialHelpers.discover_device(self.serial_port, INFO_RESPONSE, INFO_QUESTION)
+        else:
+            (success, found) = serialHelpers.connect_device(self.serial_port, INFO_RESPONSE, INFO_QUESTION)
+        if success:
+            self.negotiate_protocol(found[-1][2])
+            self.configure_grid()
+        return success
+
+    def configure_grid(self):
+        """ Sends grid to device - always, because device keeps grid of previous session until it is reset.
+            Firmware that does not answer "scan=window" in info can not change grid (if info is known). """
+        (width, height) = (self.thermal_data.width, self.thermal_data.height)
+        if self.info is not None and "window" not in self.info.get("scan", "").split('|'):
+            if (width, height) != DEFAULT_GRID[:2] or self.step_size is not None:
+                logging.warning("Device can not change scanning grid, it scans {}x{}".format(*DEFAULT_GRID[:2]))
+            return
+        logging.info("Scanning grid {}x{}".format(width, height))
+        self.thermal_camera.set_grid(width, height, self.step_size)
+
+    def negotiate_protocol(self, info_response):
+        """ Switches to binary scan protocol if device says it supports it (older firmware only knows text) """
+        info = serialHelpers.parse_info(info_response)
+        self.info = info
+        supported = "bin1" in info.get("proto", "").split('|')
+        if self.binary and supported:
+            logging.info("Using binary scan protocol")
+            self.serial_monitor.set_binary(True)
+            self.thermal_camera.set_binary_protocol(True)
+        else:
+            logging.info("Using text scan protocol")
+            if supported:
+                # device keeps protocol of previous session until it is reset
+                self.thermal_camera.set_binary_protocol(False)
+
+    def _protocol_changed(self, binary):
+        logging.info("Device scan protocol: " + ("binary" if binary == "1" else "text"))
+
+    def _grid_changed(self, grid):
+        logging.info("Device scanning grid (width, height, step): " + grid)
+
+    def start(self):
+        self.serial_monitor.start()
+        self.cmd_parser.start()
+
+    def stop(self):
+        self.serial_monitor.join()
+        self.cmd_parser.join()
+
+    def add_frame_callback(self, callback):
+        """ callback(frame) will be called with a copy of every completed frame """
+        self._frame_callbacks.append(callback)
+
+    def remove_frame_callback(self, callback):
+        self._frame_callbacks.remove(callback)
+
+    def start_scan(self, window = None, stride = 1):
+        """ scans whole grid or window (x0, y0, x1, y1 - inclusive), every stride-th position """
+        (width, height) = (self.thermal_data.width, self.thermal_data.height)
+        if window is None and stride != 1:
+            window = (0, 0, width - 1, height - 1)
+        self.thermal_data.new_frame(scan_points(width, height, window, stride))
+        self._scan = (window, stride)
+        self.thermal_camera.start_scan(window, stride)
+
+    def start_refined_scan(self, coarse_stride = 4, window_size = 16):
+        """
+        Scans every coarse_stride-th position of grid, then window_size x window_size
+        positions around the hottest one at full resolution.
+        Coarse readings are spread over the positions that were skipped.
+        Only the final frame is passed to frame callbacks.
+        """
+        self._refine = (coarse_stride, window_size)
+        self.start_scan(None, coarse_stride)
+
+    def _refine_hot_spot(self):
+        (stride, size) = self._refine
+        self._refine = None
+        (width, height) = (self.thermal_data.width, self.thermal_data.height)
+        coarse = self.thermal_data.data[::stride, ::stride]
+        (y, x) = (int(n) * stride for n in np.unravel_index(np.argmax(coarse), coarse.shape))
+        filled = np.repeat(np.repeat(coarse, stride, 0), stride, 1)[:height, :width]
+        (ys, xs) = np.indices(filled.shape)
+        self._filling = True
+        try:
+            self.thermal_data.set_datapoints(xs.ravel(), ys.ravel(), filled.ravel())
+        finally:
+            self._filling = False
+        window = window_around(x, y, size, width, height)
+        logging.info("Hot spot at {}, {}, scanning window {}".format(x, y, window))
+        self.start_scan(window)
+
+    def update_notification(self):
+        if self._filling:
+            return
+        if self.thermal_data.frame_complete and self._refine is not None:
+            self._refine_hot_spot()
+        elif self.thermal_data.frame_complete:
+            frame = self.thermal_data.data.copy()
+            self.thermal_data.new_frame()
+            (window, stride) = self._scan
+            if self.shift == AUTO_SHIFT and window is None:
+                parameters = self.thermal_camera.grid + (stride,)
+                if parameters != self.shift_estimator.parameters:
+                    logging.info("Estimated shift: {}".format(self.shift_estimator.update(frame, parameters)))
+            shift = self.frame_shift()
+            if shift != 0:
+                frame = self.shift_corrector.correct(frame, shift)
+            for callback in self._frame_callbacks:
+                callback(frame)
+
+    def frame_shift(self):
+        """ returns shift frames are corrected by (0 - not corrected) """
+        if self.shift == AUTO_SHIFT:
+            return self.shift_estimator.shift
+        return self.shift or 0
+
+
+class FrameSaver(object):
+    """ Frame callback that saves every frame into directory as frame_NNNN.npy """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.count = 0
+        os.makedirs(directory, exist_ok = True)
+
+    def __call__(self, frame):
+        path = os.path.join(self.directory, "frame_{:04d}.npy".format(self.count))
+        np.save(path, frame)
+        self.count += 1
+        logging.info("Saved frame to " + path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Acquire thermal images without GUI")
+    parser.add_argument("--port", help = "serial port of the device (searched for if not given)")
+    parser.add_argument("--size", type = int, default = 64, help = "scanning resolution (grid width)")
+    parser.add_argument("--height", type = int, help = "grid height (same as width if not given)")
+    parser.add_argument("--step", type = int, help = "servo units between grid positions (largest that fits if not given)")
+    parser.add_argument("--shift", help = "shift correction of saved frames in positions or \"auto\" to estimate it")
+    parser.add_argument("--refine", type = int, metavar = "STRIDE", help = "scan every STRIDE-th position, then hottest spot at full resolution")
+    parser.add_argument("--scans", type = int, default = 1, help = "number of scans to make")
+    parser.add_argument("--output", default = "scans", help = "directory to save frames to")
+    parser.add_argument("--record", help = "also append frames to this recording file (see recorder.py)")
+    parser.add_argument("--average", type = int, help = "also save mean and noise of last this many scans (mean.npy, noise.npy)")
+    parser.add_argument("--workers", type = int, default = 0, help = "log hot spot and statistics of frames computed in this many worker processes")
+    parser.add_argument("--capture", help = "also save raw received bytes to this capture file (see serialcapture.py)")
+    parser.add_argument("--stats-interval", type = float, help = "log pipeline statistics every this many seconds")
+    parser.add_argument("--stats-port", type = int, help = "serve pipeline statistics as JSON on this local HTTP port")
+    parser.add_argument("--timeout", type = float, default = 600, help = "seconds to wait for one scan")
+    args = parser.parse_args()
+
+    logging.basicConfig(format = '%(levelname)s:%(message)s', level = logging.INFO)
+
+    with serial.Serial(timeout = 0, writeTimeout = 0) as serial_port:
+        if args.capture is not None:
+            serial_port = CaptureSerial(serial_port, args.capture)
+        stats = None
+        reporters = []
+        if args.stats_interval is not None or args.stats_port is not None:
+            stats = StatsRegistry()
+            if args.stats_interval is not None:
+                reporters.append(StatsLogger(stats, args.stats_interval))
+            if args.stats_port is not None:
+                reporters.append(StatsServer(stats, args.stats_port))
+        shift = args.shift if args.shift in (None, AUTO_SHIFT) else int(args.shift)
+        engine = AcquisitionEngine(serial_port, args.size, stats = stats, height = args.height, step_size = args.step, shift = shift)
+        if args.port is not None:
+            serial_port.port = args.port
+            serial_port.open()
+            engine.configure_grid()
+        elif not engine.connect():
+            return 1
+
+        saver = FrameSaver(args.output)
+        frame_done = threading.Event()
+        engine.add_frame_callback(saver)
+        recorder = None
+        if args.record is not None:
+            recorder = FrameRecorder(args.record, engine.thermal_data.data.shape, engine.thermal_camera, engine.thermal_data)
+            engine.add_frame_callback(recorder)
+        history = None
+        if args.average is not None:
+            history = FrameHistory(engine.thermal_data.data.shape, args.average)
+            engine.add_frame_callback(history)
+        postprocessor = None
+        if args.workers > 0:
+            postprocessor = PostProcessor(engine.thermal_data.data.shape, workers = args.workers)
+            postprocessor.add_result_callback(lambda number, results: logging.info("Frame {}: {}".format(number, results)))
+            engine.add_frame_callback(postprocessor)
+        engine.add_frame_callback(lambda frame: frame_done.set())
+        engine.start()
+        for reporter in reporters:
+            reporter.start()
+        try:
+            for scan_nr in range(args.scans):
+                frame_done.clear()
+                logging.info("Scan {} of {}".format(scan_nr + 1, args.scans))
+                if args.refine is not None:
+                    engine.start_refined_scan(args.refine)
+                else:
+                    engine.start_scan()
+                if not frame_done.wait(args.timeout):
+                    logging.error("Scan did not complete in {} seconds".format(args.timeout))
+                    return 1
+            if history is not None:
+                np.save(os.path.join(args.output, "mean.npy"), history.mean())
+                np.save(os.path.join(args.output, "noise.npy"), history.noise())
+                logging.info("Saved mean and noise of {} scans".format(len(history)))
+        finally:
+            engine.stop()
+            for reporter in reporters:
+                reporter.join()
+            if recorder is not None:
+                recorder.close()
+            if postprocessor is not None:
+                postprocessor.close()
+            if args.capture is not None:
+                serial_port.capture.close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
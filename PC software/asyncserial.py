@@ -0,0 +1,320 @@
+"""
+asyncio based link to thermal camera - an alternative to SerialMonitorThread + CmdParser threads.
+
+One event loop can drive several cameras:
+
+    thermal_data = ThermalData(64)
+    camera = await open_camera("/dev/ttyACM0", thermal_data)
+    await camera.start_scan()
+    print(await camera.ask_temp_object())
+
+Works on POSIX only (serial port file descriptor is watched by the event loop).
+"""
+
+import os
+import time
+import asyncio
+import logging
+import itertools
+import functools
+import collections
+
+import serial
+
+from serialHelpers import FrameDecoder, ScanLine, parse_info
+from cmdparser import CmdParser
+from thermalcamera import scan_points, scan_command
+
+# Commands device sends as answers to questions
+REPLIES = ("INFO", "ABSPOS", "OCRA", "OBJECT", "AMBIENT", "PROTO", "GRID")
+# Answers to readings - if sensor can not be read, device answers only with PARSE_FAILED warning
+READING_REPLIES = ("OBJECT", "AMBIENT")
+PARSE_FAILED = "Command could not be parsed."
+
+
+class ReadingFailed(Exception):
+    """ Device could not read the sensor """
+
+
+class SerialTransport(asyncio.Transport):
+    """
+    Transport on top of a (non-blocking) file descriptor of a serial port.
+    If serial_port is given, it will be closed together with transport.
+    """
+
+    def __init__(self, loop, fd, protocol, serial_port = None):
+        asyncio.Transport.__init__(self, {"serial": serial_port})
+        self._loop = loop
+        self._fd = fd
+        self._protocol = protocol
+        self._serial_port = serial_port
+        self._write_buffer = bytearray()  # bytes that could not be written yet
+        self._closing = False
+
+        os.set_blocking(fd, False)
+        loop.add_reader(fd, self._read_ready)
+        loop.call_soon(protocol.connection_made, self)
+
+    def _read_ready(self):
+        try:
+            data = os.read(self._fd, 4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._close(e)
+            return
+        if data:
+            self._protocol.data_received(data)
+        else:
+            self._close(None)
+
+    def write(self, data):
+        if self._closing:
+            return
+        if self._write_buffer:
+            self._write_buffer += data
+            return
+        try:
+            written = os.write(self._fd, data)
+        except (BlockingIOError, InterruptedError):
+            written = 0
+        except OSError as e:
+            self._close(e)
+            return
+        if written < len(data):
+            self._write_buffer += data[written:]
+            self._loop.add_writer(self._fd, self._write_ready)
+
+    def _write_ready(self):
+        try:
+            written = os.write(self._fd, self._write_buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._close(e)
+            return
+        del self._write_buffer[:written]
+        if not self._write_buffer:
+            self._loop.remove_writer(self._fd)
+
+    def get_write_buffer_size(self):
+        return len(self._write_buffer)
+
+    def is_closing(self):
+        return self._closing
+
+    def close(self):
+        self._close(None)
+
+    def _close(self, exc):
+        if self._closing:
+            return
+        self._closing = True
+        self._loop.remove_reader(self._fd)
+        if self._write_buffer:
+            self._loop.remove_writer(self._fd)
+        if self._serial_port is not None:
+            self._serial_port.close()
+        self._loop.call_soon(self._protocol.connection_lost, exc)
+
+
+class ThermalCameraProtocol(asyncio.Protocol):
+    """
+    Splits received bytes into messages (like SerialMonitorThread),
+    parses them into thermal_data (like CmdParser thread)
+    and resolves futures waiting for answers.
+    If stats (instrumentation.Stats) is given, received bytes, messages and parse times are counted.
+    """
+
+    def __init__(self, thermal_data, stats = None):
+        self.thermal_data = thermal_data
+        self.transport = None
+        self.stats = stats
+        self.parser = CmdParser(None, thermal_data, stats = stats)  # only used for parsing, thread is not started
+        self._decoder = FrameDecoder()
+        self._waiters = collections.defaultdict(collections.deque)  # answer command -> (number, future) waiting for it
+        self._requests = itertools.count()  # numbers of requests in the order they were sent
+        self._warned = False  # true if last warning explains the next PARSE_FAILED (which is not a failed reading)
+        self._scan_waiters = []  # [points left, future] for every scan waited for
+        for reply in REPLIES:
+            self.parser.register_handler(reply, functools.partial(self._reply_received, reply))
+        self.parser.register_handler("WARNING", self._warning_received)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        error = ConnectionError("Connection to device lost") if exc is None else exc
+        for waiters in self._waiters.values():
+            for (unused_number, future) in waiters:  # @UnusedVariable
+                if not future.done():
+                    future.set_exception(error)
+            waiters.clear()
+        for (unused_points, future) in self._scan_waiters:  # @UnusedVariable
+            if not future.done():
+                future.set_exception(error)
+        self._scan_waiters = []
+
+    def data_received(self, data):
+        messages = self._decoder.feed(data)
+        if self.stats is not None:
+            self.stats.count("bytes_read", len(data))
+            self.stats.count("messages_framed", len(messages))
+        if not messages:
+            return
+        if self.stats is None:
+            self.parser.parse_messages(messages)
+        else:
+            start = time.perf_counter()
+            self.parser.parse_messages(messages)
+            self.stats.time("parse_time", time.perf_counter() - start)
+        if self._scan_waiters:
+            self._count_scan_points(sum(len(message.values) // 2 if isinstance(message, ScanLine) else message.startswith("Scan:")
+                                        for message in messages))
+
+    def set_binary(self, enabled):
+        """ enables decoding of binary scan lines (see FrameDecoder) """
+        self._decoder.binary = enabled
+
+    def send(self, message):
+        """ sends a message to device """
+        self.transport.write(("<" + message + ">").encode())
+        logging.debug("Sent message: " + str(message))
+
+    def request(self, message, reply):
+        """ sends a message, returns future that resolves to arguments of next "reply" command """
+        future = asyncio.get_event_loop().create_future()
+        self._waiters[reply].append((next(self._requests), future))
+        self.send(message)
+        return future
+
+    def expect_scan(self, points):
+        """ returns future that resolves when given number of data-points have been received """
+        future = asyncio.get_event_loop().create_future()
+        self._scan_waiters.append([points, future])
+        return future
+
+    def _reply_received(self, reply, arguments):
+        self._warned = False
+        waiters = self._waiters[reply]
+        while waiters:
+            (unused_number, future) = waiters.popleft()  # @UnusedVariable
+            if not future.done():  # could have been cancelled (timeout)
+                future.set_result(arguments)
+                return True
+        logging.debug("Unexpected answer from device: {}:{}".format(reply, arguments))
+        return True
+
+    def _warning_received(self, message):
+        """
+        Failed sensor reading has no answer, only PARSE_FAILED warning. Oldest reading asked
+        gets ReadingFailed, so next answers go to the right futures. Other failed commands
+        send their own warning before PARSE_FAILED.
+        """
+        logging.warning("Device: " + message)
+        if message != PARSE_FAILED:
+            self._warned = True
+            return True
+        if self._warned:
+            self._warned = False
+            return True
+        pending = [waiters for waiters in (self._waiters[reply] for reply in READING_REPLIES) if waiters]
+        if pending:
+            waiters = min(pending, key = lambda waiters: waiters[0][0])
+            (unused_number, future) = waiters.popleft()  # @UnusedVariable
+            if not future.done():
+                future.set_exception(ReadingFailed("Device could not read the sensor"))
+        return True
+
+    def _count_scan_points(self, count):
+        for waiter in self._scan_waiters:
+            waiter[0] -= count
+            if waiter[0] <= 0 and not waiter[1].done():
+                waiter[1].set_result(None)
+        self._scan_waiters = [waiter for waiter in self._scan_waiters if not waiter[1].done()]
+
+
+class AsyncThermalCamera(object):
+    """
+    Same commands as thermalcamera.ThermalCamera, but every command
+    is a coroutine that finishes when device has answered.
+    """
+
+    def __init__(self, protocol, timeout = 1.0):
+        self.protocol = protocol
+        self.timeout = timeout  # seconds to wait for an answer
+
+    @property
+    def thermal_data(self):
+        return self.protocol.thermal_data
+
+    async def _request(self, message, reply):
+        return await asyncio.wait_for(self.protocol.request(message, reply), self.timeout)
+
+    async def start_scan(self, timeout = None, window = None, stride = 1):
+        """ starts scanning (window and stride as in thermalcamera.ThermalCamera.start_scan),
+            finishes when all data-points of the scan have been received """
+        (width, height) = (self.thermal_data.width, self.thermal_data.height)
+        if window is None and stride != 1:
+            window = (0, 0, width - 1, height - 1)
+        points = scan_points(width, height, window, stride)
+        self.thermal_data.new_frame(points)
+        done = self.protocol.expect_scan(points)
+        self.protocol.send(scan_command(window, stride))
+        await asyncio.wait_for(done, timeout)
+
+    async def set_grid(self, width, height, step_size):
+        """ sets scanning grid of device, returns (width, height, step size) device reports """
+        grid = await self._request("g={},{},{}".format(width, height, step_size), "GRID")
+        return tuple(int(value) for value in grid.split(','))
+
+    async def ask_info(self):
+        return await self._request("i?", "INFO")
+
+    async def read_info(self):
+        """ returns dictionary of fields in device info (see serialHelpers.parse_info) """
+        return parse_info("<INFO:" + await self.ask_info() + ">")
+
+    async def negotiate_protocol(self, info = None, binary = True):
+        """ switches to binary scan protocol if device supports it and binary is wanted,
+            otherwise to text protocol (device keeps protocol of previous session until it is reset)
+            info - fields of device info, asked if not given
+            returns boolean - true if binary is used """
+        if info is None:
+            info = await self.read_info()
+        if "bin1" not in info.get("proto", "").split('|'):
+            return False
+        self.protocol.set_binary(binary)
+        return await self._request("p=1" if binary else "p=0", "PROTO") == "1"
+
+    async def set_servo(self, servo_nr, value):
+        """ sets servo position, returns positions of both servos reported by device """
+        if servo_nr == 0:
+            output = "A"
+        else:
+            output = "B"
+        output += "=" + str(value)
+
+        self.protocol.send(output)
+        # device does not answer to setting the position, ask positions to know it is done
+        positions = await self._request("a?", "ABSPOS")
+        return tuple(int(position) for position in positions.split(','))
+
+    async def ask_temp_object(self):
+        return int(await self._request("to?", "OBJECT"))
+
+    async def ask_temp_ambient(self):
+        return int(await self._request("ta?", "AMBIENT"))
+
+    def close(self):
+        self.protocol.transport.close()
+
+
+async def open_camera(port, thermal_data, timeout = 1.0, stats = None):
+    """ opens serial port, returns AsyncThermalCamera that writes data-points into thermal_data """
+    loop = asyncio.get_running_loop()
+    serial_port = serial.Serial(port, timeout = 0, writeTimeout = 0)
+    protocol = ThermalCameraProtocol(thermal_data, stats)
+    SerialTransport(loop, serial_port.fileno(), protocol, serial_port)
+    await asyncio.sleep(0)  # let connection_made() be called
+    return AsyncThermalCamera(protocol, timeout)
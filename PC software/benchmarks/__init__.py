@@ -0,0 +1,8 @@
+"""
+Benchmarks for the PC software.
+
+Run from the "PC software" directory, for example:
+    python -m benchmarks.decoder
+or the whole ingest-to-display suite (JSON results):
+    python -m benchmarks --output results.json
+"""
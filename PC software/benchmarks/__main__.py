@@ -0,0 +1,104 @@
+"""
+Runs the ingest-to-display benchmark suite and prints results as JSON:
+
+    python -m benchmarks --sizes 64 128 256 --output results.json
+
+Works without a display (figure is rendered with Agg, see benchmarks.gui).
+"""
+
+import sys
+import json
+import time
+import queue
+import random
+import argparse
+import platform
+
+import numpy as np
+import matplotlib
+
+import serialHelpers
+import mlx90614 as sensor
+from cmdparser import CmdParser
+from thermaldata import ThermalData
+from benchmarks import gui
+from benchmarks.common import scan_messages, scan_stream, ChunkedSerial, measure
+
+
+def read_cmd(size, chunk_size = 64, repeat = 3):
+    """ bytes per second through SerialMonitorThread.readCMD """
+    data = scan_stream(size)
+
+    def read():
+        serial_port = ChunkedSerial(data, chunk_size)
+        monitor = serialHelpers.SerialMonitorThread(serial_port, queue.Queue(), queue.Queue())
+        while not serial_port.exhausted:
+            monitor.readCMD()
+
+    (wall, unused_cpu) = measure(read, repeat)  # @UnusedVariable
+    return {"bytes": len(data), "bytes_per_sec": len(data) / wall}
+
+
+def parse_cmd(size, repeat = 3):
+    """ messages per second through CmdParser.parse_CMD """
+    messages = scan_messages(size)
+
+    def parse():
+        parser = CmdParser(None, ThermalData(size))
+        for message in messages:
+            parser.parse_CMD(message)
+
+    (wall, unused_cpu) = measure(parse, repeat)  # @UnusedVariable
+    return {"messages": len(messages), "messages_per_sec": len(messages) / wall}
+
+
+def set_datapoint(size, repeat = 3):
+    """ ThermalData.set_datapoint calls per second """
+    rnd = random.Random(0)
+    points = [(rnd.randrange(size), rnd.randrange(size), rnd.randint(sensor.MIN_READING, sensor.MAX_READING)) for unused_variable in range(size * size)]  # @UnusedVariable
+
+    def set_points():
+        thermal_data = ThermalData(size)
+        for (x, y, value) in points:
+            thermal_data.set_datapoint(x, y, value)
+
+    (wall, unused_cpu) = measure(set_points, repeat)  # @UnusedVariable
+    return {"calls": len(points), "calls_per_sec": len(points) / wall}
+
+
+def run(sizes = (64, 128, 256), repeat = 3, frames = 10):
+    """ returns dictionary of all results """
+    gui_results = gui.benchmark(sizes, frames, repeat)
+    results = {}
+    for size in sizes:
+        results[str(size)] = {"read_cmd": read_cmd(size, repeat = repeat),
+                              "parse_cmd": parse_cmd(size, repeat),
+                              "set_datapoint": set_datapoint(size, repeat),
+                              "gui": gui_results[size]}
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "matplotlib": matplotlib.__version__,
+            "machine": platform.platform(),
+            "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type = int, nargs = '+', default = [64, 128, 256], help = "scan resolutions")
+    parser.add_argument("--repeat", type = int, default = 3, help = "best of how many runs")
+    parser.add_argument("--frames", type = int, default = 10, help = "frames drawn per GUI measurement")
+    parser.add_argument("--output", help = "file to write results to (default: standard output)")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, args.frames)
+    if args.output is None:
+        json.dump(results, sys.stdout, indent = 2, sort_keys = True)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 2, sort_keys = True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+""" Helpers shared by benchmarks """
+
+import time
+import random
+
+import mlx90614 as sensor
+
+
+def scan_messages(size, seed = 0):
+    """ returns list of Scan messages (without framing) for one size x size scan
+        in the same serpentine order as firmware sends them """
+    rnd = random.Random(seed)
+    messages = []
+    for x in range(size):
+        ys = range(size) if x % 2 == 0 else range(size - 1, -1, -1)
+        for y in ys:
+            value = rnd.randint(sensor.MIN_READING, sensor.MAX_READING)
+            messages.append("Scan:{}:{}:{}".format(x, y, value))
+    return messages
+
+
+def scan_stream(size, seed = 0):
+    """ returns bytes of one size x size scan as the firmware sends them """
+    return "".join("<" + message + ">\r\n" for message in scan_messages(size, seed)).encode()
+
+
+class ChunkedSerial(object):
+    """
+    Minimal stand-in for serial.Serial that serves a byte string
+    in chunks of chunk_size bytes (like USB packets arriving).
+    """
+
+    def __init__(self, data, chunk_size = 64):
+        self._data = data
+        self._chunk_size = chunk_size
+        self._position = 0
+        self._available = 0  # bytes of current chunk that are not read yet
+
+    def isOpen(self):
+        return True
+
+    def inWaiting(self):
+        if self._available == 0:
+            self._available = min(self._chunk_size, len(self._data) - self._position)
+        return self._available
+
+    def read(self, size = 1):
+        size = min(size, self.inWaiting())
+        data = self._data[self._position:self._position + size]
+        self._position += size
+        self._available -= size
+        return data
+
+    def write(self, data):
+        return len(data)
+
+    @property
+    def exhausted(self):
+        return self._position >= len(self._data)
+
+
+def measure(function, repeat = 3):
+    """ calls function repeat times
+        returns best (wall time, cpu time) in seconds """
+    best = None
+    for unused_variable in range(repeat):  # @UnusedVariable
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        function()
+        result = (time.perf_counter() - wall_start, time.process_time() - cpu_start)
+        if best is None or result[0] < best[0]:
+            best = result
+    return best
@@ -0,0 +1,86 @@
+"""
+Compares the old byte-at-a-time reader with FrameDecoder based
+SerialMonitorThread.readCMD.
+
+Reports frames (messages) per second and CPU time per frame.
+"""
+
+import queue
+import argparse
+
+import serialHelpers
+from benchmarks.common import scan_stream, ChunkedSerial, measure
+
+
+class LegacyReader(object):
+    """ Reads messages the way SerialMonitorThread.readCMD used to - one byte at a time.
+        (It also loses a message if a read ends right after its start sign) """
+
+    def __init__(self, serial_port, incoming, outgoing):
+        self.serial_port = serial_port
+        self.incoming = incoming
+        self._cmdCharList = []
+
+    def readCMD(self):
+        cmdStarted = len(self._cmdCharList) > 0
+
+        bytesRead = 0
+        waitingCount = self.serial_port.inWaiting()
+        while waitingCount > 0:
+            while not cmdStarted and waitingCount > 0:
+                if self.serial_port.read().decode() == '<':
+                    cmdStarted = True
+                waitingCount -= 1
+                bytesRead += 1
+
+            while cmdStarted and waitingCount > 0:
+                incomingChar = self.serial_port.read().decode()
+                if incomingChar == '>':
+                    message = ''.join(self._cmdCharList)
+                    self._cmdCharList = []
+                    cmdStarted = False
+                    self.incoming.put_nowait([message])
+                else:
+                    self._cmdCharList.append(incomingChar)
+                waitingCount -= 1
+                bytesRead += 1
+
+        return bytesRead
+
+
+def run_reader(reader_class, data, chunk_size):
+    """ reads all of data trough reader, returns number of messages received """
+    serial_port = ChunkedSerial(data, chunk_size)
+    incoming = queue.Queue()
+    reader = reader_class(serial_port, incoming, queue.Queue())
+    while not serial_port.exhausted:
+        reader.readCMD()
+    return sum(len(incoming.get_nowait()) for unused_variable in range(incoming.qsize()))  # @UnusedVariable
+
+
+def benchmark(size = 64, chunk_size = 64, repeat = 3):
+    """ returns dictionary of results for both readers """
+    data = scan_stream(size)
+    results = {}
+    for (name, reader_class) in (("legacy", LegacyReader), ("bulk", serialHelpers.SerialMonitorThread)):
+        frames = run_reader(reader_class, data, chunk_size)
+        (wall, cpu) = measure(lambda: run_reader(reader_class, data, chunk_size), repeat)
+        results[name] = {"frames": frames,
+                         "bytes": len(data),
+                         "frames_per_sec": frames / wall,
+                         "cpu_us_per_frame": cpu / frames * 1e6}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--size", type = int, default = 64, help = "scan resolution")
+    parser.add_argument("--chunk", type = int, default = 64, help = "bytes available per inWaiting()")
+    args = parser.parse_args()
+
+    for (name, result) in benchmark(args.size, args.chunk).items():
+        print("{:8} {:10.0f} frames/s {:8.2f} us CPU/frame ({} frames)".format(name, result["frames_per_sec"], result["cpu_us_per_frame"], result["frames"]))
+
+
+if __name__ == '__main__':
+    main()
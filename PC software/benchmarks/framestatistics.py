@@ -0,0 +1,99 @@
+"""
+Cost of statistics that GUI needs on every redraw (2nd and 98th percentile
+for auto contrast and 64 bin histogram): framestatistics.FrameStatistics kept by
+ThermalData against computing them from the whole frame.
+
+Also checks that incremental counts match counting the data again after
+random batches (with repeated positions) and how far percentiles are
+from exact ones (numpy.percentile).
+"""
+
+import argparse
+
+import numpy as np
+
+import mlx90614 as sensor
+from thermaldata import ThermalData
+from framestatistics import FrameStatistics, BIN_READINGS
+from benchmarks.common import measure
+
+PERCENTILES = (2, 98)
+BINS = 64
+
+
+def check(size, batches = 200, seed = 0):
+    """ returns number of batches after which counts did not match and largest percentile error (readings) """
+    rnd = np.random.RandomState(seed)
+    thermal_data = ThermalData(size)
+    mismatches = 0
+    error = 0.0
+    for batch in range(batches):
+        count = rnd.randint(1, 2 * size)
+        (xs, ys) = (rnd.randint(0, size, count), rnd.randint(0, size, count))
+        thermal_data.set_datapoints(xs, ys, rnd.randint(sensor.MIN_READING, sensor.MAX_READING + 1, count))
+        if batch % 50 == 49:
+            thermal_data.new_frame()
+        expected = FrameStatistics()
+        expected.add(thermal_data.data)
+        statistics = thermal_data.statistics()
+        if (statistics.counts != expected.counts).any() or statistics.count != expected.count:
+            mismatches += 1
+        exact = np.percentile(thermal_data.data, PERCENTILES)
+        error = max(error, float(np.abs(np.array(statistics.percentiles(*PERCENTILES)) - exact).max()))
+    return (mismatches, error)
+
+
+def run(size, repeat):
+    """ returns milliseconds of one column update and of statistics for a redraw, incremental and from the whole frame """
+    thermal_data = ThermalData(size)
+    ys = np.arange(size)
+    column = np.random.RandomState(0).randint(sensor.MIN_READING, sensor.MAX_READING + 1, size)
+    columns = 100
+    (minT, maxT) = (sensor.MIN_READING, sensor.MAX_READING)
+    counts = np.zeros(BINS)
+
+    def updates():
+        for x in range(columns):
+            thermal_data.set_datapoints(np.full(size, x % size), ys, column)
+
+    def incremental():
+        statistics = thermal_data.statistics()
+        statistics.percentiles(*PERCENTILES)
+        statistics.histogram(minT, maxT, BINS, counts)
+
+    def whole_frame():
+        data = thermal_data.snapshot()
+        np.percentile(data, PERCENTILES)
+        np.histogram(data, BINS, (minT, maxT))
+
+    (update_time, unused_cpu) = measure(updates, repeat)  # @UnusedVariable
+    (incremental_time, unused_cpu) = measure(incremental, repeat)  # @UnusedVariable
+    (whole_frame_time, unused_cpu) = measure(whole_frame, repeat)  # @UnusedVariable
+    return {"column_update_ms": update_time / columns * 1000,
+            "incremental_ms": incremental_time * 1000,
+            "whole_frame_ms": whole_frame_time * 1000}
+
+
+def benchmark(sizes = (64, 256, 1024), repeat = 5):
+    """ returns dictionary of results for every frame size """
+    results = {}
+    for size in sizes:
+        results[size] = run(size, repeat)
+        (results[size]["mismatches"], results[size]["percentile_error"]) = check(size)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--sizes", type = int, nargs = '+', default = [64, 256, 1024], help = "frame sizes")
+    args = parser.parse_args()
+
+    for (size, result) in benchmark(args.sizes).items():
+        print("{:5}x{:<5} column update {:6.3f} ms, statistics {:6.3f} ms (whole frame {:7.3f} ms), "
+              "mismatches {}, percentile error {:.1f} readings (bin {})".format(
+              size, size, result["column_update_ms"], result["incremental_ms"], result["whole_frame_ms"],
+              result["mismatches"], result["percentile_error"], BIN_READINGS))
+
+
+if __name__ == '__main__':
+    main()
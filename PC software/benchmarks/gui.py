@@ -0,0 +1,141 @@
+"""
+Measures ThermalCamApp drawing without a display - figure is rendered with
+the Agg backend and tk widgets are replaced by stand-ins (device is not connected).
+
+Reports time per frame of shift_correction, redraw_histogram and cycle
+(fast render mode - blitting, and full redraw mode).
+"""
+
+import argparse
+
+import numpy as np
+import serial
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import mlx90614 as sensor
+from FirstModule import ThermalCamApp
+from acquisition import AcquisitionEngine, AUTO_SHIFT
+from imageprocessing import MAXIMUM_SHIFT
+from benchmarks.common import measure
+
+
+class Slider(dict):
+    """ Stand-in for ttk.Scale - value and options """
+
+    def __init__(self, value):
+        dict.__init__(self)
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class Variable(object):
+    """ Stand-in for tk.BooleanVar """
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class Parent(object):
+    """ Stand-in for tk root - nothing is scheduled """
+
+    def after(self, delay, function):
+        pass
+
+
+class HeadlessApp(ThermalCamApp):
+    """ ThermalCamApp with an acquisition engine that is not connected or started, without tk widgets """
+
+    def __init__(self, size = 64, fast_render = True, shift = 0):
+        self.parent = Parent()
+        self.init_state(fast_render, None)
+        self.use_engine(AcquisitionEngine(serial.Serial(), size, shift = shift))
+
+        self.auto_shift = Variable(shift == AUTO_SHIFT)
+        self.auto_contrast = Variable(True)
+        self.temp_min_slider = Slider(sensor.MIN_READING)
+        self.temp_max_slider = Slider(sensor.MAX_READING)
+        self.shift_slider = Slider(0)
+        self.fps_label = {}
+
+        self.fig = Figure(figsize = (14, 5), dpi = 100)
+        self.ren_canvas = FigureCanvasAgg(self.fig)
+        self.create_figure()
+        self.ren_canvas.draw()
+
+
+def random_frame(size, seed = 0):
+    return np.random.RandomState(seed).randint(sensor.MIN_READING, sensor.MAX_READING, (size, size)).astype(float)
+
+
+def cycle_time(size, fast_render, frames = 10, repeat = 3):
+    """ returns seconds per cycle() when one column of data changes between cycles """
+    app = HeadlessApp(size, fast_render)
+    frame = random_frame(size)
+    app.thermal_data.set_datapoints(*np.meshgrid(np.arange(size), np.arange(size)), frame)
+    app.cycle()
+    ys = np.arange(size)
+
+    def cycles():
+        for n in range(frames):
+            x = n % size
+            app.thermal_data.set_datapoints(np.full(size, x), ys, frame[:, x])
+            app.cycle()
+
+    (wall, unused_cpu) = measure(cycles, repeat)  # @UnusedVariable
+    return wall / frames
+
+
+def benchmark(sizes = (64, 128, 256), frames = 10, repeat = 3):
+    """ returns dictionary of results for every frame size """
+    results = {}
+    for size in sizes:
+        app = HeadlessApp(size, fast_render = False)
+        data = random_frame(size)
+        shifts = range(-MAXIMUM_SHIFT, MAXIMUM_SHIFT + 1)
+
+        def shift_corrections():
+            for shift in shifts:
+                app.shift_correction(data, shift)
+
+        app.thermal_data.set_datapoints(*np.meshgrid(np.arange(size), np.arange(size)), data)
+        statistics = app.thermal_data.statistics()
+
+        def redraw_histograms():
+            for unused_variable in range(frames):  # @UnusedVariable
+                app.redraw_histogram(statistics)
+
+        (shift_time, unused_cpu) = measure(shift_corrections, repeat)  # @UnusedVariable
+        (histogram_time, unused_cpu) = measure(redraw_histograms, repeat)  # @UnusedVariable
+        results[size] = {"shift_correction_ms_per_frame": shift_time / len(shifts) * 1000,
+                         "redraw_histogram_ms_per_frame": histogram_time / frames * 1000,
+                         "cycle_fast_ms_per_frame": cycle_time(size, True, frames, repeat) * 1000,
+                         "cycle_full_ms_per_frame": cycle_time(size, False, frames, repeat) * 1000}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--sizes", type = int, nargs = '+', default = [64, 128, 256], help = "frame sizes")
+    parser.add_argument("--frames", type = int, default = 10, help = "frames drawn per measurement")
+    args = parser.parse_args()
+
+    for (size, result) in benchmark(args.sizes, args.frames).items():
+        print("{:4}x{:<4} shift {:7.3f} ms, histogram {:7.2f} ms, cycle fast {:7.2f} ms, cycle full {:7.2f} ms".format(
+              size, size, result["shift_correction_ms_per_frame"], result["redraw_histogram_ms_per_frame"],
+              result["cycle_fast_ms_per_frame"], result["cycle_full_ms_per_frame"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Stress check of the frame handoff between a writer thread (like the parser)
+and a reader (like the GUI): writer keeps writing frames or scan lines where
+all readings of a batch are equal, reader checks every copy it takes.
+
+A copy is torn if it mixes readings of two batches: a frame that is not
+uniform, or a column (scan line) that is not. ThermalData.snapshot() must never
+return a torn copy (tests/test_thermaldata.py checks it); plain copies of
+ThermalData.data are counted for comparison.
+"""
+
+import time
+import argparse
+import threading
+
+import numpy as np
+
+import mlx90614 as sensor
+from thermaldata import ThermalData
+
+
+class Writer(threading.Thread):
+    """ Writes batches (whole frames or columns) with one reading each, as fast as it can """
+
+    def __init__(self, thermal_data, lines):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.thermal_data = thermal_data
+        self.lines = lines  # write one column at a time, otherwise whole frames
+        self.batches = 0
+        self._running = threading.Event()
+        self._running.set()
+
+    def run(self):
+        (height, width) = self.thermal_data.data.shape
+        (ys, xs) = np.indices((height, width))
+        column_ys = np.arange(height)
+        readings = sensor.MAX_READING - sensor.MIN_READING + 1
+        while self._running.is_set():
+            value = sensor.MIN_READING + self.batches % readings
+            if self.lines:
+                x = self.batches % width
+                self.thermal_data.set_datapoints(np.full(height, x), column_ys, np.full(height, value))
+            else:
+                self.thermal_data.set_datapoints(xs.ravel(), ys.ravel(), np.full(xs.size, value))
+            self.batches += 1
+
+    def join(self, timeout = None):
+        self._running.clear()  # Signal thread to stop
+        threading.Thread.join(self, timeout)  # Wait until it does
+
+
+def torn(copy, lines):
+    """ True if copy mixes readings of two batches """
+    if lines:
+        return bool((copy != copy[0]).any())
+    return bool((copy != copy.flat[0]).any())
+
+
+def run(size, lines, duration):
+    """ returns dictionary of reads and torn copies (snapshot and plain copy) """
+    thermal_data = ThermalData(size)
+    thermal_data.set_datapoints(*np.meshgrid(np.arange(size), np.arange(size)), np.full((size, size), sensor.MIN_READING))
+    writer = Writer(thermal_data, lines)
+    writer.start()
+    results = {"snapshots": 0, "torn_snapshots": 0, "copies": 0, "torn_copies": 0}
+    end = time.perf_counter() + duration
+    try:
+        while time.perf_counter() < end:
+            results["torn_snapshots"] += torn(thermal_data.snapshot(), lines)
+            results["snapshots"] += 1
+            results["torn_copies"] += torn(thermal_data.data.copy(), lines)
+            results["copies"] += 1
+    finally:
+        writer.join()
+    results["batches_written"] = writer.batches
+    return results
+
+
+def benchmark(sizes = (64, 256, 512), duration = 2.0):
+    """ returns dictionary of results for every size and batch kind (frames, lines) """
+    return {(size, kind): run(size, kind == "lines", duration) for size in sizes for kind in ("frames", "lines")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type = int, nargs = '+', default = [64, 256, 512], help = "frame sizes")
+    parser.add_argument("--duration", type = float, default = 2.0, help = "seconds to run every case")
+    args = parser.parse_args()
+
+    for ((size, kind), result) in benchmark(args.sizes, args.duration).items():
+        print("{:4}x{:<4} {:6} written {:7}, snapshots {:6} ({} torn), plain copies {:6} ({} torn)".format(
+              size, size, kind, result["batches_written"], result["snapshots"], result["torn_snapshots"],
+              result["copies"], result["torn_copies"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Replays a serial capture (see serialcapture.py) as fast as possible through
+SerialMonitorThread.readCMD and CmdParser.parse into ThermalData.
+
+Without --capture a capture of simulated scans is made first.
+Reports bytes and messages per second of the whole ingest pipeline.
+"""
+
+import os
+import queue
+import argparse
+import tempfile
+
+import serialHelpers
+from cmdparser import CmdParser
+from thermaldata import ThermalData
+from serialcapture import CaptureWriter, ReplaySerial
+from benchmarks.common import measure
+from benchmarks.protocol import scan_bytes
+
+
+def make_capture(path, size = 64, scans = 1, binary = False, chunk_size = 64, interval = 0.001):
+    """ writes capture of simulated scans, chunk_size bytes arriving every interval seconds """
+    data = scan_bytes(size, binary) * scans
+    capture = CaptureWriter(path)
+    for (n, start) in enumerate(range(0, len(data), chunk_size)):
+        capture.write(data[start:start + chunk_size], n * interval)
+    capture.close()
+    return len(data)
+
+
+def replay(path, size, binary = False):
+    """ runs capture through monitor and parser, returns (bytes, messages, data-points set) """
+    serial_port = ReplaySerial(path, realtime = False)
+    incoming = queue.Queue()
+    monitor = serialHelpers.SerialMonitorThread(serial_port, incoming, queue.Queue())
+    monitor.set_binary(binary)
+    thermal_data = ThermalData(size)
+    parser = CmdParser(None, thermal_data)
+    bytes_read = 0
+    messages = 0
+    while not serial_port.exhausted:
+        bytes_read += monitor.readCMD()
+        while not incoming.empty():
+            batch = incoming.get_nowait()
+            messages += len(batch)
+            parser.parse_messages(batch)
+    return (bytes_read, messages, thermal_data.points_received)
+
+
+def benchmark(path = None, size = 64, scans = 1, binary = False, chunk_size = 64, repeat = 3):
+    """ returns dictionary of results (capture of simulated scans is made if path is not given) """
+    temporary = None
+    if path is None:
+        (handle, temporary) = tempfile.mkstemp(suffix = ".cap")
+        os.close(handle)
+        make_capture(temporary, size, scans, binary, chunk_size)
+        path = temporary
+    try:
+        (bytes_read, messages, points) = replay(path, size, binary)
+        (wall, cpu) = measure(lambda: replay(path, size, binary), repeat)
+    finally:
+        if temporary is not None:
+            os.remove(temporary)
+    return {"bytes": bytes_read,
+            "messages": messages,
+            "points": points,
+            "bytes_per_sec": bytes_read / wall,
+            "messages_per_sec": messages / wall,
+            "cpu_sec": cpu}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--capture", help = "capture file to replay (simulated scans if not given)")
+    parser.add_argument("--size", type = int, default = 64, help = "scan resolution")
+    parser.add_argument("--scans", type = int, default = 1, help = "simulated scans to capture")
+    parser.add_argument("--binary", action = "store_true", help = "binary scan protocol")
+    parser.add_argument("--chunk", type = int, default = 64, help = "bytes per captured read")
+    args = parser.parse_args()
+
+    result = benchmark(args.capture, args.size, args.scans, args.binary, args.chunk)
+    print("{} bytes, {} messages: {:10.0f} bytes/s {:10.0f} messages/s, {:.3f} s CPU".format(
+          result["bytes"], result["messages"], result["bytes_per_sec"], result["messages_per_sec"], result["cpu_sec"]))
+
+
+if __name__ == '__main__':
+    main()
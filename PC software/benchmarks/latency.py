@@ -0,0 +1,78 @@
+"""
+Compares polling and event driven SerialMonitorThread + CmdParser.
+
+A scan is written into a pseudo terminal in small bursts (like the device
+sends it) and instrumentation.LatencyProbe measures time from bytes arriving
+to ThermalData update. CPU time of an idle period is reported as well.
+POSIX only (needs pty).
+"""
+
+import os
+import pty
+import time
+import queue
+import argparse
+
+import serial
+
+import serialHelpers
+from cmdparser import CmdParser
+from thermaldata import ThermalData
+from instrumentation import LatencyProbe
+from benchmarks.common import scan_messages
+
+
+def run_mode(event_driven, size, burst, interval, idle):
+    (master, slave) = pty.openpty()
+    serial_port = serial.Serial(os.ttyname(slave), timeout = 0, writeTimeout = 0)
+    incoming = queue.Queue()
+    probe = LatencyProbe()
+
+    monitor = serialHelpers.SerialMonitorThread(serial_port, incoming, queue.Queue(), event_driven = event_driven, latency_probe = probe)
+    parser = CmdParser(incoming, ThermalData(size), event_driven = event_driven, latency_probe = probe)
+    monitor.daemon = parser.daemon = True
+    monitor.start()
+    parser.start()
+
+    try:
+        messages = ["<" + message + ">\r\n" for message in scan_messages(size)]
+        for start in range(0, len(messages), burst):
+            os.write(master, "".join(messages[start:start + burst]).encode())
+            time.sleep(interval)
+        time.sleep(0.2)  # let the last messages through
+
+        cpu_start = time.process_time()
+        time.sleep(idle)
+        idle_cpu = time.process_time() - cpu_start
+    finally:
+        monitor.join()
+        parser.join()
+        serial_port.close()
+        os.close(master)
+        os.close(slave)
+
+    result = probe.summary()
+    result["idle_cpu_percent"] = idle_cpu / idle * 100
+    return result
+
+
+def benchmark(size = 32, burst = 8, interval = 0.005, idle = 1.0):
+    """ returns dictionary of results for both modes """
+    return {"polling": run_mode(False, size, burst, interval, idle),
+            "event_driven": run_mode(True, size, burst, interval, idle)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--size", type = int, default = 32, help = "scan resolution")
+    parser.add_argument("--burst", type = int, default = 8, help = "messages written at once")
+    parser.add_argument("--interval", type = float, default = 0.005, help = "seconds between bursts")
+    args = parser.parse_args()
+
+    for (name, result) in benchmark(args.size, args.burst, args.interval).items():
+        print("{:13} latency mean {:6.2f} ms, p95 {:6.2f} ms, max {:6.2f} ms ({} messages), idle CPU {:5.2f}%".format(
+              name, result["mean_ms"], result["p95_ms"], result["max_ms"], result["count"], result["idle_cpu_percent"]))
+
+
+if __name__ == '__main__':
+    main()
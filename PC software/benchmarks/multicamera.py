@@ -0,0 +1,56 @@
+"""
+CPU time of multicamera.CameraManager per camera as the number of
+simulated cameras (simulator.PtyDevice) grows.
+
+Reports CPU milliseconds of the manager thread per scanned frame.
+POSIX only (needs pty).
+"""
+
+import argparse
+
+from simulator import PtyDevice, SimulatedThermalCamera
+from multicamera import CameraManager
+
+
+def run(count, size, scans, step_interval):
+    """ returns CPU seconds of manager thread per frame with count cameras """
+    devices = [PtyDevice(SimulatedThermalCamera(resolution = size, step_size = 1), step_interval) for unused_variable in range(count)]  # @UnusedVariable
+    for device in devices:
+        device.start()
+    manager = CameraManager(size)
+    try:
+        cameras = manager.start([device.port for device in devices])
+        assert len(cameras) == count, cameras
+        frames = []
+        for camera in cameras:
+            camera.add_frame_callback(frames.append)
+        cpu_start = manager.cpu_time()
+        for unused_variable in range(scans):  # @UnusedVariable
+            manager.scan_all(60).result()
+        cpu = manager.cpu_time() - cpu_start
+        assert len(frames) == count * scans, len(frames)
+    finally:
+        manager.join()
+        for device in devices:
+            device.close()
+    return cpu / (count * scans)
+
+
+def benchmark(counts = (1, 2, 4, 8), size = 64, scans = 3, step_interval = 0.0001):
+    """ returns dictionary of results for every camera count """
+    return {count: {"cpu_ms_per_frame": run(count, size, scans, step_interval) * 1000} for count in counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--counts", type = int, nargs = '+', default = [1, 2, 4, 8], help = "numbers of cameras")
+    parser.add_argument("--size", type = int, default = 64, help = "scan resolution")
+    parser.add_argument("--scans", type = int, default = 3, help = "scans per camera")
+    args = parser.parse_args()
+
+    for (count, result) in benchmark(args.counts, args.size, args.scans).items():
+        print("{:3} cameras {:8.2f} ms CPU/frame".format(count, result["cpu_ms_per_frame"]))
+
+
+if __name__ == '__main__':
+    main()
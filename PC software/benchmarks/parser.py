@@ -0,0 +1,79 @@
+"""
+Compares per-message parsing (one queue item per message, CmdParser.parse_CMD +
+ThermalData.set_datapoint) with batched parsing (a list of messages per serial
+read, CmdParser.parse + ThermalData.set_datapoints).
+
+Reports pixels per second.
+"""
+
+import queue
+import argparse
+
+from thermaldata import ThermalData
+from cmdparser import CmdParser
+from benchmarks.common import scan_messages, measure
+
+
+class CountingObserver(object):
+    def __init__(self):
+        self.notifications = 0
+
+    def update_notification(self):
+        self.notifications += 1
+
+
+def run_single(messages, size):
+    thermal_data = ThermalData(size)
+    observer = CountingObserver()
+    thermal_data.attach(observer)
+    rx = queue.Queue()
+    parser = CmdParser(rx, thermal_data)
+    for message in messages:
+        rx.put_nowait(message)
+        parser.parse_CMD(rx.get_nowait())
+    return observer.notifications
+
+
+def run_batched(messages, size, batch_size, read_size):
+    thermal_data = ThermalData(size)
+    observer = CountingObserver()
+    thermal_data.attach(observer)
+    rx = queue.Queue()
+    parser = CmdParser(rx, thermal_data, batch_size)
+    for start in range(0, len(messages), read_size):
+        rx.put_nowait(messages[start:start + read_size])
+        if rx.qsize() >= batch_size:
+            parser.parse()
+    while parser.parse():
+        pass
+    return observer.notifications
+
+
+def benchmark(size = 64, batch_size = 64, read_size = 16, repeat = 3):
+    """ returns dictionary of results for both parsing modes """
+    messages = scan_messages(size)
+    results = {}
+    for (name, function) in (("single", lambda: run_single(messages, size)),
+                             ("batched", lambda: run_batched(messages, size, batch_size, read_size))):
+        notifications = function()
+        (wall, cpu) = measure(function, repeat)
+        results[name] = {"pixels": len(messages),
+                         "notifications": notifications,
+                         "pixels_per_sec": len(messages) / wall,
+                         "cpu_us_per_pixel": cpu / len(messages) * 1e6}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--size", type = int, default = 64, help = "scan resolution")
+    parser.add_argument("--batch", type = int, default = 64, help = "queue items parsed at once")
+    parser.add_argument("--read", type = int, default = 16, help = "messages per serial read")
+    args = parser.parse_args()
+
+    for (name, result) in benchmark(args.size, args.batch, args.read).items():
+        print("{:8} {:10.0f} pixels/s {:8.2f} us CPU/pixel ({} notifications)".format(name, result["pixels_per_sec"], result["cpu_us_per_pixel"], result["notifications"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares text ("<Scan:x:y:value>") and binary (scan lines) scan protocols
+using simulator.SimulatedThermalCamera as the device.
+
+Reports bytes per frame and decode throughput (FrameDecoder + CmdParser into ThermalData).
+"""
+
+import argparse
+
+from serialHelpers import FrameDecoder
+from cmdparser import CmdParser
+from thermaldata import ThermalData
+from simulator import SimulatedThermalCamera
+from benchmarks.common import measure
+
+
+def scan_bytes(size, binary):
+    """ returns bytes the simulated device sends for one scan """
+    device = SimulatedThermalCamera(resolution = size, step_size = 1)
+    device.receive(b"<p=1>" if binary else b"<p=0>")
+    device.receive(b"<s>")
+    data = bytearray()
+    while device.scanning:
+        data += device.scan_step()
+    return bytes(data)
+
+
+def decode(data, size, binary, chunk_size):
+    """ decodes data into thermal data, returns number of data-points set """
+    thermal_data = ThermalData(size)
+    decoder = FrameDecoder(binary = binary)
+    parser = CmdParser(None, thermal_data)
+    for start in range(0, len(data), chunk_size):
+        parser.parse_messages(decoder.feed(data[start:start + chunk_size]))
+    return thermal_data.points_received
+
+
+def benchmark(size = 64, chunk_size = 512, repeat = 3):
+    """ returns dictionary of results for both protocols """
+    results = {}
+    for (name, binary) in (("text", False), ("binary", True)):
+        data = scan_bytes(size, binary)
+        points = decode(data, size, binary, chunk_size)
+        assert points == size * size, (name, points)
+        (wall, cpu) = measure(lambda: decode(data, size, binary, chunk_size), repeat)
+        results[name] = {"bytes_per_frame": len(data),
+                         "bytes_per_pixel": len(data) / points,
+                         "frames_per_sec": 1 / wall,
+                         "pixels_per_sec": points / wall,
+                         "cpu_ms_per_frame": cpu * 1000}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--size", type = int, default = 64, help = "scan resolution")
+    parser.add_argument("--chunk", type = int, default = 512, help = "bytes decoded at once")
+    args = parser.parse_args()
+
+    for (name, result) in benchmark(args.size, args.chunk).items():
+        print("{:7} {:7} bytes/frame ({:5.2f} bytes/pixel), {:10.0f} pixels/s, {:7.2f} ms CPU/frame".format(
+              name, result["bytes_per_frame"], result["bytes_per_pixel"], result["pixels_per_sec"], result["cpu_ms_per_frame"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Redraws of ThermalCamApp (headless, see benchmarks/gui.py) driven by
+renderscheduler.RenderScheduler against the old fixed 50 ms cycle.
+
+Scenarios:
+    idle    - no data arrives
+    stream  - a writer thread sets one column every column_interval seconds
+    late    - like stream, but data starts arriving after half of the duration
+    slider  - temperature slider moves (a request every 10 ms), no data
+
+Reports checks (calls of cycle()), redraws, CPU time and how long after the first
+data-point the first redraw came. The event loop is a stand-in for tk mainloop with
+the same after(), after_idle() (callable from other threads) and after_cancel().
+"""
+
+import time
+import heapq
+import argparse
+import threading
+
+import numpy as np
+
+from renderscheduler import RenderScheduler
+from benchmarks.gui import HeadlessApp, random_frame
+
+SCENARIOS = ("idle", "stream", "late", "slider")
+
+
+class EventLoop(object):
+    """ Runs functions given to after() at their time (in real time), functions can be added from any thread """
+
+    def __init__(self):
+        self._queue = []  # (due, id, function)
+        self._cancelled = set()
+        self._ids = 0
+        self._condition = threading.Condition()
+
+    def after(self, delay, function):
+        """ delay in milliseconds, returns id for after_cancel """
+        with self._condition:
+            self._ids += 1
+            heapq.heappush(self._queue, (time.perf_counter() + delay / 1000, self._ids, function))
+            self._condition.notify()
+            return self._ids
+
+    def after_idle(self, function):
+        return self.after(0, function)
+
+    def after_cancel(self, job):
+        with self._condition:
+            self._cancelled.add(job)
+
+    def run(self, duration):
+        end = time.perf_counter() + duration
+        while True:
+            with self._condition:
+                now = time.perf_counter()
+                if now >= end:
+                    break
+                if not self._queue or self._queue[0][0] > now:
+                    due = self._queue[0][0] if self._queue else end
+                    self._condition.wait(min(due, end) - now)
+                    continue
+                (unused_due, job, function) = heapq.heappop(self._queue)  # @UnusedVariable
+                if job in self._cancelled:
+                    self._cancelled.discard(job)
+                    continue
+            function()
+
+
+class Writer(threading.Thread):
+    """ Sets one column of frame every interval seconds, like a scan """
+
+    def __init__(self, thermal_data, frame, interval, delay = 0):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.thermal_data = thermal_data
+        self.frame = frame
+        self.interval = interval
+        self.delay = delay  # seconds before the first column
+        self.first_write = None  # time (time.perf_counter) of the first column
+        self._running = threading.Event()
+        self._running.set()
+
+    def run(self):
+        (height, width) = self.frame.shape
+        ys = np.arange(height)
+        column = 0
+        if self.delay > 0:
+            time.sleep(self.delay)
+        self.first_write = time.perf_counter()
+        while self._running.is_set():
+            x = column % width
+            self.thermal_data.set_datapoints(np.full(height, x), ys, self.frame[:, x])
+            column += 1
+            time.sleep(self.interval)
+
+    def join(self, timeout = None):
+        self._running.clear()  # Signal thread to stop
+        threading.Thread.join(self, timeout)  # Wait until it does
+
+
+class FixedCycle(object):
+    """ Old scheduling - render every interval seconds whatever happens """
+
+    def __init__(self, after, render, interval = 0.05):
+        self._after = after
+        self._render = render
+        self.interval = interval
+
+    def start(self):
+        self._render()
+        self._after(int(self.interval * 1000), self.start)
+
+    def request(self):
+        """ redraw happens on next cycle anyway """
+
+    def wake(self):
+        """ new data is drawn on next cycle anyway """
+
+
+def run(scenario, adaptive, size, duration, column_interval):
+    """ returns dictionary of checks, redraws and CPU time """
+    loop = EventLoop()
+    app = HeadlessApp(size)
+    app.parent = loop
+    frame = random_frame(size)
+    counts = {"checks": 0, "redraws": 0}
+    redraw_times = []
+
+    def cycle():
+        counts["checks"] += 1
+        drawn = app.cycle()
+        counts["redraws"] += int(drawn)
+        if drawn:
+            redraw_times.append(time.perf_counter())
+        return drawn
+
+    cpu_start = time.process_time()
+    if adaptive:
+        app.render_scheduler = RenderScheduler(loop.after, loop.after_cancel, cycle,
+                                               lambda: app.thermal_data.points_written, loop.after_idle, min_pixels = size)
+    else:
+        app.render_scheduler = FixedCycle(loop.after, cycle)
+    app.render_scheduler.start()
+
+    if scenario == "slider":
+        def move(step = 0):
+            app.setTemp(1000 + step, 20000)
+            if not adaptive:
+                app.ren_canvas.draw()  # old setTemp drew the whole figure on every motion event
+                counts["redraws"] += 1
+            loop.after(10, lambda: move(step + 1))
+        move()
+
+    writer = None
+    if scenario in ("stream", "late"):
+        writer = Writer(app.thermal_data, frame, column_interval, duration / 2 if scenario == "late" else 0)
+        writer.start()
+    try:
+        loop.run(duration)
+    finally:
+        if writer is not None:
+            writer.join()
+    cpu = time.process_time() - cpu_start
+    delay = None
+    if writer is not None and writer.first_write is not None:
+        delay = next((redraw - writer.first_write for redraw in redraw_times if redraw >= writer.first_write), None)
+    return {"checks": counts["checks"], "redraws": counts["redraws"], "cpu_s": cpu, "first_redraw_s": delay}
+
+
+def benchmark(scenarios = SCENARIOS, size = 64, duration = 3.0, column_interval = 0.005):
+    """ returns dictionary of results for every scenario (fixed and adaptive) """
+    return {scenario: {"fixed": run(scenario, False, size, duration, column_interval),
+                       "adaptive": run(scenario, True, size, duration, column_interval)} for scenario in scenarios}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs = '+', default = list(SCENARIOS), choices = SCENARIOS)
+    parser.add_argument("--size", type = int, default = 64, help = "frame width and height")
+    parser.add_argument("--duration", type = float, default = 3.0, help = "seconds per scenario")
+    parser.add_argument("--column-interval", type = float, default = 0.005, help = "seconds between columns in stream scenario")
+    args = parser.parse_args()
+
+    for (scenario, results) in benchmark(args.scenarios, args.size, args.duration, args.column_interval).items():
+        for (mode, result) in results.items():
+            delay = "" if result["first_redraw_s"] is None else ", first redraw {:6.3f} s after data".format(result["first_redraw_s"])
+            print("{:7} {:9} {:5} checks {:5} redraws {:7.3f} s CPU{}".format(
+                scenario, mode, result["checks"], result["redraws"], result["cpu_s"], delay))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Scan time per frame of scanscheduler.ScanScheduler against firmware scan,
+on a simulated device with servo and sensor model (simulator.SimulatedServoCamera).
+
+Strategies:
+    firmware    - device scans ("s"), fixed time between data-points
+    sequential  - PC moves, waits fixed dwell, waits for every reading
+    pipelined   - fixed dwell, next setpoint sent before reading has arrived
+    adaptive    - pipelined, dwell learned from probed readings
+    interleaved, adaptive-path - adaptive dwell with other planners
+
+Quality is RMS error (readings) against noise-free scene at the setpoints
+(positions with a reading); sensor noise alone gives about the noise of the model (5 readings).
+With --failures, some asked readings fail (firmware answers only with a warning),
+those positions are marked missing (counted in the last frame).
+--latency is the time bytes take over the link in each direction (USB polling of the
+real device), sequential scans wait for it twice per position, pipelined ones do not.
+POSIX only (needs pty).
+"""
+
+import asyncio
+import argparse
+import functools
+
+import numpy as np
+
+from asyncserial import open_camera
+from simulator import PtyDevice, SimulatedServoCamera, default_scene
+from thermaldata import ThermalData
+from thermalcamera import default_step_size, servo_position
+from scanscheduler import ScanScheduler, DwellController, serpentine_path, interleaved_path, adaptive_path
+
+STRATEGIES = ("firmware", "sequential", "pipelined", "adaptive", "interleaved", "adaptive-path")
+
+
+def truth(size, step_size):
+    """ noise-free readings of default scene at every grid position """
+    frame = np.zeros((size, size))
+    for x in range(size):
+        for y in range(size):
+            frame[y, x] = default_scene(*servo_position(x, y, (size, size, step_size)))
+    return frame
+
+
+async def scan_frames(strategy, port, size, frames, dwell):
+    """ returns list of (seconds, frame) """
+    thermal_data = ThermalData(size)
+    camera = await open_camera(port, thermal_data, timeout = 5)
+    step_size = default_step_size(size, size)
+    try:
+        await camera.set_grid(size, size, step_size)
+        planner = {"interleaved": interleaved_path, "adaptive-path": functools.partial(adaptive_path, stride = 4)}.get(strategy, serpentine_path)
+        controller = DwellController(per_unit = 0, minimum = dwell, maximum = dwell, adaptive = False) if strategy in ("sequential", "pipelined") else DwellController()
+        scheduler = ScanScheduler(camera, planner, dwell = controller,
+                                  pipelined = strategy != "sequential",
+                                  probe_every = 8 if controller.adaptive else 0)
+        loop = asyncio.get_running_loop()
+        results = []
+        for unused_variable in range(frames):  # @UnusedVariable
+            if strategy == "firmware":
+                start = loop.time()
+                await camera.start_scan(timeout = 600)
+                elapsed = loop.time() - start
+            else:
+                elapsed = await scheduler.scan()
+            results.append((elapsed, thermal_data.data.astype(np.float64)))
+        return results
+    finally:
+        camera.close()
+
+
+def run(strategy, size, frames, dwell, seed = 0, failures = 0, latency = 0):
+    """ returns seconds per frame, RMS error and missing positions of the last frame """
+    device = PtyDevice(SimulatedServoCamera(resolution = size, step_size = default_step_size(size, size), seed = seed, failures = failures),
+                       dwell, latency)
+    device.start()
+    try:
+        results = asyncio.run(scan_frames(strategy, device.port, size, frames, dwell))
+    finally:
+        device.close()
+    (unused_seconds, frame) = results[-1]  # @UnusedVariable
+    read = frame != 0
+    error = (frame - truth(size, default_step_size(size, size)))[read]
+    return {"seconds_per_frame": sum(seconds for (seconds, unused_frame) in results) / frames,  # @UnusedVariable
+            "rms_error": float(np.sqrt(np.mean(error * error))),
+            "missing": int(frame.size - np.count_nonzero(read))}
+
+
+def benchmark(strategies = STRATEGIES, size = 16, frames = 3, dwell = 0.02, failures = 0, latency = 0.002):
+    """ returns dictionary of results for every strategy """
+    return {strategy: run(strategy, size, frames, dwell, failures = failures, latency = latency) for strategy in strategies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--strategies", nargs = '+', default = list(STRATEGIES), choices = STRATEGIES)
+    parser.add_argument("--size", type = int, default = 16, help = "grid width and height")
+    parser.add_argument("--frames", type = int, default = 3, help = "frames per strategy (adaptive dwell learns over frames)")
+    parser.add_argument("--dwell", type = float, default = 0.02, help = "fixed dwell (seconds) of firmware, sequential and pipelined")
+    parser.add_argument("--failures", type = float, default = 0, help = "probability that an asked reading fails")
+    parser.add_argument("--latency", type = float, default = 0.002, help = "seconds bytes take over the link in each direction")
+    args = parser.parse_args()
+
+    for (strategy, result) in benchmark(args.strategies, args.size, args.frames, args.dwell, args.failures, args.latency).items():
+        print("{:14} {:8.3f} s/frame  RMS error {:6.1f}  missing {}".format(
+              strategy, result["seconds_per_frame"], result["rms_error"], result["missing"]))
+
+
+if __name__ == '__main__':
+    main()
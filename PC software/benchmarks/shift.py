@@ -0,0 +1,69 @@
+"""
+Compares the old column by column ThermalCamApp.shift_correction with
+imageprocessing.ShiftCorrector. Times automatic shift estimation
+(imageprocessing.estimate_shift) with direct sums and FFT.
+tests/test_imageprocessing.py checks that results are the same.
+
+Reports time per corrected frame for several frame sizes.
+"""
+
+import argparse
+
+import numpy as np
+
+from imageprocessing import ShiftCorrector, MAXIMUM_SHIFT, estimate_shift
+from benchmarks.common import measure
+
+
+def legacy_shift_correction(data, shift):
+    """ ThermalCamApp.shift_correction as it used to be """
+    templist = []
+    for row in np.transpose(data):
+        shift_ammount = (shift - (shift % 2)) // 2
+        templist.append(np.roll(row, shift_ammount))
+        shift = -shift
+    return np.transpose(np.array(templist))
+
+
+def benchmark(sizes = (64, 128, 256), repeat = 3):
+    """ returns dictionary of results for every frame size """
+    corrector = ShiftCorrector(MAXIMUM_SHIFT)
+
+    shifts = range(-MAXIMUM_SHIFT, MAXIMUM_SHIFT + 1)
+    results = {}
+    for size in sizes:
+        data = np.random.random((size, size))
+        out = np.empty_like(data)
+
+        def legacy():
+            for shift in shifts:
+                legacy_shift_correction(data, shift)
+
+        def vectorized():
+            for shift in shifts:
+                corrector.correct(data, shift, out)
+
+        (legacy_time, unused_cpu) = measure(legacy, repeat)  # @UnusedVariable
+        (vectorized_time, unused_cpu) = measure(vectorized, repeat)  # @UnusedVariable
+        (direct_time, unused_cpu) = measure(lambda: estimate_shift(data, MAXIMUM_SHIFT, False), repeat)  # @UnusedVariable
+        (fft_time, unused_cpu) = measure(lambda: estimate_shift(data, MAXIMUM_SHIFT, True), repeat)  # @UnusedVariable
+        results[size] = {"legacy_us_per_frame": legacy_time / len(shifts) * 1e6,
+                         "vectorized_us_per_frame": vectorized_time / len(shifts) * 1e6,
+                         "estimate_direct_us_per_frame": direct_time * 1e6,
+                         "estimate_fft_us_per_frame": fft_time * 1e6}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--sizes", type = int, nargs = '+', default = [64, 128, 256], help = "frame sizes")
+    args = parser.parse_args()
+
+    for (size, result) in benchmark(args.sizes).items():
+        print("{:4}x{:<4} legacy {:9.1f} us/frame, vectorized {:9.1f} us/frame, estimate direct {:9.1f} us, FFT {:9.1f} us".format(
+              size, size, result["legacy_us_per_frame"], result["vectorized_us_per_frame"],
+              result["estimate_direct_us_per_frame"], result["estimate_fft_us_per_frame"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Queue with a size limit and a policy for what happens when it is full.
+
+    BLOCK       - like queue.Queue: put() waits, put_nowait() raises queue.Full
+    DROP_NEWEST - item that is put is thrown away
+    DROP_OLDEST - oldest item in queue is thrown away to make room
+
+Items that have a dropped() method are told when they are thrown away
+(for example to let their producer queue them again later).
+"""
+
+import queue
+
+BLOCK = "block"
+DROP_NEWEST = "drop_newest"
+DROP_OLDEST = "drop_oldest"
+POLICIES = (BLOCK, DROP_NEWEST, DROP_OLDEST)
+
+
+class BoundedQueue(queue.Queue):
+    """
+    queue.Queue that holds up to maxsize items (0 - unlimited) and handles
+    a full queue according to policy. dropped counts thrown away items.
+    put() and put_nowait() return False if the item that was put was thrown away.
+    dropped() of thrown away item is called (if it has one) after the queue is unlocked.
+    """
+
+    def __init__(self, maxsize = 0, policy = BLOCK):
+        if policy not in POLICIES:
+            raise ValueError("policy must be one of {} but it is {}".format(POLICIES, policy))
+        queue.Queue.__init__(self, maxsize)
+        self.policy = policy
+        self.dropped = 0
+
+    def put(self, item, block = True, timeout = None):
+        if self.policy == BLOCK:
+            queue.Queue.put(self, item, block, timeout)
+            return True
+        dropped = None
+        with self.not_full:
+            if 0 < self.maxsize <= self._qsize():
+                self.dropped += 1
+                if self.policy == DROP_NEWEST:
+                    dropped = item
+                else:
+                    # dropped item will never be marked done, new one takes its place in unfinished_tasks
+                    dropped = self._get()
+            else:
+                self.unfinished_tasks += 1
+            if dropped is not item:
+                self._put(item)
+                self.not_empty.notify()
+        if dropped is not None and hasattr(dropped, "dropped"):
+            dropped.dropped()
+        return dropped is not item
+
+    def put_nowait(self, item):
+        return self.put(item, block = False)
@@ -3,40 +3,171 @@ import time
 import queue
 import logging
 
+import numpy as np
+
+from serialHelpers import ScanLine
+
 class CmdParser(threading.Thread):
     """ 
     Thread that parses incoming messages 
     and executes functions accordingly 
     """
-    def __init__(self, rx, thermal_data):
+    def __init__(self, rx, thermal_data, batch_size = 64, event_driven = False, timeout = 0.5, latency_probe = None, stats = None):
         threading.Thread.__init__(self)
         self.rx = rx
         self.thermal_data = thermal_data
+        self.batch_size = batch_size  # maximal number of queue items taken at once
+        # Event driven mode blocks on queue instead of polling it every 10ms.
+        # timeout is how often stopping of thread is checked.
+        self.event_driven = event_driven
+        self.timeout = timeout
+        self.latency_probe = latency_probe  # instrumentation.LatencyProbe or None
+        self.stats = stats  # instrumentation.Stats or None (disabled)
+
+        # functions to call on other commands than Scan (command -> function)
+        self._handlers = {"DEBUG": self._log_device_message(logging.DEBUG),
+                          "WARNING": self._log_device_message(logging.WARNING),
+                          "ERROR": self._log_device_message(logging.ERROR)}
+
+        self._running = threading.Event()  # flag for signalling the stopping of thread
+        self._running.set()
 
     def run(self):
         logging.info("Parser thread starting")
         try:
-            while(True):
-                parsed = self.parse()
-                # if there was nothing to do - sleep a bit..
-                if not parsed:
-                    time.sleep(0.01)
+            while(self._running.is_set()):
+                if self.event_driven:
+                    self.parse(self.timeout)
+                else:
+                    parsed = self.parse()
+                    # if there was nothing to do - sleep a bit..
+                    if not parsed:
+                        time.sleep(0.01)
         finally:
-            logging.error("Parser thread stopped")
+            if self._running.is_set():
+                logging.error("Parser thread stopped")
+            else:
+                logging.info("Parser thread stopped")
 
-    def parse(self):
+    def join(self, timeout = None):
+        self._running.clear()  # Signal thread to stop
+        threading.Thread.join(self, timeout)  # Wait until it does
+
+    def parse(self, timeout = None):
         """
-        Fetches a new message from queue and tries to parse it
-        returns boolean - true if message was successfully parsed
+        Fetches waiting messages (up to batch_size queue items) from queue and parses them.
+        Queue items are message strings or lists of message strings.
+        If timeout is given, waits up to timeout seconds for the first item.
+        returns boolean - true if any message was successfully parsed
+        """
+        messages = []
+        for unused_variable in range(self.batch_size):  # @UnusedVariable
+            try:
+                if timeout is not None and not messages:
+                    item = self.rx.get(timeout = timeout)
+                else:
+                    item = self.rx.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, str):
+                messages.append(item)
+            else:
+                messages.extend(item)
+
+        if self.stats is None or not messages:
+            parsed = self.parse_messages(messages)
+        else:
+            self.stats.gauge("queue_depth", self.rx.qsize())
+            start = time.perf_counter()
+            parsed = self.parse_messages(messages)
+            self.stats.time("parse_time", time.perf_counter() - start)
+            self.stats.count("messages_parsed", len(messages))
+        if messages and self.latency_probe is not None:
+            self.latency_probe.delivered(len(messages))
+        return parsed
+
+    def parse_messages(self, messages):
+        """
+        Parses list of messages.
+        Scan messages are collected and set to thermal data in one batch.
+        returns boolean - true if any message was successfully parsed
+        """
+        scans = []
+        parsed = False
+        for message in messages:
+            if isinstance(message, ScanLine):
+                parsed |= self.parse_scan_line(message)
+            # "Scan:x:y:value"
+            elif message.startswith("Scan:") and message.count(':') == 3:
+                scans.append(message)
+            else:
+                parsed |= self.parse_CMD(message)
+
+        if scans:
+            parsed |= self.parse_scans(scans)
+        return parsed
+
+    def parse_scans(self, scans):
+        """
+        Parses list of "Scan:x:y:value" messages into arrays
+        and sets them to thermal data at once.
+        returns boolean - true if messages were successfully parsed
         """
+        # strip "Scan:" and convert all numbers at once
+        tokens = ":".join(message[5:] for message in scans).split(':')
         try:
-            message = self.rx.get_nowait()
-        except queue.Empty:
-            # Nothing to parse
-            return False
-        parsed = self.parse_CMD(message)
+            numbers = np.array(tokens, dtype = np.int64)
+        except ValueError:
+            numbers = None  # some message is corrupted
+        if numbers is not None and numbers.size == 3 * len(scans):
+            (xs, ys, values) = numbers.reshape(-1, 3).T
+            try:
+                self.thermal_data.check_datapoints(xs, ys, values)
+            except ValueError as e:
+                logging.warning("Could not set Scan batch ({}), parsing one by one".format(e))
+                self._count_error()
+            else:
+                # errors of observers are not errors of the batch
+                self.thermal_data.set_datapoints(xs, ys, values)
+                return True
+
+        # Something in batch is wrong, find out what
+        parsed = False
+        for message in scans:
+            try:
+                (x, y, value) = (int(token) for token in message[5:].split(':'))
+                self.thermal_data.check_datapoints(x, y, value)
+            except ValueError as e:
+                logging.warning(("Serial:\"{}\"\nInvalid Scan command: {}").format(message, e))
+                self._count_error()
+                continue
+            self.thermal_data.set_datapoint(x, y, value)
+            parsed = True
         return parsed
 
+    def parse_scan_line(self, scan_line):
+        """
+        Sets values of binary scan line (column x = line) to thermal data.
+        Values that are 0 are failed readings, they are set as failed (see ThermalData.set_failed()),
+        so every position of line counts towards the frame (like in asyncserial).
+        returns boolean - true if line was successfully parsed
+        """
+        values = np.frombuffer(scan_line.values, '<u2')
+        failed = values == 0
+        ys = np.flatnonzero(~failed)
+        failed_ys = np.flatnonzero(failed)
+        if failed_ys.size:
+            logging.warning("Scan line {} has {} failed readings".format(scan_line.line, failed_ys.size))
+            self._count_error("failed_readings", failed_ys.size)
+        try:
+            self.thermal_data.set_datapoints(np.full(ys.size, scan_line.line), ys, values[ys])
+            self.thermal_data.set_failed(np.full(failed_ys.size, scan_line.line), failed_ys)
+        except ValueError as e:
+            logging.warning("Invalid scan line {}: {}".format(scan_line.line, e))
+            self._count_error()
+            return False
+        return True
+
     def parse_CMD(self, cmd_string):
         """
         Parses supplied string and executes functions accordingly
@@ -52,8 +183,38 @@ class CmdParser(threading.Thread):
                 (x, y, value) = cmd_arguments
                 self.thermal_data.set_datapoint(int(x), int(y), int(value))
                 return True
+            elif cmd_arguments == ["0"]:
+                # "Scan:0" - reading failed (position is not sent), counts towards frame
+                logging.warning("Device: reading of scan position failed")
+                self._count_error("failed_readings")
+                self.thermal_data.set_failed()
+                return True
             else:
                 logging.warning(("Serial:\"{}\"\nScan command has more arguments than needed!").format(cmd_string))
+                self._count_error()
+        elif cmd in self._handlers:
+            return self._handlers[cmd](':'.join(cmd_arguments)) is not False
         else:
             logging.warn(("Unknown serial command recieved: \"{}\"").format(cmd_string))
-        return False
\ No newline at end of file
+            self._count_error("unknown_commands")
+        return False
+
+    def register_handler(self, cmd, handler):
+        """
+        Registers function to be called when command cmd is received.
+        handler gets everything after "cmd:" as a string and may return False if it could not parse it.
+        """
+        self._handlers[cmd] = handler
+
+    def unregister_handler(self, cmd):
+        del self._handlers[cmd]
+
+    def _count_error(self, counter = "parse_errors", n = 1):
+        if self.stats is not None:
+            self.stats.count(counter, n)
+
+    @staticmethod
+    def _log_device_message(level):
+        def handler(message):
+            logging.log(level, "Device: " + message)
+        return handler
@@ -0,0 +1,105 @@
+"""
+History of the last complete frames for averaging readings over several scans.
+
+Frames are kept as raw sensor readings (uint16) in a preallocated ring buffer.
+Per-pixel sums of readings and of their squares are updated on every push
+(oldest frame is subtracted, new one added), so mean and noise are ready
+without going through the history. Sums are integers, so they do not drift.
+"""
+
+import threading
+
+import numpy as np
+
+
+class FrameHistory(object):
+    """
+    Ring buffer of the last length frames of given shape.
+    alpha is the weight of the newest frame in exponential moving average.
+    Can be used as frame callback of acquisition.AcquisitionEngine.
+    """
+
+    def __init__(self, shape, length = 16, alpha = 0.25):
+        if length < 1:
+            raise ValueError("length must be at least 1 but it is {}".format(length))
+        self.shape = tuple(shape)
+        self.length = length
+        self.alpha = alpha
+
+        self._frames = np.zeros((length,) + self.shape, dtype = np.uint16)
+        self._sum = np.zeros(self.shape, dtype = np.int64)
+        self._sum_squares = np.zeros(self.shape, dtype = np.int64)
+        self._ema = np.zeros(self.shape, dtype = np.float64)
+        self._next = 0  # index where next frame is written
+        self.count = 0  # number of frames in history
+        self._lock = threading.Lock()
+
+    def push(self, frame):
+        """ adds frame (readings, rounded to integers) to history, replacing the oldest if history is full """
+        frame = np.asarray(frame)
+        if frame.shape != self.shape:
+            raise ValueError(("frame shape must be {} but it is {}").format(self.shape, frame.shape))
+        with self._lock:
+            slot = self._frames[self._next]
+            if self.count == self.length:
+                oldest = slot.astype(np.int64)
+                self._sum -= oldest
+                self._sum_squares -= oldest * oldest
+            else:
+                self.count += 1
+            np.copyto(slot, np.clip(np.rint(frame), 0, 0xFFFF), casting = 'unsafe')
+            new = slot.astype(np.int64)
+            self._sum += new
+            self._sum_squares += new * new
+
+            if self.count == 1:
+                self._ema[...] = new
+            else:
+                self._ema += self.alpha * (new - self._ema)
+            self._next = (self._next + 1) % self.length
+
+    def __call__(self, frame):
+        self.push(frame)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, age):
+        """ history[0] is the newest frame, history[1] the one before it... (views into buffer) """
+        if not 0 <= age < self.count:
+            raise IndexError("history has {} frames, frame {} asked".format(self.count, age))
+        return self._frames[(self._next - 1 - age) % self.length]
+
+    def frames(self):
+        """ returns copy of frames in history, oldest first """
+        with self._lock:
+            order = (self._next - self.count + np.arange(self.count)) % self.length
+            return self._frames[order]
+
+    def mean(self):
+        """ per-pixel mean of frames in history """
+        with self._lock:
+            if self.count == 0:
+                return np.zeros(self.shape)
+            return self._sum / self.count
+
+    def ema(self):
+        """ per-pixel exponential moving average of all pushed frames """
+        with self._lock:
+            return self._ema.copy()
+
+    def noise(self):
+        """ per-pixel standard deviation (sample) of frames in history - estimate of sensor noise """
+        with self._lock:
+            if self.count < 2:
+                return np.zeros(self.shape)
+            variance = (self._sum_squares - self._sum * self._sum / self.count) / (self.count - 1)
+        return np.sqrt(np.maximum(variance, 0))
+
+    def clear(self):
+        with self._lock:
+            self._sum.fill(0)
+            self._sum_squares.fill(0)
+            self._ema.fill(0)
+            self._next = 0
+            self.count = 0
@@ -0,0 +1,108 @@
+"""
+Statistics of thermal data that are updated as data-points are set, not
+computed from the whole frame: histogram of readings, percentiles and
+minimum and maximum of the frame being scanned.
+
+Counts are kept in fine bins (bin_readings sensor readings each) over the whole
+sensor range. A replaced data-point moves one count from the bin of its old
+reading to the bin of the new one, so updates cost O(changed data-points).
+Percentiles and histograms of any range are computed from the counts
+(O(bins), independent of frame size), within a fine bin readings are
+assumed to be evenly spread, so results are approximate to bin_readings.
+"""
+
+import numpy as np
+
+import mlx90614 as sensor
+
+BIN_READINGS = 8  # readings per fine bin (0.16 degrees celsius)
+
+
+class FrameStatistics(object):
+    """
+    Histogram counts of readings in data (0 - no reading, not counted) and
+    minimum and maximum reading set since new_frame() (None if nothing was set).
+    Not thread safe - ThermalData updates it in its write section and gives consistent copies to readers.
+    """
+
+    def __init__(self, minimum = sensor.MIN_READING, maximum = sensor.MAX_READING, bin_readings = BIN_READINGS):
+        self.low = minimum
+        self.bin_readings = bin_readings
+        self.counts = np.zeros((maximum - minimum) // bin_readings + 1, dtype = np.intp)
+        self.count = 0  # number of readings counted
+        self.minimum = None
+        self.maximum = None
+
+    def _bins(self, values):
+        values = np.asarray(values).ravel()
+        values = values[values != 0]
+        return (values.astype(np.intp) - self.low) // self.bin_readings
+
+    def add(self, values):
+        bins = self._bins(values)
+        self.counts += np.bincount(bins, minlength = self.counts.size)
+        self.count += bins.size
+
+    def remove(self, values):
+        bins = self._bins(values)
+        self.counts -= np.bincount(bins, minlength = self.counts.size)
+        self.count -= bins.size
+
+    def replace_value(self, old, new):
+        """ one data-point changed from old to new reading """
+        if old != 0:
+            self.counts[(int(old) - self.low) // self.bin_readings] -= 1
+            self.count -= 1
+        if new != 0:
+            self.counts[(int(new) - self.low) // self.bin_readings] += 1
+            self.count += 1
+
+    def update_extremes(self, minimum, maximum):
+        """ takes minimum and maximum of readings just set """
+        if self.minimum is None or self.minimum > minimum:
+            self.minimum = int(minimum)
+        if self.maximum is None or self.maximum < maximum:
+            self.maximum = int(maximum)
+
+    def new_frame(self):
+        """ forgets minimum and maximum (counts describe data, which is kept) """
+        self.minimum = None
+        self.maximum = None
+
+    def clear(self):
+        self.counts.fill(0)
+        self.count = 0
+        self.new_frame()
+
+    def copy(self):
+        copy = FrameStatistics.__new__(FrameStatistics)
+        copy.__dict__.update(self.__dict__)
+        copy.counts = self.counts.copy()
+        return copy
+
+    def _cumulative(self):
+        """ number of readings below the start of every bin (and below the end of the last one) """
+        cumulative = np.zeros(self.counts.size + 1, dtype = np.intp)
+        np.cumsum(self.counts, out = cumulative[1:])
+        return cumulative
+
+    def percentiles(self, *percents):
+        """ returns approximate readings (floats) below which given percents of readings are,
+            None if there are no readings. 0 and 100 give (approximate) lowest and highest reading. """
+        if self.count == 0:
+            return None
+        cumulative = self._cumulative()
+        targets = np.maximum(np.asarray(percents, dtype = np.float64) / 100 * self.count, 1e-9)
+        ends = np.clip(np.searchsorted(cumulative, targets), 1, self.counts.size)
+        fractions = (targets - cumulative[ends - 1]) / np.maximum(self.counts[ends - 1], 1)
+        return [float(value) for value in self.low + (ends - 1 + fractions) * self.bin_readings]
+
+    def histogram(self, minimum, maximum, bins = 64, out = None):
+        """ returns (approximate) counts of readings in bins equal bins between minimum and maximum
+            (floats, written into out if given) """
+        edges = (np.linspace(minimum, maximum, bins + 1) - self.low) / self.bin_readings
+        cumulative = np.interp(edges, np.arange(self.counts.size + 1), self._cumulative())
+        if out is None:
+            return np.diff(cumulative)
+        np.subtract(cumulative[1:], cumulative[:-1], out = out)
+        return out
@@ -0,0 +1,126 @@
+""" Image processing functions that do not depend on GUI """
+
+import numpy as np
+
+MAXIMUM_SHIFT = 8  # largest shift (positions) between columns scanned in opposite directions
+FFT_LAGS_PER_LEVEL = 10  # FFT is used if there are more lags than this times log2 of FFT length (direct sums are faster otherwise)
+
+
+class ShiftCorrector(object):
+    """
+    When images are scanned, columns get shifted because of servo movement direction
+    (every other column is scanned in opposite direction).
+    Shifts data columns back: column i is rolled by floor(shift / 2) if i is even
+    and by floor(-shift / 2) if i is odd.
+
+    Index maps for every shift in -max_shift..max_shift are computed once per image shape,
+    so correcting an image is a single gather.
+    """
+
+    def __init__(self, max_shift):
+        self.max_shift = max_shift
+        self._index_maps = {}  # shape -> array of flat index maps (one for every shift)
+
+    def index_map(self, shape, shift):
+        """ returns flat indexes of data, that make up the corrected image """
+        if shape not in self._index_maps:
+            self._index_maps[shape] = self._create_index_maps(shape)
+        return self._index_maps[shape][shift + self.max_shift]
+
+    def _create_index_maps(self, shape):
+        (height, width) = shape
+        rows = np.arange(height).reshape(-1, 1)
+        columns = np.arange(width)
+        # column shift sign alternates, floor division rounds odd shifts the same way as before
+        signs = np.where(columns % 2 == 0, 1, -1)
+        shifts = np.arange(-self.max_shift, self.max_shift + 1).reshape(-1, 1)
+        rolls = (shifts * signs) // 2  # (shift, column)
+        source_rows = (rows[np.newaxis] - rolls[:, np.newaxis, :]) % height  # (shift, row, column)
+        return source_rows * width + columns
+
+    def correct(self, data, shift, out = None, columns = None):
+        """
+        returns shift corrected copy of data (written into out if given).
+        If columns (a slice) is given, only these columns of out are corrected (out is required).
+        """
+        if abs(shift) > self.max_shift:
+            raise ValueError(("shift must be between {} and {} but it is {}").format(-self.max_shift, self.max_shift, shift))
+        data = np.asarray(data)
+        index_map = self.index_map(data.shape, shift)
+        if columns is None:
+            return np.take(data, index_map, out = out)
+        out[:, columns] = np.take(data, index_map[:, columns])
+        return out
+
+
+def column_correlation(data, max_shift, fft = None):
+    """
+    Normalised cross-correlation between every even column of data and its odd neighbours
+    for lags -max_shift..max_shift (mean of every column is removed, all column pairs are summed),
+    peaks at the shift that aligns odd columns with even ones.
+    fft - use FFT or direct sums (default - whichever is faster, see FFT_LAGS_PER_LEVEL)
+    returns array of 2 * max_shift + 1 correlations, index max_shift is lag 0
+    """
+    data = np.asarray(data, dtype = np.float64)
+    height = data.shape[0]
+    max_shift = min(max_shift, height - 1)
+    columns = data - data.mean(axis = 0)
+    # pairs (0, 1), (2, 1), (2, 3), (4, 3)... - even column first
+    even = np.concatenate((columns[:, 0:-1:2], columns[:, 2::2]), axis = 1)
+    odd = np.concatenate((columns[:, 1::2], columns[:, 1:-1:2]), axis = 1)
+    lags = np.arange(-max_shift, max_shift + 1)
+    n = 1 << (2 * height - 1).bit_length()  # FFT length, zero padded - no wrap around
+    if fft is None:
+        fft = len(lags) > FFT_LAGS_PER_LEVEL * (n.bit_length() - 1)
+    if fft:
+        products = np.conj(np.fft.rfft(even, n, axis = 0)) * np.fft.rfft(odd, n, axis = 0)
+        correlation = np.fft.irfft(products.sum(axis = 1), n)[lags % n]
+    else:
+        correlation = np.empty(len(lags))
+        for (index, lag) in enumerate(lags):
+            (start, stop) = (max(0, -lag), height - max(0, lag))  # overlapping rows
+            correlation[index] = np.einsum('ij,ij->', even[start:stop], odd[start + lag:stop + lag])
+    # normalised by energy of overlapping parts (a longer overlap alone does not make correlation higher)
+    starts = np.maximum(0, -lags)
+    stops = height - np.maximum(0, lags)
+    even_energy = np.concatenate(([0], np.cumsum(np.einsum('ij,ij->i', even, even))))
+    odd_energy = np.concatenate(([0], np.cumsum(np.einsum('ij,ij->i', odd, odd))))
+    energy = (even_energy[stops] - even_energy[starts]) * (odd_energy[stops + lags] - odd_energy[starts + lags])
+    return correlation / np.sqrt(np.maximum(energy, np.finfo(np.float64).tiny))
+
+
+def estimate_shift(data, max_shift = MAXIMUM_SHIFT, fft = None):
+    """ returns shift (for ShiftCorrector) that best aligns columns scanned in opposite directions,
+        0 if no shift is better than none (flat image) """
+    if np.shape(data)[1] < 2:
+        return 0
+    correlation = column_correlation(data, max_shift, fft)
+    max_shift = len(correlation) // 2
+    best = int(np.argmax(correlation))
+    if correlation[best] <= correlation[max_shift]:
+        return 0
+    return best - max_shift
+
+
+class ShiftEstimator(object):
+    """
+    Automatic shift: estimated from a completed frame (estimate_shift) and kept until
+    scan parameters (anything comparable - grid, stride...) change, so it is not
+    computed again on every frame or redraw.
+    """
+
+    def __init__(self, max_shift = MAXIMUM_SHIFT):
+        self.max_shift = max_shift
+        self.shift = 0
+        self.parameters = None  # scan parameters shift was estimated for (None - not estimated)
+
+    def update(self, frame, parameters):
+        """ estimates shift from frame if it has not been estimated for these parameters, returns shift """
+        if self.parameters is None or self.parameters != parameters:
+            self.shift = estimate_shift(frame, self.max_shift)
+            self.parameters = parameters
+        return self.shift
+
+    def invalidate(self):
+        """ estimates shift again from next frame """
+        self.parameters = None
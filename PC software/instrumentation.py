@@ -0,0 +1,248 @@
+""" Measuring tools for the data pipeline """
+
+import json
+import time
+import bisect
+import logging
+import threading
+import collections
+import http.server
+
+import numpy as np
+
+
+class LatencyProbe(object):
+    """
+    Measures time from bytes arriving at serial port to ThermalData update.
+
+    SerialMonitorThread calls arrived() when it has framed messages,
+    CmdParser calls delivered() after the same messages are parsed.
+    Messages pass the queue in order, so arrivals are matched first-in-first-out.
+    """
+
+    def __init__(self, max_samples = 100000):
+        self._arrivals = collections.deque()  # [timestamp, message count] of every read
+        self._samples = collections.deque(maxlen = max_samples)  # latencies in seconds
+        self._lock = threading.Lock()
+
+    def arrived(self, count, timestamp = None):
+        """ count messages arrived at timestamp (defaults to now) """
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        self._arrivals.append([timestamp, count])
+
+    def delivered(self, count, timestamp = None):
+        """ count oldest arrived messages have been delivered at timestamp (defaults to now) """
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        with self._lock:
+            while count > 0 and self._arrivals:
+                arrival = self._arrivals[0]
+                taken = min(count, arrival[1])
+                self._samples.extend([timestamp - arrival[0]] * taken)
+                arrival[1] -= taken
+                count -= taken
+                if arrival[1] == 0:
+                    self._arrivals.popleft()
+
+    def reset(self):
+        with self._lock:
+            self._arrivals.clear()
+            self._samples.clear()
+
+    def summary(self):
+        """ returns dictionary of latency statistics (milliseconds) of recorded messages """
+        with self._lock:
+            samples = np.array(self._samples) * 1000
+        if samples.size == 0:
+            return {"count": 0}
+        return {"count": int(samples.size),
+                "mean_ms": float(samples.mean()),
+                "median_ms": float(np.median(samples)),
+                "p95_ms": float(np.percentile(samples, 95)),
+                "max_ms": float(samples.max())}
+
+
+class FrameRateCounter(object):
+    """
+    Counts rendered frames and their draw times over a sliding time window.
+    Call tick(draw_time) after every rendered frame.
+    """
+
+    def __init__(self, window = 1.0):
+        self.window = window  # seconds
+        self._frames = collections.deque()  # (timestamp, draw time) of frames in window
+
+    def tick(self, draw_time, timestamp = None):
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        self._frames.append((timestamp, draw_time))
+        while self._frames[0][0] < timestamp - self.window:
+            self._frames.popleft()
+
+    @property
+    def fps(self):
+        """ frames per second rendered during last window """
+        start = time.perf_counter() - self.window
+        return sum(1 for (timestamp, unused_draw_time) in self._frames if timestamp >= start) / self.window  # @UnusedVariable
+
+    @property
+    def frame_time(self):
+        """ average draw time (seconds) of frames in window """
+        if not self._frames:
+            return 0.0
+        return sum(draw_time for (unused_timestamp, draw_time) in self._frames) / len(self._frames)  # @UnusedVariable
+
+
+class TimingHistogram(object):
+    """
+    Counts durations into logarithmic buckets (upper bounds in seconds: 10us, 20us, 50us ... 10s, inf).
+    Keeps count, total and maximum, so mean is exact and percentiles are bucket upper bounds.
+    """
+
+    BOUNDS = tuple(mantissa * 10.0 ** exponent for exponent in range(-5, 1) for mantissa in (1, 2, 5)) + (10.0, float("inf"))
+
+    def __init__(self):
+        self.counts = [0] * len(self.BOUNDS)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    def percentile(self, percent):
+        """ returns upper bound (seconds) of bucket where percent of durations fall under """
+        needed = self.count * percent / 100
+        seen = 0
+        for (bound, count) in zip(self.BOUNDS, self.counts):
+            seen += count
+            if count and seen >= needed:
+                return min(bound, self.maximum)
+        return 0.0
+
+    def snapshot(self):
+        """ returns dictionary of statistics (milliseconds) """
+        if self.count == 0:
+            return {"count": 0}
+        return {"count": self.count,
+                "mean_ms": self.total / self.count * 1000,
+                "p50_ms": self.percentile(50) * 1000,
+                "p95_ms": self.percentile(95) * 1000,
+                "max_ms": self.maximum * 1000}
+
+
+class Stats(object):
+    """
+    Counters, gauges (last value) and timing histograms of one pipeline stage.
+    Stages keep a stats attribute that is None when statistics are disabled,
+    so the only cost then is one "is not None" check.
+    """
+
+    def __init__(self):
+        self._counters = collections.Counter()
+        self._gauges = {}
+        self._timings = collections.defaultdict(TimingHistogram)
+        self._lock = threading.Lock()
+
+    def count(self, name, n = 1):
+        with self._lock:
+            self._counters[name] += n
+
+    def gauge(self, name, value):
+        self._gauges[name] = value
+
+    def time(self, name, seconds):
+        with self._lock:
+            self._timings[name].record(seconds)
+
+    def snapshot(self):
+        """ returns dictionary of all counters, gauges and timings """
+        with self._lock:
+            snapshot = dict(self._counters)
+            snapshot.update(self._gauges)
+            snapshot.update((name, timing.snapshot()) for (name, timing) in self._timings.items())
+        return snapshot
+
+
+class StatsRegistry(object):
+    """ Named Stats of all pipeline stages ("serial", "parser", "gui", ...) """
+
+    def __init__(self):
+        self._stats = collections.OrderedDict()
+        self._started = time.time()
+
+    def get(self, name):
+        """ returns Stats for name (created when asked for the first time) """
+        if name not in self._stats:
+            self._stats[name] = Stats()
+        return self._stats[name]
+
+    def snapshot(self):
+        snapshot = {"uptime": time.time() - self._started}
+        snapshot.update((name, stats.snapshot()) for (name, stats) in list(self._stats.items()))
+        return snapshot
+
+
+class StatsLogger(threading.Thread):
+    """ Thread that logs a snapshot of registry every interval seconds """
+
+    def __init__(self, registry, interval = 10.0, level = logging.INFO):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.registry = registry
+        self.interval = interval
+        self.level = level
+
+        self._stopped = threading.Event()  # flag for signalling the stopping of thread (wakes it up too)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            logging.log(self.level, "Stats: " + json.dumps(self.registry.snapshot(), sort_keys = True))
+
+    def join(self, timeout = None):
+        self._stopped.set()  # Signal thread to stop
+        threading.Thread.join(self, timeout)  # Wait until it does
+
+
+class StatsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """ Answers every GET with JSON snapshot of server's registry """
+
+    def do_GET(self):
+        body = json.dumps(self.server.registry.snapshot(), sort_keys = True).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # requests are not logged
+
+
+class StatsServer(threading.Thread):
+    """
+    Serves snapshot of registry as JSON over HTTP (any path),
+    by default only on local machine: curl http://localhost:8765/
+    """
+
+    def __init__(self, registry, port = 8765, host = "127.0.0.1"):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.registry = registry
+
+        self.server = http.server.ThreadingHTTPServer((host, port), StatsRequestHandler)
+        self.server.registry = registry
+        self.port = self.server.server_address[1]
+
+    def run(self):
+        self.server.serve_forever()
+
+    def join(self, timeout = None):
+        self.server.shutdown()
+        self.server.server_close()
+        threading.Thread.join(self, timeout)
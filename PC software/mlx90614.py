@@ -1,10 +1,14 @@
 """ This file contains information from sensor manual"""
 
+import numpy as np
+
 # maximal and minimal temperature readings
 MAX_READING = 0x7FFF
 MIN_READING = 0x27AD
 
-def reading2celsius(self, reading):
-    """ Converts sensor reading to celsius """
-    celsius = reading / 50 - 273.15
+def reading2celsius(reading, out = None):
+    """ Converts sensor reading (number or array of readings) to celsius
+        (result is written into out array if given) """
+    celsius = np.divide(reading, 50, out = out)
+    celsius -= 273.15
     return celsius
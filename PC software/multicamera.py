@@ -0,0 +1,156 @@
+"""
+Several thermal cameras on one host.
+
+CameraManager finds every port where a device answers the info handshake and
+drives all cameras from one asyncio event loop (see asyncserial.py) in one thread,
+so there is no serial monitor + parser thread pair per camera.
+
+    manager = CameraManager()
+    manager.start()
+    for camera in manager.cameras.values():
+        camera.add_frame_callback(lambda frame, port = camera.port: print(port, frame.mean()))
+    manager.scan_all().result()
+    manager.join()
+
+POSIX only (like asyncserial.py).
+"""
+
+import time
+import asyncio
+import logging
+import threading
+import concurrent.futures
+
+import serialHelpers
+from asyncserial import open_camera
+from thermaldata import ThermalData
+from thermalcamera import DEFAULT_GRID, default_step_size
+from instrumentation import StatsRegistry
+from acquisition import INFO_QUESTION, INFO_RESPONSE
+
+
+class ManagedCamera(object):
+    """
+    One camera of CameraManager: its thermal data, asyncserial.AsyncThermalCamera and statistics.
+    Frame callbacks get a copy of every completed frame (called from manager thread).
+    """
+
+    def __init__(self, port, thermal_data, stats):
+        self.port = port
+        self.thermal_data = thermal_data
+        self.stats = stats
+        self.camera = None  # asyncserial.AsyncThermalCamera, set when port is opened
+        self._frame_callbacks = []
+        self.thermal_data.attach(self)  # attaching camera as data observer (on notification, update_notification() will be called)
+
+    def add_frame_callback(self, callback):
+        """ callback(frame) will be called with a copy of every completed frame """
+        self._frame_callbacks.append(callback)
+
+    def remove_frame_callback(self, callback):
+        self._frame_callbacks.remove(callback)
+
+    def update_notification(self):
+        if self.thermal_data.frame_complete:
+            frame = self.thermal_data.data.copy()
+            self.thermal_data.new_frame()
+            self.stats.count("frames")
+            for callback in self._frame_callbacks:
+                callback(frame)
+
+
+class CameraManager(threading.Thread):
+    """
+    Thread running the event loop of all cameras.
+    Methods that return concurrent.futures.Future can be called from any thread.
+    Statistics of every camera are in stats (instrumentation.StatsRegistry) under its port name.
+    """
+
+    def __init__(self, size = 64, height = None, binary = True, timeout = 1.0, stats = None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.size = size
+        self.height = height
+        self.binary = binary  # use binary scan protocol if device supports it
+        self.timeout = timeout  # seconds to wait for answers
+        self.stats = stats if stats is not None else StatsRegistry()
+        self.cameras = {}  # port -> ManagedCamera
+        self.loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+
+    def run(self):
+        logging.info("Camera manager starting")
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._started.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+            logging.info("Camera manager stopped")
+
+    def start(self, ports = None):
+        """ starts event loop thread and opens cameras on ports (found with discover() if not given),
+            returns list of opened cameras """
+        threading.Thread.start(self)
+        self._started.wait()
+        if ports is None:
+            ports = self.discover()
+        futures = [(port, self.submit(self._open(port))) for port in ports]
+        opened = []
+        for (port, future) in futures:
+            try:
+                opened.append(future.result())
+            except (OSError, asyncio.TimeoutError, concurrent.futures.TimeoutError) as e:
+                logging.error("Could not open camera on {}: {}".format(port, e))
+        return opened
+
+    @staticmethod
+    def discover():
+        """ returns ports where a thermal camera answers """
+        (matches, unused_found) = serialHelpers.discover_devices(INFO_RESPONSE, INFO_QUESTION)  # @UnusedVariable
+        return [port for (port, unused_responce) in matches]  # @UnusedVariable
+
+    def submit(self, coroutine):
+        """ runs coroutine in event loop, returns concurrent.futures.Future of its result """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def _open(self, port):
+        managed = ManagedCamera(port, ThermalData(self.size, self.height), self.stats.get(str(port)))
+        managed.camera = await open_camera(port, managed.thermal_data, self.timeout, managed.stats)
+        try:
+            info = await managed.camera.read_info()
+            binary = await managed.camera.negotiate_protocol(info, self.binary)
+            logging.info("Camera on {} uses {} scan protocol".format(port, "binary" if binary else "text"))
+            # grid is always set, device keeps grid of previous session (older firmware can not change it)
+            (width, height) = (managed.thermal_data.width, managed.thermal_data.height)
+            if "window" in info.get("scan", "").split('|'):
+                await managed.camera.set_grid(width, height, default_step_size(width, height))
+            elif (width, height) != DEFAULT_GRID[:2]:
+                logging.warning("Camera on {} can not change scanning grid, it scans {}x{}".format(port, *DEFAULT_GRID[:2]))
+        except BaseException:
+            managed.camera.close()
+            raise
+        self.cameras[port] = managed
+        return managed
+
+    def scan(self, port, timeout = None, window = None, stride = 1):
+        """ scans with one camera, returns future that is done when scan is received """
+        return self.submit(self.cameras[port].camera.start_scan(timeout, window, stride))
+
+    def scan_all(self, timeout = None):
+        """ scans with all cameras at the same time, returns future that is done when every scan is received """
+        async def scan_all():
+            await asyncio.gather(*(managed.camera.start_scan(timeout) for managed in self.cameras.values()))
+        return self.submit(scan_all())
+
+    def cpu_time(self):
+        """ returns CPU time (seconds) used by manager thread - all cameras together """
+        async def thread_time():
+            return time.thread_time()
+        return self.submit(thread_time()).result()
+
+    def join(self, timeout = None):
+        for managed in self.cameras.values():
+            self.loop.call_soon_threadsafe(managed.camera.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)  # Signal thread to stop
+        threading.Thread.join(self, timeout)  # Wait until it does
@@ -0,0 +1,172 @@
+"""
+Post-processing of completed frames in worker processes.
+
+Frames are copied once into shared memory slots (multiprocessing.shared_memory),
+workers read them from there without pickling. Registered stages run one after another
+in a worker and their results come back asynchronously (results queue and callbacks).
+If every slot is busy, new frames are dropped instead of queued.
+
+Stages are functions stage(frame) -> result defined on module level
+(or functools.partial of such), so they can be sent to worker processes.
+"""
+
+import queue
+import logging
+import functools
+import threading
+import concurrent.futures
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import mlx90614 as sensor
+from boundedqueue import BoundedQueue, DROP_OLDEST
+
+
+# Stages
+
+def celsius(frame):
+    """ frame in degrees celsius """
+    return sensor.reading2celsius(frame).astype(np.float32)
+
+
+def statistics(frame):
+    """ minimum, maximum, mean and standard deviation of readings (zeros - missing readings are left out) """
+    readings = frame[frame != 0]
+    if readings.size == 0:
+        return {"count": 0}
+    return {"count": int(readings.size),
+            "minimum": int(readings.min()),
+            "maximum": int(readings.max()),
+            "mean": float(readings.mean()),
+            "std": float(readings.std())}
+
+
+def hot_spot(frame):
+    """ (x, y, reading) of the hottest data-point """
+    (y, x) = np.unravel_index(np.argmax(frame), frame.shape)
+    return (int(x), int(y), int(frame[y, x]))
+
+
+def upscale(frame, factor = 4):
+    """ frame enlarged factor times with bilinear interpolation """
+    (height, width) = frame.shape
+    ys = np.linspace(0, height - 1, height * factor)
+    xs = np.linspace(0, width - 1, width * factor)
+    (y0, x0) = (np.floor(ys).astype(int), np.floor(xs).astype(int))
+    (y1, x1) = (np.minimum(y0 + 1, height - 1), np.minimum(x0 + 1, width - 1))
+    (fy, fx) = ((ys - y0)[:, np.newaxis], (xs - x0)[np.newaxis, :])
+    data = frame.astype(np.float32)
+    top = data[y0][:, x0] * (1 - fx) + data[y0][:, x1] * fx
+    bottom = data[y1][:, x0] * (1 - fx) + data[y1][:, x1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+DEFAULT_STAGES = (("statistics", statistics), ("hot_spot", hot_spot))
+
+
+# Worker side
+
+_attached = {}  # shared memory blocks worker has attached to (name -> SharedMemory)
+
+
+def _run_stages(slot_name, shape, dtype, stages):
+    """ runs stages on frame in shared memory slot, returns dictionary of results (stage name -> result) """
+    block = _attached.get(slot_name)
+    if block is None:
+        block = shared_memory.SharedMemory(name = slot_name)
+        _attached[slot_name] = block
+    frame = np.ndarray(shape, dtype, block.buf)
+    return {name: stage(frame) for (name, stage) in stages}
+
+
+class PostProcessor(object):
+    """
+    Runs stages on frames in a pool of workers processes.
+    Can be used as frame callback of acquisition.AcquisitionEngine.
+
+    slots - frames that can be processed at the same time (more are dropped), workers by default
+    Results (frame number, {stage name: result}) are put to results queue (oldest are dropped
+    if nobody takes them) and passed to result callbacks (called from a pool thread).
+    """
+
+    def __init__(self, shape, stages = DEFAULT_STAGES, workers = 2, slots = None, dtype = np.uint16):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.stages = list(stages)
+        self.results = BoundedQueue(16, DROP_OLDEST)
+        self.submitted = 0  # number of frames given to post-processor
+        self.dropped = 0  # number of frames dropped because all slots were busy
+
+        size = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._slots = [shared_memory.SharedMemory(create = True, size = size) for unused_variable in range(slots or workers)]  # @UnusedVariable
+        self._free = queue.Queue()
+        for slot in self._slots:
+            self._free.put_nowait(slot)
+        self._pool = concurrent.futures.ProcessPoolExecutor(workers)
+        self._result_callbacks = []
+        self._lock = threading.Lock()
+
+    def register(self, name, stage):
+        """ adds stage to the end of stages (frames already submitted are not affected) """
+        with self._lock:
+            self.stages.append((name, stage))
+
+    def unregister(self, name):
+        with self._lock:
+            self.stages = [(stage_name, stage) for (stage_name, stage) in self.stages if stage_name != name]
+
+    def add_result_callback(self, callback):
+        """ callback(frame number, results) is called when frame has been processed """
+        self._result_callbacks.append(callback)
+
+    def remove_result_callback(self, callback):
+        self._result_callbacks.remove(callback)
+
+    def submit(self, frame):
+        """ starts processing frame, returns frame number or None if frame was dropped """
+        frame = np.asarray(frame)
+        if frame.shape != self.shape:
+            raise ValueError(("frame shape must be {} but it is {}").format(self.shape, frame.shape))
+        with self._lock:
+            number = self.submitted
+            self.submitted += 1
+            stages = list(self.stages)
+        try:
+            slot = self._free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            logging.debug("Post-processing is busy, frame {} dropped".format(number))
+            return None
+        np.copyto(np.ndarray(self.shape, self.dtype, slot.buf), frame, casting = 'unsafe')
+        future = self._pool.submit(_run_stages, slot.name, self.shape, self.dtype, stages)
+        future.add_done_callback(functools.partial(self._done, number, slot))
+        return number
+
+    def __call__(self, frame):
+        self.submit(frame)
+
+    def _done(self, number, slot, future):
+        self._free.put_nowait(slot)
+        try:
+            results = future.result()
+        except Exception as e:
+            logging.warning("Post-processing of frame {} failed: {}".format(number, e))
+            return
+        self.results.put_nowait((number, results))
+        for callback in self._result_callbacks:
+            callback(number, results)
+
+    def close(self):
+        """ waits for frames being processed, stops workers and frees shared memory """
+        self._pool.shutdown(wait = True)
+        for slot in self._slots:
+            slot.close()
+            slot.unlink()
+        self._slots = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
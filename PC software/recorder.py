@@ -0,0 +1,204 @@
+"""
+Recording completed frames into a memory-mapped file and replaying them.
+
+File is a fixed size header followed by fixed size records (see record_dtype()),
+so frame N is found without reading anything else, and frames stay in the
+operating system's page cache instead of Python heap.
+"""
+
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+
+MAGIC = b"TCREC001"
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("height", "<u4"), ("width", "<u4"), ("count", "<u8")])
+HEADER_SIZE = 64  # bytes reserved for header
+
+
+def record_dtype(height, width):
+    """ one record: timestamp (seconds since epoch), servo A and B positions,
+        minimal and maximal reading received and the frame itself """
+    return np.dtype([("timestamp", "<f8"),
+                     ("servos", "<u2", 2),
+                     ("minimum", "<u2"),
+                     ("maximum", "<u2"),
+                     ("frame", "<u2", (height, width))])
+
+
+class FrameRecorder(object):
+    """
+    Appends frames to a recording file. File grows grow_by records at a time.
+    Can be used as frame callback of acquisition.AcquisitionEngine
+    (servo positions are taken from thermal_camera, minimum and maximum of frame from thermal_data, if given).
+    """
+
+    def __init__(self, path, shape, thermal_camera = None, thermal_data = None, grow_by = 256):
+        self.path = path
+        (self.height, self.width) = shape
+        self.thermal_camera = thermal_camera
+        self.thermal_data = thermal_data
+        self.grow_by = grow_by
+        self.dtype = record_dtype(self.height, self.width)
+        self.count = 0
+
+        with open(path, 'wb') as f:
+            f.write(b'\0' * HEADER_SIZE)
+        self._header = np.memmap(path, HEADER_DTYPE, 'r+', 0, (1,))
+        self._header["magic"] = MAGIC
+        self._header["height"] = self.height
+        self._header["width"] = self.width
+        self._header["count"] = 0
+        self._records = None
+        self._capacity = 0
+        self._lock = threading.Lock()
+
+    def _grow(self):
+        capacity = self._capacity + self.grow_by
+        if self._records is not None:
+            self._records.flush()
+            self._records = None
+        with open(self.path, 'r+b') as f:
+            f.truncate(HEADER_SIZE + capacity * self.dtype.itemsize)
+        self._records = np.memmap(self.path, self.dtype, 'r+', HEADER_SIZE, (capacity,))
+        self._capacity = capacity
+
+    def append(self, frame, timestamp = None, servos = (0, 0), minimum = None, maximum = None):
+        """ writes frame (and information about it) as the next record """
+        frame = np.asarray(frame)
+        if frame.shape != (self.height, self.width):
+            raise ValueError(("frame shape must be {} but it is {}").format((self.height, self.width), frame.shape))
+        with self._lock:
+            if self.count == self._capacity:
+                self._grow()
+            record = self._records[self.count]
+            record["timestamp"] = time.time() if timestamp is None else timestamp
+            record["servos"] = servos
+            record["minimum"] = frame.min() if minimum is None else minimum
+            record["maximum"] = frame.max() if maximum is None else maximum
+            record["frame"] = frame
+            self.count += 1
+            self._header["count"] = self.count
+
+    def __call__(self, frame):
+        servos = (0, 0)
+        if self.thermal_camera is not None:
+            servos = tuple(position or 0 for position in self.thermal_camera.servo_positions)
+        (minimum, maximum) = (None, None)
+        if self.thermal_data is not None:
+            (minimum, maximum) = self.thermal_data.frame_extremes()
+        self.append(frame, servos = servos, minimum = minimum, maximum = maximum)
+
+    def close(self):
+        """ flushes records and cuts unused space from the end of file """
+        with self._lock:
+            if self._records is not None:
+                self._records.flush()
+                self._records = None
+            self._header.flush()
+            self._header = None
+            with open(self.path, 'r+b') as f:
+                f.truncate(HEADER_SIZE + self.count * self.dtype.itemsize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FrameReplay(object):
+    """
+    Read-only access to a recording. recording[n] is the n-th record
+    (fields: timestamp, servos, minimum, maximum, frame) straight from the memory map.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header = np.fromfile(path, HEADER_DTYPE, 1)[0]
+        if header["magic"] != MAGIC:
+            raise ValueError("{} is not a frame recording".format(path))
+        (self.height, self.width) = (int(header["height"]), int(header["width"]))
+        self.dtype = record_dtype(self.height, self.width)
+        # count in header is updated on every append, file can be longer (still recording)
+        count = min(int(header["count"]), (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize)
+        if count > 0:
+            self.records = np.memmap(path, self.dtype, 'r', HEADER_SIZE, (count,))
+        else:
+            self.records = np.zeros(0, self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, n):
+        return self.records[n]
+
+    def frame(self, n):
+        return self.records[n]["frame"]
+
+    @property
+    def timestamps(self):
+        return self.records["timestamp"]
+
+    def feed(self, thermal_data, n):
+        """ sets frame n into thermal data (zeros are not set - they are missing data-points) """
+        frame = self.frame(n)
+        (ys, xs) = np.nonzero(frame)
+        thermal_data.new_frame()
+        thermal_data.set_datapoints(xs, ys, frame[ys, xs])
+
+
+class ReplayThread(threading.Thread):
+    """
+    Thread that feeds recorded frames into thermal data instead of a device.
+    speed - 1 is original speed, 2 twice as fast etc., None is as fast as possible
+    """
+
+    def __init__(self, replay, thermal_data, speed = 1.0, start = 0, stop = None, loop = False):
+        threading.Thread.__init__(self)
+        self.replay = replay
+        self.thermal_data = thermal_data
+        self.speed = speed
+        self.range = (start, len(replay) if stop is None else stop)
+        self.loop = loop
+
+        self._running = threading.Event()  # flag for signalling the stopping of thread
+        self._running.set()
+
+    def run(self):
+        logging.info("Replay thread starting")
+        (start, stop) = self.range
+        while self._running.is_set():
+            started = time.perf_counter()
+            for n in range(start, stop):
+                if self.speed is not None:
+                    # wait until frame's time (relative to first frame) has come
+                    due = (self.replay.timestamps[n] - self.replay.timestamps[start]) / self.speed
+                    delay = started + due - time.perf_counter()
+                    if delay > 0 and not self._sleep(delay):
+                        break
+                if not self._running.is_set():
+                    break
+                try:
+                    self.replay.feed(self.thermal_data, n)
+                except ValueError as e:
+                    logging.warning("Frame {} could not be replayed: {}".format(n, e))
+            if not self.loop:
+                break
+        logging.info("Replay thread stopped")
+
+    def _sleep(self, delay):
+        """ sleeps in short steps so stopping is noticed, returns false if thread was stopped """
+        end = time.perf_counter() + delay
+        while self._running.is_set():
+            remaining = end - time.perf_counter()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, 0.1))
+        return False
+
+    def join(self, timeout = None):
+        self._running.clear()  # Signal thread to stop
+        threading.Thread.join(self, timeout)  # Wait until it does
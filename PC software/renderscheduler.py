@@ -0,0 +1,154 @@
+"""
+Decides when the GUI redraws, instead of a fixed timer.
+
+Redraw requests (sliders, settings) and new data are coalesced into one redraw.
+After a redraw the next one is scheduled so that drawing takes at most a part
+of the time (measured draw cost) and brings enough new data-points (measured
+data rate). With no new data, the scheduler stops checking until the data side
+calls wake() (if the event loop can be woken from other threads), otherwise the
+checks get sparser and sparser.
+
+Does not depend on tkinter: after and after_cancel are functions of the event loop
+(tk widget methods with the same names).
+"""
+
+import time
+import threading
+
+
+class RenderScheduler(object):
+    """
+    Calls render() from the event loop when something may need drawing.
+    render() returns true if it drew something, false if there was nothing new.
+    pixels() returns the number of data-points received so far (any growing counter).
+
+    wakeup(function) - runs function from the event loop, can be called from any thread
+    (None - event loop can not be woken, scheduler keeps checking when nothing arrives)
+    min_interval, max_interval - limits (seconds) of time between redraws while data arrives
+    idle_interval - longest time between checks when nothing arrives and there is no wakeup (None - no limit)
+    busy - largest part of time spent drawing
+    min_pixels - new data-points worth a redraw (waited for at most max_interval)
+    If stats (instrumentation.Stats) is given, renders, idle checks, requests and interval are recorded.
+    """
+
+    def __init__(self, after, after_cancel, render, pixels, wakeup = None, min_interval = 0.02, max_interval = 0.25, idle_interval = None,
+                 busy = 0.5, min_pixels = 64, smoothing = 0.3, stats = None, clock = time.perf_counter):
+        self._after = after
+        self._after_cancel = after_cancel
+        self._render = render
+        self._pixels = pixels
+        self._wakeup = wakeup
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_interval = idle_interval
+        self.busy = busy
+        self.min_pixels = min_pixels
+        self.smoothing = smoothing  # weight of newest measurement in averages
+        self.stats = stats
+        self._clock = clock
+
+        self.interval = min_interval  # time between redraws (seconds)
+        self.draw_cost = 0.0  # average seconds per redraw
+        self.pixel_rate = 0.0  # average data-points per second
+        self._wait = min_interval  # time until next check
+        self._job = None  # id of scheduled check
+        self._due = None  # time of scheduled check
+        self._last_draw = None  # time of last redraw
+        self._last_pixels = pixels()
+        self._last_check = clock()
+        self._running = False
+        self._parked = False  # true while nothing is scheduled and wake() is waited for
+        self._wake_lock = threading.Lock()
+
+    def start(self):
+        self._running = True
+        self._schedule(0)
+
+    def stop(self):
+        self._running = False
+        self._parked = False
+        if self._job is not None:
+            self._after_cancel(self._job)
+            self._job = None
+            self._due = None
+
+    def request(self):
+        """ asks for a redraw - as soon as interval since last redraw allows (many requests make one redraw) """
+        if self.stats is not None:
+            self.stats.count("requests")
+        now = self._clock()
+        delay = 0 if self._last_draw is None else max(0, self._last_draw + self.interval - now)
+        if self._due is None or self._due > now + delay:
+            self.stop()
+            self._schedule(delay)
+
+    def wake(self):
+        """ tells that new data has arrived - can be called from any thread, costs nothing unless scheduler is parked """
+        if not self._parked:
+            return
+        with self._wake_lock:
+            if not self._parked:
+                return  # another thread woke it
+            self._parked = False
+        self._wakeup(self._woken)
+
+    def _woken(self):
+        if not self._running or self._job is not None:
+            return
+        if self.stats is not None:
+            self.stats.count("wakeups")
+        now = self._clock()
+        self._schedule(0 if self._last_draw is None else max(0, self._last_draw + self.interval - now))
+
+    def _park(self, pixels):
+        """ stops checking until wake(), pixels - data-points counted by the last check """
+        with self._wake_lock:
+            self._parked = True
+        if self._pixels() != pixels:
+            self.wake()  # data came after the check, its wake() could have been missed
+
+    def _schedule(self, delay):
+        self._due = self._clock() + delay
+        self._job = self._after(int(delay * 1000), self._check)
+
+    def _check(self):
+        self._job = None
+        self._due = None
+        self._parked = False
+        now = self._clock()
+        pixels = self._pixels()
+        if now > self._last_check:
+            rate = (pixels - self._last_pixels) / (now - self._last_check)
+            self.pixel_rate += self.smoothing * (rate - self.pixel_rate)
+        (self._last_pixels, self._last_check) = (pixels, now)
+
+        rendered = self._render()
+        if rendered:
+            finished = self._clock()
+            self.draw_cost += self.smoothing * ((finished - now) - self.draw_cost)
+            self._last_draw = finished
+            self.interval = self._redraw_interval()
+            self._wait = self.interval
+            if self.stats is not None:
+                self.stats.count("renders")
+                self.stats.gauge("render_interval_ms", self.interval * 1000)
+        else:
+            # nothing new - check less and less often
+            self._wait *= 2
+            if self.idle_interval is not None:
+                self._wait = min(self._wait, self.idle_interval)
+            if self.stats is not None:
+                self.stats.count("idle_checks")
+        if self._job is not None or not self._running:  # render() could have requested a redraw or stopped scheduler
+            return
+        if rendered or self._wakeup is None:
+            self._schedule(self._wait)
+        else:
+            self._park(pixels)
+
+    def _redraw_interval(self):
+        """ time until next redraw: drawing at most busy part of time, min_pixels new data-points if they come fast enough """
+        interval = self.draw_cost / self.busy
+        if self.pixel_rate > 0:
+            interval = max(interval, self.min_pixels / self.pixel_rate)
+        return min(max(interval, self.min_interval), self.max_interval)
@@ -0,0 +1,261 @@
+"""
+Scanning driven from PC: the path is planned here and the device only moves servos
+("a=" setpoints) and takes readings ("to?"), see asyncserial.py.
+
+Commands are pipelined - the setpoint of the next position is sent right after the
+question for the current reading, so the reading travels back and is parsed while
+servos move. How long to wait before reading (dwell) is learned from the data
+(DwellController): some positions are read twice and if the second reading differs,
+servos had not settled yet.
+
+    scheduler = ScanScheduler(camera, planner = functools.partial(interleaved_path, passes = 2))
+    await scheduler.scan()
+
+Planners are functions planner(thermal_data) returning an iterable of grid positions (x, y).
+None in the path means "wait until all readings so far have arrived" (used by adaptive_path
+to look at coarse readings before deciding where to scan in detail).
+"""
+
+import asyncio
+import logging
+import functools
+
+import numpy as np
+
+from asyncserial import ReadingFailed
+from thermalcamera import SERVO_MAX, SERVO_MIN, default_step_size, servo_position
+
+
+# Planners
+
+def serpentine_path(thermal_data, window = None, stride = 1):
+    """ columns from left to right, y goes up and down (like firmware scan) """
+    (x0, y0, x1, y1) = (0, 0, thermal_data.width - 1, thermal_data.height - 1) if window is None else window
+    ys = list(range(y0, y1 + 1, stride))
+    for (column, x) in enumerate(range(x0, x1 + 1, stride)):
+        for y in (ys if column % 2 == 0 else reversed(ys)):
+            yield (x, y)
+
+
+def interleaved_path(thermal_data, passes = 2):
+    """ every passes-th column first (whole image at lower resolution), columns between them in later passes """
+    ys = list(range(thermal_data.height))
+    for offset in range(passes):
+        for (column, x) in enumerate(range(offset, thermal_data.width, passes)):
+            for y in (ys if column % 2 == 0 else reversed(ys)):
+                yield (x, y)
+
+
+def adaptive_path(thermal_data, stride = 4, threshold = 50):
+    """
+    Coarse scan of every stride-th position, then cells (stride x stride positions) where coarse
+    readings at the corners differ more than threshold are scanned at full resolution.
+    Other cells are interpolated from their corners (every grid position gets a value).
+    Cells with a missing coarse reading (failed, 0) at a corner are scanned in detail.
+    Cells at right and bottom edge are scanned in detail if they have no coarse corners there.
+    """
+    (width, height) = (thermal_data.width, thermal_data.height)
+    for position in serpentine_path(thermal_data, None, stride):
+        yield position
+    yield None  # wait for coarse readings
+
+    coarse = thermal_data.data[::stride, ::stride].astype(np.int32)
+    (rows, columns) = coarse.shape
+    # largest difference between corners of every cell
+    right = np.concatenate((coarse[:, 1:], coarse[:, -1:]), axis = 1)
+    below = np.concatenate((coarse[1:, :], coarse[-1:, :]), axis = 0)
+    diagonal = np.concatenate((below[:, 1:], below[:, -1:]), axis = 1)
+    corners = np.stack((coarse, right, below, diagonal))
+    detailed = corners.max(axis = 0) - corners.min(axis = 0) > threshold
+    detailed |= (corners == 0).any(axis = 0)
+    # cells at right and bottom edge have no corners to interpolate to
+    detailed[:, -1] |= (columns - 1) * stride < width - 1
+    detailed[-1, :] |= (rows - 1) * stride < height - 1
+
+    # positions of detailed cells are scanned in one serpentine over the grid,
+    # short gaps in columns are scanned too (moving over them would need longer dwell)
+    scanned = np.repeat(np.repeat(detailed, stride, axis = 0), stride, axis = 1)[:height, :width]
+    for column in scanned.T:
+        rows = np.nonzero(column)[0]
+        for (first, last) in zip(rows[:-1], rows[1:]):
+            if last - first <= stride:
+                column[first:last] = True
+    scanned[::stride, ::stride] = False  # coarse positions
+    for (x, y) in serpentine_path(thermal_data):
+        if scanned[y, x]:
+            yield (x, y)
+
+    # other positions are interpolated between corners of their cell
+    (ys, xs) = np.nonzero(~scanned)
+    cells = (ys // stride, xs // stride)
+    (fx, fy) = ((xs % stride) / stride, (ys % stride) / stride)
+    top = coarse[cells] * (1 - fx) + right[cells] * fx
+    bottom = below[cells] * (1 - fx) + diagonal[cells] * fx
+    coarse_position = (xs % stride == 0) & (ys % stride == 0)
+    fill = ~coarse_position
+    thermal_data.set_datapoints(xs[fill], ys[fill], np.rint(top * (1 - fy) + bottom * fy)[fill].astype(np.uint16))
+
+
+PLANNERS = {"serpentine": serpentine_path, "interleaved": interleaved_path, "adaptive": adaptive_path}
+
+
+class DwellController(object):
+    """
+    Time (seconds) to wait between servo setpoint and reading, learned separately for moves
+    of different length (distance classes 1, 2-3, 4-7, 8-15... servo units).
+
+    Probed positions are read twice, the second time after probe_factor times the dwell.
+    If the reading was still moving away from the reading of previous position, servos
+    (or sensor) had not settled. That settle error is averaged over probes (weight of newest
+    is smoothing, so noise averages out) and while it is more than tolerance, dwell of that class
+    is multiplied by increase, otherwise by decrease. So dwell stays close to the shortest
+    that still gives the same reading as waiting longer.
+    A longer move never gets shorter dwell than a shorter (probed) one. If not adaptive, dwell is fixed.
+    """
+
+    def __init__(self, per_unit = 0.002, minimum = 0.001, maximum = 0.5, tolerance = 6, smoothing = 0.25,
+                 increase = 1.25, decrease = 0.98, probe_factor = 4, adaptive = True):
+        self.per_unit = per_unit  # initial dwell per servo unit moved
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance  # readings
+        self.smoothing = smoothing
+        self.increase = increase
+        self.decrease = decrease
+        self.probe_factor = probe_factor
+        self.adaptive = adaptive
+        classes = (SERVO_MAX - SERVO_MIN).bit_length() + 1
+        self.dwells = [min(maximum, minimum + per_unit * ((1 << distance_class) - 1)) for distance_class in range(classes)]
+        self.errors = [0.0] * classes  # average settle error of every distance class (readings)
+        self.probes = [0] * classes  # probed moves of every distance class
+        self.unsettled = 0  # probes after which average settle error was over tolerance
+
+    def dwell(self, distance):
+        distance_class = int(distance).bit_length()
+        shorter = [self.dwells[shorter_class] for shorter_class in range(distance_class) if self.probes[shorter_class]]
+        return max(shorter + [self.dwells[distance_class]])
+
+    def needs_probe(self, distance, probes = 4):
+        """ true if moves of this distance have been probed less than probes times """
+        return self.adaptive and self.probes[int(distance).bit_length()] < probes
+
+    def feedback(self, distance, previous, first, second):
+        """ takes readings of a position probed after move of distance, previous - reading of position moved from (or None),
+            returns true if moves of this distance are considered unsettled """
+        distance_class = int(distance).bit_length()
+        self.probes[distance_class] += 1
+        if previous is None:
+            error = abs(second - first)
+        else:
+            error = (second - first) * ((first > previous) - (first < previous))
+        self.errors[distance_class] += self.smoothing * (error - self.errors[distance_class])
+        unsettled = self.errors[distance_class] > self.tolerance
+        if unsettled:
+            self.unsettled += 1
+        if self.adaptive:
+            factor = self.increase if unsettled else self.decrease
+            self.dwells[distance_class] = min(self.maximum, max(self.minimum, self.dwells[distance_class] * factor))
+        return unsettled
+
+
+class ScanScheduler(object):
+    """
+    Scans thermal_data of camera (asyncserial.AsyncThermalCamera) along the path of planner.
+    grid - width, height and servo step size (thermal data size and largest step that fits if not given)
+    pipelined - send next setpoint before reading has arrived (if False, every reading is waited for)
+    probe_every - every probe_every-th position is read twice for dwell feedback (0 - never)
+    Positions where the device could not read the sensor are marked missing (0 - no reading, see
+    ThermalData.set_failed()), if only one reading of a probed position failed, the other one is used.
+    If stats (instrumentation.Stats) is given, dwell, scan time, probes, unsettled probes and failed readings are recorded.
+    """
+
+    def __init__(self, camera, planner = serpentine_path, grid = None, dwell = None, pipelined = True, probe_every = 8, stats = None):
+        self.camera = camera
+        self.planner = planner
+        if grid is None:
+            (width, height) = (camera.thermal_data.width, camera.thermal_data.height)
+            grid = (width, height, default_step_size(width, height))
+        self.grid = grid
+        self.dwell = dwell if dwell is not None else DwellController()
+        self.pipelined = pipelined
+        self.probe_every = probe_every
+        self.stats = stats
+        self.position = None  # last servo setpoint sent
+        self._previous = None  # last reading received (first reading of probed position)
+
+    async def scan(self):
+        """ scans one frame, returns seconds it took """
+        loop = asyncio.get_running_loop()
+        protocol = self.camera.protocol
+        thermal_data = self.camera.thermal_data
+        thermal_data.new_frame()
+        start = loop.time()
+        last = None  # future of last reading asked (answers come in order, when it is done, all are)
+        step = 0
+        for point in self.planner(thermal_data):
+            if point is None:
+                await self._wait(last)
+                continue
+            (x, y) = point
+            setpoint = servo_position(x, y, self.grid)
+            if self.position is None:
+                distance = SERVO_MAX - SERVO_MIN
+            else:
+                distance = max(abs(setpoint[0] - self.position[0]), abs(setpoint[1] - self.position[1]))
+            protocol.send("a={},{}".format(*setpoint))
+            moved = loop.time()
+            self.position = setpoint
+            dwell = self.dwell.dwell(distance)
+            if self.stats is not None:
+                self.stats.time("dwell", dwell)
+            await asyncio.sleep(max(0, moved + dwell - loop.time()))
+
+            readings = [protocol.request("to?", "OBJECT")]
+            if (self.probe_every and step % self.probe_every == 0) or self.dwell.needs_probe(distance):
+                await asyncio.sleep((self.dwell.probe_factor - 1) * dwell)
+                readings.append(protocol.request("to?", "OBJECT"))
+            last = readings[-1]
+            last.add_done_callback(functools.partial(self._received, x, y, distance, readings))
+            if not self.pipelined:
+                await self._wait(last)
+            step += 1
+        await self._wait(last)
+
+        elapsed = loop.time() - start
+        if self.stats is not None:
+            self.stats.time("scan_time", elapsed)
+        logging.debug("Scan of {} positions took {:.3f} s".format(step, elapsed))
+        return elapsed
+
+    async def _wait(self, reading):
+        """ waits until reading (and all asked before it) has arrived """
+        if reading is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(reading), self.camera.timeout)
+            except ReadingFailed:
+                pass  # position is marked missing (see _received())
+
+    def _received(self, x, y, distance, readings, unused_future):  # @UnusedVariable
+        if not all(reading.done() and not reading.cancelled() for reading in readings):
+            return
+        errors = [reading.exception() for reading in readings]  # every exception is retrieved
+        values = [int(reading.result()) for (reading, error) in zip(readings, errors) if error is None]
+        if len(values) < len(readings):
+            if self.stats is not None:
+                self.stats.count("failed_readings", len(readings) - len(values))
+            if not values:
+                logging.warning("Reading at {},{} failed, position marked missing".format(x, y))
+                self._previous = None
+                self.camera.thermal_data.set_failed([x], [y])
+                return
+            # one reading of probed position is left, no dwell feedback
+        elif len(values) > 1:
+            unsettled = self.dwell.feedback(distance, self._previous, values[0], values[-1])
+            if self.stats is not None:
+                self.stats.count("probes")
+                self.stats.count("unsettled", int(unsettled))
+        self._previous = values[0]
+        try:
+            self.camera.thermal_data.set_datapoint(x, y, values[-1])
+        except ValueError as e:
+            logging.warning("Reading at {},{} could not be set: {}".format(x, y, e))
@@ -4,6 +4,19 @@ import threading
 import queue
 import time
 import logging
+import collections
+import os
+import concurrent.futures
+
+import numpy as np
+
+# Binary scan line: start sign, line number, value count, values (uint16 little-endian), XOR checksum
+BINARY_LINE_START = ord('!')
+BINARY_LINE_HEADER = 3  # start sign, line number and value count
+ScanLine = collections.namedtuple("ScanLine", "line values")  # values are raw bytes
+
+# File that remembers the port where device was last found
+DEFAULT_PORT_CACHE = os.path.join(os.path.expanduser("~"), ".thermalcamera_port")
 
 
 # Monitor thread -
@@ -13,24 +26,36 @@ class SerialMonitorThread(threading.Thread):
     and sending outgoing messages.
     
     Opened serial port must be supplied (serial_port)
-    Received messages will be placed in incoming queue
+    Received messages will be placed in incoming queue (a list of messages per read)
     Messages in outgoing queue will be sent to serial port
     
     """
 
-    def __init__(self, serial_port, incoming, outgoing):
+    def __init__(self, serial_port, incoming, outgoing, event_driven = False, timeout = 0.5, latency_probe = None, stats = None):
         threading.Thread.__init__(self)
         self.serial_port = serial_port  # Serial connection
         self.incoming = incoming  # Incoming message Queue
         self.outgoing = outgoing  # Outgoing message Queue
+        # Event driven mode blocks on serial port (reading) and outgoing queue (writing, separate thread)
+        # instead of polling both every 10ms. timeout is how often stopping of thread is checked.
+        self.event_driven = event_driven
+        self.timeout = timeout
+        self.latency_probe = latency_probe  # instrumentation.LatencyProbe or None
+        self.stats = stats  # instrumentation.Stats or None (disabled)
 
-
-        self._cmdCharList = []  # List of characters that have been received (from last message start until now). This list is emptied if message stop sign is received
+        self._decoder = FrameDecoder()  # Splits received bytes into messages
         self._running = threading.Event()  # flag for signalling the stopping of thread
         self._running.set()
 
     def run(self):
         logging.info("SerialThread Starting")
+        if self.event_driven:
+            self._run_event_driven()
+        else:
+            self._run_polling()
+        logging.info("SerialThread Stopped")
+
+    def _run_polling(self):
         outgoingMessage = None  # Message from queue that is currently being sent over serial
 
         while(self._running.is_set()):
@@ -44,12 +69,7 @@ class SerialMonitorThread(threading.Thread):
                         pass
                 # if message is fetched, send it
                 if outgoingMessage is not None:
-                    try:
-                        self.sendCMD(outgoingMessage)
-                    except (serial.portNotOpenError, TypeError) as e:
-                        logging.exception(str(e))
-                        logging.warning("Could not write message to serial port. (" + str(outgoingMessage) + ")")
-                    else:
+                    if self._trySend(outgoingMessage):
                         outgoingMessage = None
                         idle = False
 
@@ -62,58 +82,222 @@ class SerialMonitorThread(threading.Thread):
             if idle:
                 time.sleep(0.01)
 
-        logging.info("SerialThread Stopped")
+    def _run_event_driven(self):
+        writer = threading.Thread(target = self._write_outgoing, name = self.name + "-writer")
+        writer.daemon = True
+        writer.start()
+
+        # reads will block until data arrives (or timeout passes)
+        save_timeout = self.serial_port.timeout
+        self.serial_port.timeout = self.timeout
+        try:
+            while(self._running.is_set()):
+                if self.serial_port.isOpen():
+                    self.readCMD(block = True)
+                else:
+                    time.sleep(self.timeout)
+        finally:
+            self.serial_port.timeout = save_timeout
+            writer.join()
+
+    def _write_outgoing(self):
+        """ Writer loop for event driven mode - sends messages as soon as they are queued """
+        while(self._running.is_set()):
+            try:
+                outgoingMessage = self.outgoing.get(timeout = self.timeout)
+            except queue.Empty:
+                continue
+            # retry until sent (or thread is stopped)
+            while not self._trySend(outgoingMessage) and self._running.is_set():
+                time.sleep(self.timeout)
+
+    def _trySend(self, message):
+        """ sends a message, returns boolean - true if message was sent """
+        try:
+            self.sendCMD(message)
+        except (serial.portNotOpenError, TypeError) as e:
+            logging.exception(str(e))
+            logging.warning("Could not write message to serial port. (" + str(message) + ")")
+            return False
+        return True
 
     def join(self, timeout = None):
         self._running.clear()  # Signal thread to stop
         threading.Thread.join(self, timeout)  # Wait until it does
 
+    def set_binary(self, enabled):
+        """ enables decoding of binary scan lines (see FrameDecoder) """
+        self._decoder.binary = enabled
+
     def sendCMD(self, message):
         """ sends a message over serial to device
             takes message as an argument """
 
-        self.serial_port.write(("<" + message + ">").encode())
+        # message can be an object that becomes text only now (see thermalcamera.ServoSetpoint)
+        self.serial_port.write(("<{}>".format(message)).encode())
         logging.debug("Sent message: " + str(message))
         self.outgoing.task_done()  # indicate, that message has been sent #Not needed
+        if self.stats is not None:
+            self.stats.count("messages_sent")
+            self.stats.gauge("send_backlog", self.outgoing.qsize())
 
 
-    def readCMD(self):
+    def readCMD(self, block = False):
         # TODO: Handle exceptions
 
-        """reads bytes one by one from serial port and
-        puts received messages to incoming Queue.
+        """reads all waiting bytes from serial port at once and
+        puts list of received messages to incoming Queue.
+        if block is true, waits for the first byte (up to serial port timeout)
         returns: number of bytes read."""
 
-        # cmd has started if char list is not empty
-        cmdStarted = len(self._cmdCharList) > 0
+        data = b''
+        if block:
+            data = self.serial_port.read(1)
+            if not data:
+                return 0
 
-        bytesRead = 0
         waitingCount = self.serial_port.inWaiting()
-        while waitingCount > 0:
-            # skip everything until command start sign if command has not started
-            while not cmdStarted and waitingCount > 0:
-                if self.serial_port.read().decode() == '<':
-                    cmdStarted = True
-                waitingCount -= 1
-                bytesRead += 1
-
-
-            while cmdStarted:
-                incomingChar = self.serial_port.read().decode()
-                if incomingChar == '>':
-                    message = ''.join(self._cmdCharList)
-                    self._cmdCharList = []
-                    cmdStarted = False
-
-                    self.incoming.put_nowait(message)
-                    logging.debug("Got a message: " + str(message))
-                    # TODO: Callback
+        if waitingCount > 0:
+            data += self.serial_port.read(waitingCount)
+        if not data:
+            return 0
+
+        messages = self._decoder.feed(data)
+        if self.stats is not None:
+            self.stats.count("reads")
+            self.stats.count("bytes_read", len(data))
+            self.stats.count("messages_framed", len(messages))
+            self.stats.gauge("send_backlog", self.outgoing.qsize())
+        if messages:
+            if self.latency_probe is not None:
+                self.latency_probe.arrived(len(messages))
+            # all messages from one read are queued as one list
+            self._queue_messages(messages)
+            logging.debug("Got messages: " + str(messages))
+            # TODO: Callback
+
+        return len(data)
+
+
+    def _queue_messages(self, messages):
+        """ puts messages to incoming queue - if it is bounded and full, waits
+            (serial port is not read meanwhile), unless thread is being stopped """
+        while True:
+            try:
+                self.incoming.put(messages, timeout = self.timeout)
+                return
+            except queue.Full:
+                if self.stats is not None:
+                    self.stats.count("incoming_full")
+                if not self._running.is_set():
+                    logging.warning("Incoming queue is full, {} messages lost".format(len(messages)))
+                    return
+
+
+class FrameDecoder(object):
+    """
+    Splits incoming bytes into messages framed as "<message>".
+
+    Received bytes are collected into one reusable buffer and split in bulk,
+    instead of being read and decoded one character at a time.
+    Everything before the start sign is skipped (same as before);
+    a start sign inside a message is part of the message.
+
+    If binary is set, binary scan lines (see ScanLine) between messages
+    are decoded too and returned as ScanLine objects among messages.
+    """
+
+    def __init__(self, start = b'<', stop = b'>', binary = False):
+        self._start = start
+        self._stop = stop
+        self.binary = binary
+        self._buffer = bytearray()  # bytes received after the last complete message
+
+    def feed(self, data):
+        """ adds received bytes to the buffer
+            returns: list of complete messages (strings and ScanLine objects if binary) """
+        buffer = self._buffer
+        buffer += data
+        if self.binary:
+            return self._feed_binary(buffer)
+
+        messages = []
+        end = buffer.rfind(self._stop)
+        if end != -1:
+            # split everything up to the last stop sign at once
+            for chunk in memoryview(buffer)[:end].tobytes().split(self._stop):
+                (unused_junk, started, message) = chunk.partition(self._start)  # @UnusedVariable
+                if started:
+                    messages.append(message.decode('ascii', 'replace'))
+            del buffer[:end + 1]
+
+        # drop junk before the start of the next message so buffer would not grow
+        start = buffer.find(self._start)
+        if start == -1:
+            buffer.clear()
+        elif start > 0:
+            del buffer[:start]
+
+        return messages
+
+    def _feed_binary(self, buffer):
+        """ decodes messages and binary scan lines one by one (a line holds many data-points) """
+        messages = []
+        position = 0  # start of bytes that are not decoded yet
+        while True:
+            start = buffer.find(self._start, position)
+            line_start = buffer.find(BINARY_LINE_START, position)
+            if line_start != -1 and (start == -1 or line_start < start):
+                if len(buffer) < line_start + BINARY_LINE_HEADER:
+                    position = line_start
+                    break
+                end = line_start + BINARY_LINE_HEADER + 2 * buffer[line_start + 2] + 1
+                if len(buffer) < end:
+                    position = line_start
+                    break
+                # XOR of everything after start sign (including checksum) is 0 if line is correct
+                if np.bitwise_xor.reduce(np.frombuffer(buffer, np.uint8, end - line_start - 1, line_start + 1)) == 0:
+                    messages.append(ScanLine(buffer[line_start + 1], bytes(buffer[line_start + BINARY_LINE_HEADER:end - 1])))
+                    position = end
                 else:
-                    self._cmdCharList.append(incomingChar)
-                waitingCount -= 1
-                bytesRead += 1
+                    logging.warning("Binary scan line checksum error")
+                    position = line_start + 1
+            elif start != -1:
+                stop = buffer.find(self._stop, start)
+                if stop == -1:
+                    position = start
+                    break
+                messages.append(buffer[start + 1:stop].decode('ascii', 'replace'))
+                position = stop + 1
+            else:
+                position = len(buffer)
+                break
+        del buffer[:position]
+        return messages
+
+    def reset(self):
+        """ forgets partially received message """
+        self._buffer.clear()
+
 
-        return bytesRead
+def response_matches(response, expectedResponce):
+    """ True if response is expectedResponce, or the same with more comma separated
+        fields added (newer firmware adds fields to INFO) """
+    if response == expectedResponce:
+        return True
+    (head, stop, tail) = expectedResponce.rpartition('>')
+    return bool(stop) and response.startswith(head + ',') and response.endswith(stop + tail)
+
+
+def parse_info(response):
+    """ returns dictionary of fields in info response
+        ("<INFO:dev=ThermalCamera,proto=bin1>\r\n" -> {"dev": "ThermalCamera", "proto": "bin1"}) """
+    (unused_cmd, unused_separator, fields) = response.strip().strip('<>').partition(':')  # @UnusedVariable
+    info = {}
+    for field in fields.split(','):
+        (key, unused_separator, value) = field.partition('=')  # @UnusedVariable
+        info[key] = value
+    return info
 
 def connect_device(serial_connection, expectedResponce, infoString = None):
     """ Scans through open ports and sends infostring to them.
@@ -124,6 +308,7 @@ def connect_device(serial_connection, expectedResponce, infoString = None):
         1) Boolean indicating whether device was found
         2) list of tuples containing information about ports that were opened during search (when device is not found then this is complete list of openable ports) 
         """
+    start_time = time.perf_counter()
     # Save current timeouts(to be recovered in the end) Set tight timeouts.
     save_timeout = (serial_connection.timeout, serial_connection.writeTimeout)
     (serial_connection.timeout, serial_connection.writeTimeout) = (0.1, 0.1)
@@ -134,7 +319,7 @@ def connect_device(serial_connection, expectedResponce, infoString = None):
             serial_connection.write(infoString.encode())  # Send infoString
         responce = serial_connection.readline().decode()  # Collect response
         found.append((serial_connection.port, serial_connection.portstr, responce))
-        if responce == expectedResponce:
+        if response_matches(responce, expectedResponce):
             logging.info("Found the device!")
             success = True
             break
@@ -146,8 +331,132 @@ def connect_device(serial_connection, expectedResponce, infoString = None):
         success = False
 
     (serial_connection.timeout, serial_connection.writeTimeout) = save_timeout
+    logging.info("Device discovery took {:.2f} s".format(time.perf_counter() - start_time))
     return (success, found)
 
+def discover_device(serial_connection, expectedResponce, infoString = None, cache_file = DEFAULT_PORT_CACHE, max_workers = 16, timeout = 0.1):
+    """ Same as connect_device, but faster:
+        port where device was found last time (remembered in cache_file) is tried first,
+        then all candidate ports are probed at the same time and the first match wins.
+        serial_connection is opened on the found port.
+
+        Returns a tuple
+        1) Boolean indicating whether device was found
+        2) list of tuples containing information about ports that answered (port, port string, responce), matching port is the last one
+        """
+    start_time = time.perf_counter()
+    if serial_connection.isOpen():
+        serial_connection.close()
+
+    found = []
+    match = None
+    cached_port = read_port_cache(cache_file)
+    if cached_port is not None:
+        responce = probe_port(cached_port, infoString, timeout)
+        if responce is not None:
+            found.append((cached_port, str(cached_port), responce))
+            if response_matches(responce, expectedResponce):
+                match = cached_port
+
+    if match is None:
+        ports = [port for port in candidate_ports() if port != cached_port]
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers)
+        futures = {pool.submit(probe_port, port, infoString, timeout): port for port in ports}
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                responce = future.result()
+                if responce is None:
+                    continue
+                port = futures[future]
+                found.append((port, str(port), responce))
+                if response_matches(responce, expectedResponce):
+                    match = port
+                    break
+        finally:
+            # probes still running finish on their own
+            pool.shutdown(wait = False, cancel_futures = True)
+
+    elapsed = time.perf_counter() - start_time
+    if match is None:
+        msg = "Could not find the device in {:.2f} s\nDevices i saw:\n".format(elapsed)
+        for (port, portStr, responce) in found:
+            msg += '  - PortNr:{}, PortString:"{}", Responce:"{}"\n'.format(port, portStr, responce)
+        logging.warn(msg)
+        return (False, found)
+
+    serial_connection.port = match
+    serial_connection.open()
+    write_port_cache(cache_file, match)
+    logging.info("Found the device on port {} in {:.2f} s".format(match, elapsed))
+    return (True, found)
+
+def discover_devices(expectedResponce, infoString = None, max_workers = 16, timeout = 0.1, ports = None):
+    """ Probes all candidate ports (or given ports) at the same time.
+        Ports are left closed.
+
+        Returns a tuple
+        1) list of (port, responce) of every port where device answered with expectedResponce
+        2) list of tuples containing information about ports that answered (port, port string, responce)
+        """
+    start_time = time.perf_counter()
+    if ports is None:
+        ports = candidate_ports()
+    found = []
+    matches = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+        for (port, responce) in zip(ports, pool.map(lambda port: probe_port(port, infoString, timeout), ports)):
+            if responce is None:
+                continue
+            found.append((port, str(port), responce))
+            if response_matches(responce, expectedResponce):
+                matches.append((port, responce))
+    logging.info("Found {} devices in {:.2f} s".format(len(matches), time.perf_counter() - start_time))
+    return (matches, found)
+
+def candidate_ports(max_port = 255):
+    """ returns list of ports to look for the device - ports the system lists if possible, otherwise port numbers 0..max_port """
+    try:
+        from serial.tools import list_ports
+        ports = [port_info[0] for port_info in list_ports.comports()]
+    except ImportError:
+        ports = []
+    if ports:
+        return ports
+    return list(range(max_port + 1))
+
+def probe_port(port, infoString = None, timeout = 0.1):
+    """ opens port, sends infoString and returns the response
+        (None if port could not be opened) """
+    try:
+        with serial.Serial(port, timeout = timeout, writeTimeout = timeout) as connection:
+            if infoString is not None:
+                connection.write(infoString.encode())  # Send infoString
+            return connection.readline().decode('ascii', 'replace')  # Collect response
+    except (serial.SerialException, OSError, ValueError):
+        return None
+
+def read_port_cache(cache_file):
+    """ returns port remembered in cache_file or None """
+    if cache_file is None:
+        return None
+    try:
+        with open(cache_file) as f:
+            port = f.read().strip()
+    except OSError:
+        return None
+    if not port:
+        return None
+    return int(port) if port.isdigit() else port
+
+def write_port_cache(cache_file, port):
+    if cache_file is None:
+        return
+    try:
+        with open(cache_file, 'w') as f:
+            f.write(str(port))
+    except OSError as e:
+        logging.warning("Could not remember device port: " + str(e))
+
 def connect_to_next_open_port(serial_connection, min_port = 0, max_port = 255):
     """Generator - every iteration opens next open port with serial_connection"""
     for port_nr in range(min_port, max_port + 1):
@@ -0,0 +1,187 @@
+"""
+Capturing raw bytes from serial port and replaying them.
+
+CaptureSerial wraps an opened (or openable) serial port and writes every
+received chunk with its arrival time into a capture file.
+ReplaySerial reads a capture file and acts like a serial port (inWaiting, read,
+write, isOpen), either with the original timing or as fast as possible,
+so SerialMonitorThread and CmdParser can be run on reproducible input.
+
+File format: MAGIC followed by records of
+arrival time (float64, seconds since start of capture), length (uint32) and bytes.
+"""
+
+import time
+import struct
+import threading
+
+MAGIC = b"TCCAP001"
+RECORD_HEADER = struct.Struct("<dI")
+
+
+class CaptureWriter(object):
+    """ Writes received chunks into capture file """
+
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def write(self, data, timestamp = None):
+        if timestamp is None:
+            timestamp = time.perf_counter() - self._start
+        with self._lock:
+            self._file.write(RECORD_HEADER.pack(timestamp, len(data)))
+            self._file.write(data)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_capture(path):
+    """ returns list of (arrival time, bytes) records in capture file """
+    with open(path, 'rb') as f:
+        content = f.read()
+    if not content.startswith(MAGIC):
+        raise ValueError("{} is not a serial capture".format(path))
+    records = []
+    position = len(MAGIC)
+    while position + RECORD_HEADER.size <= len(content):
+        (timestamp, length) = RECORD_HEADER.unpack_from(content, position)
+        position += RECORD_HEADER.size
+        records.append((timestamp, content[position:position + length]))
+        position += length
+    return records
+
+
+class CaptureSerial(object):
+    """
+    Serial port wrapper that tees everything read from serial_port into capture file at path.
+    Everything else (write, open, port, timeout...) goes to serial_port.
+    """
+
+    def __init__(self, serial_port, path):
+        object.__setattr__(self, "serial_port", serial_port)
+        object.__setattr__(self, "capture", CaptureWriter(path))
+
+    def __getattr__(self, name):
+        return getattr(self.serial_port, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.serial_port, name, value)
+
+    def read(self, size = 1):
+        data = self.serial_port.read(size)
+        if data:
+            self.capture.write(data)
+        return data
+
+    def readline(self, *args, **kwargs):
+        data = self.serial_port.readline(*args, **kwargs)
+        if data:
+            self.capture.write(data)
+        return data
+
+    def close(self):
+        self.serial_port.close()
+        self.capture.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplaySerial(object):
+    """
+    Acts like an opened serial port that receives bytes of a capture file.
+    realtime - bytes become available at their original arrival times (scaled by speed),
+               otherwise one captured chunk becomes available on every inWaiting() call.
+    Written bytes are collected into "written".
+    """
+
+    def __init__(self, path, realtime = True, speed = 1.0, timeout = 0):
+        self.records = read_capture(path)
+        self.realtime = realtime
+        self.speed = speed
+        self.timeout = timeout
+        self.writeTimeout = 0
+        self.port = path
+        self.portstr = path
+        self.written = bytearray()
+
+        self._next_record = 0  # first record that has not become available yet
+        self._available = bytearray()  # bytes that have arrived but are not read yet
+        self._start = time.perf_counter()
+        self._open = True
+
+    def _arrive(self):
+        """ moves records that have arrived into available bytes """
+        if self.realtime:
+            elapsed = (time.perf_counter() - self._start) * self.speed
+            while self._next_record < len(self.records) and self.records[self._next_record][0] <= elapsed:
+                self._available += self.records[self._next_record][1]
+                self._next_record += 1
+        elif not self._available and self._next_record < len(self.records):
+            self._available += self.records[self._next_record][1]
+            self._next_record += 1
+
+    def _wait(self, timeout):
+        """ waits until something arrives or timeout passes (None - forever) """
+        end = None if timeout is None else time.perf_counter() + timeout
+        while not self._available and self._next_record < len(self.records):
+            due = self._start + self.records[self._next_record][0] / self.speed
+            now = time.perf_counter()
+            if end is not None and due > end:
+                time.sleep(max(0, end - now))
+                return
+            time.sleep(max(0, due - now))
+            self._arrive()
+
+    def isOpen(self):
+        return self._open
+
+    def open(self):
+        self._open = True
+
+    def close(self):
+        self._open = False
+
+    def inWaiting(self):
+        self._arrive()
+        return len(self._available)
+
+    def read(self, size = 1):
+        self._arrive()
+        if not self._available and self.realtime and self.timeout != 0:
+            self._wait(self.timeout)
+        data = bytes(self._available[:size])
+        del self._available[:size]
+        return data
+
+    def write(self, data):
+        self.written += data
+        return len(data)
+
+    def flushInput(self):
+        self._available.clear()
+
+    @property
+    def exhausted(self):
+        """ True if everything in capture has been read """
+        return self._next_record >= len(self.records) and not self._available
+
+    def rewind(self):
+        """ starts replaying from the beginning """
+        self._next_record = 0
+        self._available.clear()
+        self._start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,370 @@
+"""
+Software model of the thermal camera device.
+
+Answers the same commands as the firmware (Microcontroller software/ThermalCamera)
+and sends scans of a synthetic scene, so the PC software can be run without hardware.
+SimulatedServoCamera adds the time servos take to move and settle, sensor lag and noise.
+PtyDevice serves the model over a pseudo terminal (POSIX only).
+"""
+
+import os
+import time
+import math
+import random
+import struct
+import select
+import threading
+import collections
+
+import mlx90614 as sensor
+from serialHelpers import FrameDecoder, BINARY_LINE_START
+from thermalcamera import SERVO_MAX, SERVO_MIN, servo_position
+
+SCAN_MAX_RESOLUTION = 128  # binary scan line buffer size in firmware (higher grids are sent as text)
+
+
+def celsius2reading(celsius):
+    """ Converts celsius to sensor reading """
+    return int(round((celsius + 273.15) * 50))
+
+
+def default_scene(servo_a, servo_b):
+    """ Room temperature with a warm spot in the middle of servo range
+        returns sensor reading at given servo positions """
+    center = (SERVO_MAX + SERVO_MIN) / 2
+    distance2 = (servo_a - center) ** 2 + (servo_b - center) ** 2
+    celsius = 22 + 15 * math.exp(-distance2 / (2 * 30 ** 2))
+    return celsius2reading(celsius)
+
+
+class SimulatedThermalCamera(object):
+    """
+    Behaves like the firmware: receive() takes bytes sent by PC and returns the answer bytes,
+    while scanning every scan_step() returns the next data-point.
+    scene(servo_a, servo_b) gives the sensor reading at servo positions.
+    """
+
+    def __init__(self, scene = default_scene, resolution = 64, step_size = 3, ambient = 22, binary_supported = True, height = None):
+        self.scene = scene
+        self.width = resolution  # scanning resolution (servo A)
+        self.height = resolution if height is None else height  # scanning resolution (servo B)
+        self.step_size = step_size  # scanning step size (in servo units)
+        self.ambient = celsius2reading(ambient)
+        self.servos = [(SERVO_MAX + SERVO_MIN) // 2] * 2  # servo A and B positions
+        self.binary_supported = binary_supported  # False behaves like older firmware (no binary lines, windows or grid)
+        self.binary = False  # send scan data as binary lines
+        self._scan_line = []  # readings of current scan line (binary protocol)
+
+        self.scanning = False
+        self._scan_x = 0
+        self._scan_y = 0
+        self._scan_dir = 1
+        self._window = (0, 0, self.width - 1, self.height - 1)  # scanned window (inclusive)
+        self._stride = 1
+        self._scan_lines = False  # scan is sent as binary lines
+
+        self._decoder = FrameDecoder()
+
+    def receive(self, data):
+        """ takes bytes sent to device, returns bytes device answers """
+        return b''.join(self.parse_command(command) for command in self._decoder.feed(data))
+
+    @staticmethod
+    def send_cmd(cmd, message):
+        return ("<{}:{}>\r\n".format(cmd, message)).encode()
+
+    def warning(self, message):
+        return self.send_cmd("WARNING", message)
+
+    def parse_command(self, command):
+        """ executes one command (without framing), returns answer bytes """
+        try:
+            answer = self._parse_command(command)
+        except (ValueError, IndexError):
+            answer = None
+        if answer is None:
+            return self.warning("Command could not be parsed.")
+        return answer
+
+    def _parse_command(self, command):
+        """ returns answer bytes or None if command could not be parsed """
+        if command == "i?":
+            if self.binary_supported:
+                return self.send_cmd("INFO", "dev=ThermalCamera,proto=bin1,scan=window")
+            return self.send_cmd("INFO", "dev=ThermalCamera")
+        if command[:1] == "p" and self.binary_supported:
+            if command[1:2] == "=":
+                self.binary = command[2:3] == "1"
+            elif command[1:] != "?":
+                return None
+            return self.send_cmd("PROTO", "1" if self.binary else "0")
+        if command == "s":
+            self.scan_init()
+            return b''
+        if command.startswith("s=") and self.binary_supported:
+            (x0, y0, x1, y1, stride) = (int(value) for value in command[2:].split(',')[:5])
+            if not (0 <= x0 <= x1 < self.width and 0 <= y0 <= y1 < self.height and stride > 0):
+                return self.warning("Scan window has to be inside grid.") + self.warning("Command could not be parsed.")
+            self.scan_init((x0, y0, x1, y1), stride)
+            return b''
+        if command[:1] == "g" and self.binary_supported:
+            if command[1:2] == "=":
+                (width, height, step_size) = (int(value) for value in command[2:].split(',')[:3])
+                servo_range = SERVO_MAX - SERVO_MIN
+                if min(width, height, step_size) <= 0 or step_size > 255 or max(width, height) * step_size > servo_range:
+                    return self.warning("Grid has to fit into servo range.") + self.warning("Command could not be parsed.")
+                self.scanning = False
+                (self.width, self.height, self.step_size) = (width, height, step_size)
+            elif command[1:] != "?":
+                return None
+            return self.send_cmd("GRID", "{},{},{}".format(self.width, self.height, self.step_size))
+        if command == "a?":
+            return self.send_cmd("ABSPOS", "{},{}".format(*self.servos))
+        if command.startswith("a="):
+            (a, b) = (int(value) for value in command[2:].split(',')[:2])
+            return self.set_servo(0, a) + self.set_servo(1, b)
+        if command.startswith("r="):
+            (a, b) = (int(value) for value in command[2:].split(',')[:2])
+            return self.set_servo(0, self.servos[0] + a) + self.set_servo(1, self.servos[1] + b)
+        if command[:1] in ("A", "B"):
+            servo_nr = "AB".index(command[0])
+            if command[1:] == "?":
+                return self.send_cmd("OCRA", self.servos[servo_nr])
+            if command[1:2] == "=":
+                return self.set_servo(servo_nr, int(command[2:]))
+            return None
+        if command == "to?":
+            if self.read_failed():
+                return None  # like failed MLX read in firmware - only "Command could not be parsed."
+            return self.send_cmd("OBJECT", self.read_object())
+        if command == "ta?":
+            return self.send_cmd("AMBIENT", self.ambient)
+        return self.warning("Unknown command.") + self.warning("Command could not be parsed.")
+
+    def set_servo(self, servo_nr, value):
+        if value < SERVO_MIN or value > SERVO_MAX:
+            return self.warning("Servo position value has to be between {} and {}. ({} was set)".format(SERVO_MIN, SERVO_MAX, value))
+        self.servos[servo_nr] = value
+        return b''
+
+    def read_failed(self):
+        """ true if asked reading ("to?") fails """
+        return False
+
+    def read_object(self):
+        reading = self.scene(*self.servos)
+        return min(max(reading, sensor.MIN_READING), sensor.MAX_READING)
+
+    def scan_init(self, window = None, stride = 1):
+        """ starts scanning window (x0, y0, x1, y1 - inclusive, whole grid if None), every stride-th position """
+        if window is None:
+            window = (0, 0, self.width - 1, self.height - 1)
+        (x0, y0, x1, y1) = window
+        self._window = (x0, y0, x1, y0 + (y1 - y0) // stride * stride)  # last y that is reached
+        self._stride = stride
+        # binary lines always start from y=0 and have one value for every position
+        self._scan_lines = self.binary and y0 == 0 and y1 == self.height - 1 and stride == 1 and self.height <= SCAN_MAX_RESOLUTION and self.width <= 256
+        self.scanning = True
+        self._scan_x = x0
+        self._scan_y = y0
+        self._scan_dir = 1
+        self._scan_line = [0] * self.height
+        self._scan_move_servos()
+
+    def scan_step(self):
+        """ takes a reading and moves to next scan position, returns data-point bytes """
+        if not self.scanning:
+            return b''
+        line_x = self._scan_x
+        (unused_x0, y0, x1, y1) = self._window  # @UnusedVariable
+        if self._scan_lines:
+            self._scan_line[self._scan_y] = self.read_object()
+            answer = b''
+        else:
+            answer = self.send_cmd("Scan", "{}:{}:{}".format(self._scan_x, self._scan_y, self.read_object()))
+
+        # serpentine - y goes up and down, x increases at the ends
+        if self._scan_dir == 1 and self._scan_y >= y1:
+            self._scan_y = y1
+            self._scan_x += self._stride
+            self._scan_dir = -1
+        elif self._scan_dir == -1 and self._scan_y <= y0:
+            self._scan_x += self._stride
+            self._scan_dir = 1
+        else:
+            self._scan_y += self._scan_dir * self._stride
+
+        if self._scan_lines and self._scan_x != line_x:
+            answer = self.scan_line(line_x, self._scan_line)
+
+        if self._scan_x > x1:
+            self.scanning = False
+        else:
+            self._scan_move_servos()
+        return answer
+
+    @staticmethod
+    def scan_line(line, values):
+        """ returns binary scan line (see serialHelpers.ScanLine) """
+        body = struct.pack("<BB{}H".format(len(values)), line, len(values), *values)
+        checksum = 0
+        for byte in body:
+            checksum ^= byte
+        return bytes([BINARY_LINE_START]) + body + bytes([checksum])
+
+    def _scan_move_servos(self):
+        self.servos = list(servo_position(self._scan_x, self._scan_y, (self.width, self.height, self.step_size)))
+
+
+class ServoModel(object):
+    """
+    Position of a hobby servo: after a new setpoint it moves towards it at constant speed
+    (servo units per second), overshoots and rings out with time constant settle (seconds).
+    """
+
+    def __init__(self, position, speed = 1200, settle = 0.015, overshoot = 0.1, clock = time.perf_counter):
+        self.speed = speed
+        self.settle = settle
+        self.overshoot = overshoot  # overshoot as part of moved distance
+        self.clock = clock
+        self._start = position
+        self.setpoint = position
+        self._set_time = clock()
+
+    def set(self, setpoint):
+        self._start = self.position()
+        self.setpoint = setpoint
+        self._set_time = self.clock()
+
+    def position(self):
+        """ returns current (not rounded) position """
+        distance = self.setpoint - self._start
+        travel = abs(distance) / self.speed
+        elapsed = self.clock() - self._set_time
+        if elapsed < travel:
+            return self._start + distance * elapsed / travel
+        ringing = (elapsed - travel) / self.settle
+        return self.setpoint + self.overshoot * distance * math.exp(-ringing) * math.cos(math.pi * ringing)
+
+
+class SimulatedServoCamera(SimulatedThermalCamera):
+    """
+    SimulatedThermalCamera with servos and sensor that take time:
+    servos move like ServoModel, sensor reading follows the scene
+    with time constant sensor_lag (seconds) and has gaussian noise (standard deviation in readings).
+    Servo positions reported to PC are setpoints (like output compare registers in firmware).
+    failures - probability that an asked reading fails
+    """
+
+    def __init__(self, scene = default_scene, speed = 1200, settle = 0.015, sensor_lag = 0.002, noise = 5, seed = None, failures = 0, **kwargs):
+        SimulatedThermalCamera.__init__(self, scene, **kwargs)
+        self.models = [ServoModel(position, speed, settle) for position in self.servos]
+        self.sensor_lag = sensor_lag
+        self.noise = noise
+        self.failures = failures
+        self._random = random.Random(seed)
+        self._reading = None  # filtered reading of sensor and time it was updated
+        self._reading_time = None
+
+    def set_servo(self, servo_nr, value):
+        answer = SimulatedThermalCamera.set_servo(self, servo_nr, value)
+        if self.servos[servo_nr] == value:
+            self.models[servo_nr].set(value)
+        return answer
+
+    def read_failed(self):
+        return self._random.random() < self.failures
+
+    def _scan_move_servos(self):
+        SimulatedThermalCamera._scan_move_servos(self)
+        for (model, setpoint) in zip(self.models, self.servos):
+            model.set(setpoint)
+
+    def read_object(self):
+        now = time.perf_counter()
+        target = self.scene(*(model.position() for model in self.models))
+        if self._reading is None:
+            self._reading = target
+        else:
+            self._reading = target + (self._reading - target) * math.exp(-(now - self._reading_time) / self.sensor_lag)
+        self._reading_time = now
+        reading = int(round(self._reading + self._random.gauss(0, self.noise)))
+        return min(max(reading, sensor.MIN_READING), sensor.MAX_READING)
+
+
+class PtyDevice(threading.Thread):
+    """
+    Thread that serves a SimulatedThermalCamera over a pseudo terminal.
+    Open "port" (the slave side name) like a real serial port.
+    latency - seconds bytes take over the link in each direction (USB polling and
+    transfer of the real device), commands are executed and answers arrive that much later.
+    """
+
+    def __init__(self, device = None, step_interval = 0.001, latency = 0):
+        import pty
+        import tty
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.device = device if device is not None else SimulatedThermalCamera()
+        self.step_interval = step_interval  # seconds between scan data-points
+        self.latency = latency
+        self._incoming = collections.deque()  # (due time, bytes) received from PC
+        self._outgoing = collections.deque()  # (due time, bytes) to send to PC
+
+        (self._master, self._slave) = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+        self._running = threading.Event()  # flag for signalling the stopping of thread
+        self._running.set()
+
+    def run(self):
+        next_step = time.perf_counter()  # time of next scan data-point
+        while self._running.is_set():
+            now = time.perf_counter()
+            while self._incoming and self._incoming[0][0] <= now:
+                self._send(self.device.receive(self._incoming.popleft()[1]))
+            while self._outgoing and self._outgoing[0][0] <= now:
+                self._write(self._outgoing.popleft()[1])
+            if self.device.scanning and next_step <= now:
+                self._send(self.device.scan_step())
+                next_step += self.step_interval
+                continue
+            if not self.device.scanning:
+                next_step = now
+
+            due = [queued[0][0] for queued in (self._incoming, self._outgoing) if queued]
+            if self.device.scanning:
+                due.append(next_step)
+            timeout = max(0, min(due) - now) if due else 0.1
+            (readable, unused_w, unused_x) = select.select([self._master], [], [], timeout)  # @UnusedVariable
+            if readable:
+                try:
+                    data = os.read(self._master, 4096)
+                except OSError:
+                    break
+                if self.latency > 0:
+                    self._incoming.append((time.perf_counter() + self.latency, data))
+                else:
+                    self._send(self.device.receive(data))
+
+    def _send(self, data):
+        """ sends answer bytes to PC (after latency) """
+        if self.latency > 0 and data:
+            self._outgoing.append((time.perf_counter() + self.latency, data))
+        else:
+            self._write(data)
+
+    def _write(self, data):
+        while data:
+            written = os.write(self._master, data)
+            data = data[written:]
+
+    def join(self, timeout = None):
+        self._running.clear()  # Signal thread to stop
+        threading.Thread.join(self, timeout)  # Wait until it does
+
+    def close(self):
+        self.join()
+        os.close(self._master)
+        os.close(self._slave)
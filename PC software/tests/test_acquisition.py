@@ -0,0 +1,76 @@
+"""
+Frames of acquisition.AcquisitionEngine complete when readings fail.
+Messages are given to the command parser directly (serial port is not opened).
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import serial
+import numpy as np
+
+from acquisition import AcquisitionEngine
+from recorder import FrameRecorder, FrameReplay
+from serialHelpers import ScanLine
+
+SIZE = 4
+
+
+class FailedReadingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = AcquisitionEngine(serial.Serial(), SIZE)
+        self.frames = []
+        self.engine.add_frame_callback(self.frames.append)
+        self.engine.start_scan()
+        self.engine.outgoing.get_nowait()  # scan command is not sent anywhere
+
+    def test_text_scan_with_failed_reading_completes_frame(self):
+        messages = ["Scan:{}:{}:{}".format(x, y, 15000) for x in range(SIZE) for y in range(SIZE)]
+        messages[5] = "Scan:0"
+        self.engine.cmd_parser.parse_messages(messages)
+        self.assertEqual(len(self.frames), 1)
+
+    def test_failed_reading_between_batches_completes_frame(self):
+        messages = ["Scan:{}:{}:{}".format(x, y, 15000) for x in range(SIZE) for y in range(SIZE)]
+        self.engine.cmd_parser.parse_messages(messages[:-1])
+        self.assertEqual(self.frames, [])
+        self.engine.cmd_parser.parse_messages(["Scan:0"])
+        self.assertEqual(len(self.frames), 1)
+
+    def test_binary_scan_line_with_failed_reading_completes_frame(self):
+        for x in range(SIZE):
+            values = np.full(SIZE, 15000, dtype = '<u2')
+            if x == 2:
+                values[1] = 0
+            self.engine.cmd_parser.parse_messages([ScanLine(x, values.tobytes())])
+        self.assertEqual(len(self.frames), 1)
+        self.assertEqual(self.frames[0][1, 2], 0)  # failed position has no reading
+        self.assertEqual(self.engine.thermal_data.statistics().count, SIZE * SIZE - 1)
+
+
+class RecorderExtremesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_recorder_gets_extremes_of_completed_frame(self):
+        engine = AcquisitionEngine(serial.Serial(), SIZE)
+        path = os.path.join(self.directory, "frames.rec")
+        with FrameRecorder(path, (SIZE, SIZE), thermal_data = engine.thermal_data) as recorder:
+            (ys, xs) = np.indices((SIZE, SIZE))
+            engine.thermal_data.set_datapoints(xs, ys, np.full(SIZE * SIZE, 12000))
+            engine.add_frame_callback(recorder)
+            engine.start_scan((0, 0, 1, 1))  # frame has readings outside of scanned window too
+            engine.cmd_parser.parse_messages(["Scan:0:0:14000", "Scan:0:1:14001", "Scan:1:0:14002", "Scan:1:1:14003"])
+        record = FrameReplay(path)[0]
+        self.assertEqual((record["minimum"], record["maximum"]), (14000, 14003))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+asyncserial.AsyncThermalCamera against the simulated device served over a pseudo terminal
+(simulator.PtyDevice). POSIX only.
+"""
+
+import os
+import asyncio
+import unittest
+
+from asyncserial import open_camera, ReadingFailed
+from simulator import PtyDevice, SimulatedThermalCamera, SimulatedServoCamera
+from thermaldata import ThermalData
+from thermalcamera import default_step_size
+
+SIZE = 8
+
+
+@unittest.skipIf(os.name != "posix", "asyncserial works on POSIX only")
+class AsyncThermalCameraTest(unittest.TestCase):
+
+    def setUp(self):
+        self.device = None
+
+    def tearDown(self):
+        if self.device is not None:
+            self.device.close()
+
+    def serve(self, device = None):
+        """ returns port of a pseudo terminal serving device (SimulatedThermalCamera if not given) """
+        self.device = PtyDevice(device if device is not None else SimulatedThermalCamera(resolution = SIZE))
+        self.device.start()
+        return self.device.port
+
+    def run_with_camera(self, port, test, timeout = 1.0):
+        """ opens camera on port, runs coroutine test(camera) and closes camera """
+        async def run():
+            camera = await open_camera(port, ThermalData(SIZE), timeout)
+            try:
+                return await test(camera)
+            finally:
+                camera.close()
+        return asyncio.run(run())
+
+    def test_read_info(self):
+        info = self.run_with_camera(self.serve(), lambda camera: camera.read_info())
+        self.assertEqual(info["dev"], "ThermalCamera")
+        self.assertIn("bin1", info["proto"].split('|'))
+
+    def test_negotiate_protocol(self):
+        device = SimulatedThermalCamera(resolution = SIZE)
+        port = self.serve(device)
+        self.assertTrue(self.run_with_camera(port, lambda camera: camera.negotiate_protocol()))
+        self.assertTrue(device.binary)
+        self.assertFalse(self.run_with_camera(port, lambda camera: camera.negotiate_protocol(binary = False)))
+        self.assertFalse(device.binary)  # switched back although device kept binary of previous session
+
+    def test_set_grid(self):
+        step_size = default_step_size(SIZE // 2, SIZE)
+        grid = self.run_with_camera(self.serve(), lambda camera: camera.set_grid(SIZE // 2, SIZE, step_size))
+        self.assertEqual(grid, (SIZE // 2, SIZE, step_size))
+
+    def test_start_scan_resolves_when_scan_is_received(self):
+        for binary in (False, True):
+            with self.subTest(binary = binary):
+                async def scan(camera):
+                    await camera.negotiate_protocol(binary = binary)
+                    await camera.start_scan(timeout = 10)
+                    return (camera.thermal_data.points_received, camera.thermal_data.snapshot())
+                (points, data) = self.run_with_camera(self.serve(), scan)
+                self.device.close()
+                self.device = None
+                self.assertEqual(points, SIZE * SIZE)
+                self.assertTrue(data.all())
+
+    def test_window_scan_resolves(self):
+        async def scan(camera):
+            await camera.start_scan(10, (2, 2, 5, 3), 1)
+            return camera.thermal_data.points_received
+        self.assertEqual(self.run_with_camera(self.serve(), scan), 4 * 2)
+
+    def test_request_times_out_without_answer(self):
+        port = self.serve()
+        self.device.join()  # device stops answering, pseudo terminal stays open
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_with_camera(port, lambda camera: camera.read_info(), timeout = 0.1)
+
+    def test_failed_reading_raises(self):
+        port = self.serve(SimulatedServoCamera(resolution = SIZE, failures = 1))
+        with self.assertRaises(ReadingFailed):
+            self.run_with_camera(port, lambda camera: camera.ask_temp_object())
+
+    def test_answers_after_failed_reading_go_to_right_requests(self):
+        async def ask(camera):
+            (reading, info) = await asyncio.gather(camera.ask_temp_object(), camera.read_info(), return_exceptions = True)
+            return (reading, info)
+        (reading, info) = self.run_with_camera(self.serve(SimulatedServoCamera(resolution = SIZE, failures = 1)), ask)
+        self.assertIsInstance(reading, ReadingFailed)
+        self.assertEqual(info["dev"], "ThermalCamera")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+Batched parsing of text scan messages by cmdparser.CmdParser (thread is not started).
+"""
+
+import unittest
+
+from cmdparser import CmdParser
+from thermaldata import ThermalData
+
+SIZE = 4
+
+
+class ObserverError(ValueError):
+    """ ValueError raised by an observer, not by parsing """
+
+
+class FailingObserver(object):
+
+    def __init__(self):
+        self.notifications = 0
+
+    def update_notification(self):
+        self.notifications += 1
+        raise ObserverError("observer failed")
+
+
+class ParseScansTest(unittest.TestCase):
+
+    def setUp(self):
+        self.thermal_data = ThermalData(SIZE)
+        self.parser = CmdParser(None, self.thermal_data)
+
+    def test_batch_is_set_at_once(self):
+        self.assertTrue(self.parser.parse_messages(["Scan:0:0:14000", "Scan:1:2:14001", "Scan:3:3:14002"]))
+        self.assertEqual(self.thermal_data.points_received, 3)
+        self.assertEqual(self.thermal_data.data[2, 1], 14001)
+
+    def test_invalid_message_is_skipped(self):
+        self.assertTrue(self.parser.parse_messages(["Scan:0:0:14000", "Scan:9:0:14001", "Scan:1:x:14002", "Scan:3:3:14003"]))
+        self.assertEqual(self.thermal_data.points_received, 2)
+        self.assertEqual((self.thermal_data.data[0, 0], self.thermal_data.data[3, 3]), (14000, 14003))
+
+    def test_observer_error_is_not_taken_for_corrupted_batch(self):
+        observer = FailingObserver()
+        self.thermal_data.attach(observer)
+        with self.assertRaises(ObserverError):
+            self.parser.parse_messages(["Scan:0:0:14000", "Scan:1:1:14001"])
+        self.assertEqual(observer.notifications, 1)  # batch was not replayed one by one
+        self.assertEqual(self.thermal_data.points_received, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
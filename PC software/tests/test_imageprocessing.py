@@ -0,0 +1,82 @@
+"""
+Shift correction and estimation of imageprocessing against straightforward implementations.
+"""
+
+import unittest
+
+import numpy as np
+
+from imageprocessing import ShiftCorrector, MAXIMUM_SHIFT, estimate_shift
+from simulator import default_scene
+from thermalcamera import default_step_size, servo_position
+from benchmarks.shift import legacy_shift_correction
+
+SHAPES = ((8, 8), (9, 16), (12, 5), (16, 9))
+SHIFTS = (0, 1, -1, 2, -3, MAXIMUM_SHIFT, -MAXIMUM_SHIFT)
+
+
+def per_pixel_shift_correction(data, shift):
+    """ corrected image one pixel at a time: even columns rolled down by floor(shift / 2), odd ones by floor(-shift / 2) """
+    (height, width) = data.shape
+    corrected = np.empty_like(data)
+    for x in range(width):
+        roll = (shift if x % 2 == 0 else -shift) // 2
+        for y in range(height):
+            corrected[y, x] = data[(y - roll) % height, x]
+    return corrected
+
+
+def scene_frame(size, noise = 5, seed = 0):
+    """ simulated scene scanned with size x size grid, with gaussian noise (readings) """
+    grid = (size, size, default_step_size(size, size))
+    frame = np.array([[default_scene(*servo_position(x, y, grid)) for x in range(size)] for y in range(size)], dtype = float)
+    return frame + np.random.RandomState(seed).normal(0, noise, frame.shape)
+
+
+class ShiftCorrectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.corrector = ShiftCorrector(MAXIMUM_SHIFT)
+        self.random = np.random.RandomState(0)
+
+    def test_same_as_per_pixel_loop(self):
+        for shape in SHAPES:
+            data = self.random.randint(0, 1000, shape)
+            for shift in SHIFTS:
+                with self.subTest(shape = shape, shift = shift):
+                    np.testing.assert_array_equal(self.corrector.correct(data, shift), per_pixel_shift_correction(data, shift))
+
+    def test_same_as_legacy_column_loop(self):
+        for shape in SHAPES:
+            data = self.random.random_sample(shape)
+            for shift in range(-MAXIMUM_SHIFT, MAXIMUM_SHIFT + 1):
+                with self.subTest(shape = shape, shift = shift):
+                    np.testing.assert_array_equal(self.corrector.correct(data, shift), legacy_shift_correction(data, shift))
+
+    def test_columns_are_corrected_into_out(self):
+        data = self.random.randint(0, 1000, (12, 10))
+        out = np.zeros_like(data)
+        self.corrector.correct(data, 3, out, slice(2, 5))
+        expected = per_pixel_shift_correction(data, 3)
+        np.testing.assert_array_equal(out[:, 2:5], expected[:, 2:5])
+        self.assertFalse(out[:, :2].any() or out[:, 5:].any())
+
+    def test_too_large_shift_is_refused(self):
+        with self.assertRaises(ValueError):
+            self.corrector.correct(np.zeros((8, 8)), MAXIMUM_SHIFT + 1)
+
+
+class EstimateShiftTest(unittest.TestCase):
+
+    def test_finds_shift_of_scanned_scene(self):
+        corrector = ShiftCorrector(MAXIMUM_SHIFT)
+        frame = scene_frame(64)
+        for shift in range(-MAXIMUM_SHIFT, MAXIMUM_SHIFT + 1):
+            shifted = corrector.correct(frame, -shift)  # inverse of correction
+            for fft in (False, True):
+                with self.subTest(shift = shift, fft = fft):
+                    self.assertEqual(estimate_shift(shifted, MAXIMUM_SHIFT, fft), shift)
+
+
+if __name__ == '__main__':
+    unittest.main()
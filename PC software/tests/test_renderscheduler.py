@@ -0,0 +1,131 @@
+"""
+renderscheduler.RenderScheduler with a stand-in event loop and clock (nothing really waits).
+"""
+
+import unittest
+
+from renderscheduler import RenderScheduler
+
+
+class Loop(object):
+    """ after(), after_cancel() and a thread-safe wakeup that are run by hand, clock moves only with run_next() """
+
+    def __init__(self):
+        self.now = 0.0
+        self.jobs = {}  # id -> (due, function)
+        self.woken = []  # functions given to wakeup
+        self._ids = 0
+
+    def clock(self):
+        return self.now
+
+    def after(self, delay, function):
+        self._ids += 1
+        self.jobs[self._ids] = (self.now + delay / 1000, function)
+        return self._ids
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def wakeup(self, function):
+        self.woken.append(function)
+
+    def run_next(self):
+        """ runs the next due job (or functions given to wakeup), returns false if there is nothing to run """
+        if self.woken:
+            self.woken.pop(0)()
+            return True
+        if not self.jobs:
+            return False
+        job = min(self.jobs, key = lambda job: self.jobs[job][0])
+        (due, function) = self.jobs.pop(job)
+        self.now = max(self.now, due)
+        function()
+        return True
+
+
+class RenderSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = Loop()
+        self.pixels = 0
+        self.drawn_pixels = 0
+        self.renders = 0
+
+    def render(self):
+        drawn = self.pixels != self.drawn_pixels
+        self.drawn_pixels = self.pixels
+        self.renders += int(drawn)
+        return drawn
+
+    def scheduler(self, wakeup = True, **kwargs):
+        scheduler = RenderScheduler(self.loop.after, self.loop.after_cancel, self.render, lambda: self.pixels,
+                                    self.loop.wakeup if wakeup else None, clock = self.loop.clock, **kwargs)
+        scheduler.start()
+        return scheduler
+
+    def run_until_idle(self, limit = 100):
+        for unused_variable in range(limit):  # @UnusedVariable
+            if not self.loop.run_next():
+                return
+        self.fail("event loop did not become idle")
+
+    def test_parks_without_timer_when_nothing_arrives(self):
+        self.scheduler()
+        self.run_until_idle()
+        self.assertEqual(self.loop.jobs, {})
+
+    def test_wake_draws_new_data(self):
+        scheduler = self.scheduler()
+        self.run_until_idle()
+        self.pixels += 64
+        scheduler.wake()
+        scheduler.wake()  # many wakes make one wakeup
+        self.assertEqual(len(self.loop.woken), 1)
+        self.run_until_idle()
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(self.loop.jobs, {})
+
+    def test_data_written_while_parking_is_not_lost(self):
+        scheduler = self.scheduler()
+        writes = [64]
+
+        def render():
+            drawn = self.render()
+            if writes:
+                self.pixels += writes.pop()  # data arrives after the check but before scheduler parks, its wake() is missed
+                scheduler.wake()
+            return drawn
+        scheduler._render = render
+        self.run_until_idle()
+        self.assertEqual(self.drawn_pixels, self.pixels)
+
+    def test_wake_after_stop_does_nothing(self):
+        scheduler = self.scheduler()
+        self.run_until_idle()
+        self.pixels += 64
+        scheduler.wake()
+        scheduler.stop()
+        self.run_until_idle()
+        self.assertEqual(self.renders, 0)
+
+    def test_idle_checks_grow_without_limit_without_wakeup(self):
+        self.scheduler(wakeup = False)
+        waits = []
+        for unused_variable in range(12):  # @UnusedVariable
+            before = self.loop.now
+            self.loop.run_next()
+            waits.append(self.loop.now - before)
+        self.assertGreater(waits[-1], 10)
+        self.assertEqual(len(self.loop.jobs), 1)
+
+    def test_idle_interval_limits_checks_without_wakeup(self):
+        self.scheduler(wakeup = False, idle_interval = 1.0)
+        for unused_variable in range(12):  # @UnusedVariable
+            self.loop.run_next()
+        (due, unused_function) = next(iter(self.loop.jobs.values()))  # @UnusedVariable
+        self.assertLessEqual(due - self.loop.now, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+"""
+scanscheduler.ScanScheduler scanning the simulated device over a pseudo terminal (simulator.PtyDevice).
+POSIX only.
+"""
+
+import os
+import asyncio
+import unittest
+
+from asyncserial import open_camera
+from simulator import PtyDevice, SimulatedServoCamera
+from scanscheduler import ScanScheduler, DwellController
+from thermaldata import ThermalData
+from thermalcamera import default_step_size
+
+SIZE = 4
+
+
+@unittest.skipIf(os.name != "posix", "asyncserial works on POSIX only")
+class ScanSchedulerTest(unittest.TestCase):
+
+    def scan(self, failures, pipelined = True):
+        """ returns thermal data after one scan of a device where asked readings fail with probability failures """
+        device = PtyDevice(SimulatedServoCamera(resolution = SIZE, step_size = default_step_size(SIZE, SIZE), seed = 0, failures = failures))
+        device.start()
+
+        async def scan():
+            camera = await open_camera(device.port, ThermalData(SIZE), timeout = 1.0)
+            try:
+                dwell = DwellController(per_unit = 0, minimum = 0.001, maximum = 0.001, adaptive = False)
+                await ScanScheduler(camera, dwell = dwell, pipelined = pipelined, probe_every = 0).scan()
+                return camera.thermal_data
+            finally:
+                camera.close()
+        try:
+            return asyncio.run(scan())
+        finally:
+            device.close()
+
+    def test_every_position_is_read(self):
+        for pipelined in (False, True):
+            with self.subTest(pipelined = pipelined):
+                thermal_data = self.scan(0, pipelined)
+                self.assertTrue(thermal_data.frame_complete)
+                self.assertTrue(thermal_data.data.all())
+
+    def test_failed_readings_are_marked_missing(self):
+        thermal_data = self.scan(1)
+        self.assertTrue(thermal_data.frame_complete)  # failed positions count towards frame
+        self.assertFalse(thermal_data.data.any())
+        self.assertEqual(thermal_data.statistics().count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Frame handoff of thermaldata.ThermalData between a writer thread and a reader:
+snapshot() never returns a copy that mixes readings of two batches
+(writer from benchmarks/handoff.py, every batch has one reading).
+"""
+
+import time
+import unittest
+
+import numpy as np
+
+import mlx90614 as sensor
+from thermaldata import ThermalData
+from benchmarks.handoff import Writer, torn
+
+SIZE = 64
+DURATION = 0.5  # seconds of stress per case
+
+
+class HandoffTest(unittest.TestCase):
+
+    def check_snapshots(self, lines):
+        thermal_data = ThermalData(SIZE)
+        (ys, xs) = np.indices((SIZE, SIZE))
+        thermal_data.set_datapoints(xs, ys, np.full(SIZE * SIZE, sensor.MIN_READING))
+        writer = Writer(thermal_data, lines)
+        writer.start()
+        (snapshots, torn_snapshots) = (0, 0)
+        end = time.perf_counter() + DURATION
+        try:
+            while time.perf_counter() < end:
+                torn_snapshots += torn(thermal_data.snapshot(), lines)
+                snapshots += 1
+        finally:
+            writer.join()
+        self.assertGreater(writer.batches, 1)
+        self.assertGreater(snapshots, 1)
+        self.assertEqual(torn_snapshots, 0)
+
+    def test_snapshot_of_frames_is_not_torn(self):
+        self.check_snapshots(lines = False)
+
+    def test_snapshot_of_scan_lines_is_not_torn(self):
+        self.check_snapshots(lines = True)
+
+    def test_statistics_count_every_data_point(self):
+        thermal_data = ThermalData(SIZE)
+        writer = Writer(thermal_data, lines = False)
+        writer.start()
+        end = time.perf_counter() + DURATION
+        try:
+            while time.perf_counter() < end:
+                self.assertEqual(thermal_data.statistics().count, SIZE * SIZE)
+        finally:
+            writer.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
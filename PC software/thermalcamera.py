@@ -1,22 +1,130 @@
+import queue
+import threading
+
+# Servo limits (output compare register values) - same as in firmware
+SERVO_MAX = 608
+SERVO_MIN = 175
+DEFAULT_GRID = (64, 64, 3)  # width, height and step size of firmware after reset
+
+
+def default_step_size(width, height, maximum = 3):
+    """ largest step size (servo units, up to maximum) at which grid fits into servo range """
+    return max(1, min(maximum, (SERVO_MAX - SERVO_MIN) // max(width, height)))
+
+
+def scan_command(window = None, stride = 1):
+    """ returns scan command for window (x0, y0, x1, y1 - inclusive) and stride (whole grid: no window, stride 1) """
+    if window is None and stride == 1:
+        return "s"
+    return "s={},{},{},{},{}".format(*(tuple(window) + (stride,)))
+
+
+def scan_points(width, height, window = None, stride = 1):
+    """ returns number of data-points a scan of window (every stride-th position) sends """
+    (x0, y0, x1, y1) = (0, 0, width - 1, height - 1) if window is None else window
+    return len(range(x0, x1 + 1, stride)) * len(range(y0, y1 + 1, stride))
+
+
+def window_around(x, y, size, width, height):
+    """ returns window of size x size positions centred at x, y (moved to fit into grid) """
+    size_x = min(size, width)
+    size_y = min(size, height)
+    x0 = min(max(x - size_x // 2, 0), width - size_x)
+    y0 = min(max(y - size_y // 2, 0), height - size_y)
+    return (x0, y0, x0 + size_x - 1, y0 + size_y - 1)
+
+
+def servo_position(x, y, grid = DEFAULT_GRID):
+    """ returns servo A and B positions of grid position x, y (grid - width, height, step size) like firmware scan does """
+    (width, height, step_size) = grid
+    padding_x = ((SERVO_MAX - SERVO_MIN) - width * step_size) // 2
+    padding_y = ((SERVO_MAX - SERVO_MIN) - height * step_size) // 2
+    return (SERVO_MIN + padding_x + x * step_size, SERVO_MAX - padding_y - y * step_size)  # Flipped up-down
+
+
+class ServoSetpoint(object):
+    """
+    Outgoing queue item for a servo position. Becomes the command text ("A=value")
+    only when it is sent, so it carries the latest position set while it waited in queue.
+    If a bounded queue throws it away, next set_servo() queues a new one.
+    """
+
+    def __init__(self, thermal_camera, servo_nr):
+        self.thermal_camera = thermal_camera
+        self.servo_nr = servo_nr
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = self.thermal_camera._take_setpoint(self.servo_nr)
+        return self._text
+
+    def dropped(self):
+        self.thermal_camera._setpoint_dropped(self.servo_nr)
+
+
 class ThermalCamera(object):
 
     def __init__(self, outgoing):
         self.outgoing = outgoing
+        self.servo_positions = [None, None]  # last positions set for servos A and B
+        self.grid = DEFAULT_GRID  # scanning grid width, height and step size
+        # at most one setpoint per servo waits in outgoing queue, newer positions replace its value
+        self._setpoint_queued = [False, False]
+        self._setpoint_lock = threading.Lock()
+
+    def start_scan(self, window = None, stride = 1):
+        """ scans whole grid or window (x0, y0, x1, y1 - inclusive), every stride-th position
+            (windows and strides need firmware that answers "scan=window" in info) """
+        if window is None and stride != 1:
+            (width, height) = self.grid[:2]
+            window = (0, 0, width - 1, height - 1)
+        self.outgoing.put_nowait(scan_command(window, stride))
 
-    def start_scan(self):
-        self.outgoing.put_nowait("s")
+    def set_grid(self, width, height, step_size = None):
+        """ sets scanning grid size and distance between positions (servo units, fitted to range if not given) """
+        if step_size is None:
+            step_size = default_step_size(width, height)
+        self.grid = (width, height, step_size)
+        self.outgoing.put_nowait("g={},{},{}".format(width, height, step_size))
 
     def ask_info(self):
         self.outgoing.put_nowait("i?")
 
+    def set_binary_protocol(self, enabled):
+        """ asks device to send scan data as binary lines (if enabled) or text data-points """
+        self.outgoing.put_nowait("p=1" if enabled else "p=0")
+
     def set_servo(self, servo_nr, value):
+        """ sets servo position - if previous position has not been sent yet, only the new one is sent """
+        servo_nr = 0 if servo_nr == 0 else 1
+        with self._setpoint_lock:
+            self.servo_positions[servo_nr] = value
+            if self._setpoint_queued[servo_nr]:
+                return
+            self._setpoint_queued[servo_nr] = True
+        try:
+            self.outgoing.put_nowait(ServoSetpoint(self, servo_nr))  # if a bounded queue drops it, dropped() is called
+        except queue.Full:
+            self._setpoint_dropped(servo_nr)
+            raise
+
+    def _setpoint_dropped(self, servo_nr):
+        """ setpoint of servo was not queued or was thrown away from queue, next set_servo() queues a new one """
+        with self._setpoint_lock:
+            self._setpoint_queued[servo_nr] = False
+
+    def _take_setpoint(self, servo_nr):
+        """ returns command for latest position of servo, next set_servo() queues a new setpoint """
+        with self._setpoint_lock:
+            self._setpoint_queued[servo_nr] = False
+            value = self.servo_positions[servo_nr]
         if servo_nr == 0:
             output = "A"
         else:
             output = "B"
-        output += "=" + str(value)
+        return output + "=" + str(value)
 
-        self.outgoing.put_nowait(output)
     def ask_temp_object(self):
         self.outgoing.put_nowait("to?")
     def ask_temp_ambient(self):
@@ -1,6 +1,11 @@
+import time
+import threading
+
 import mlx90614 as sensor
 import numpy as np
 
+from framestatistics import FrameStatistics
+
 class Observable(object):
     """
         Subclassing this class will make objects "observable"
@@ -27,47 +32,302 @@ class Observable(object):
 
 
 class ThermalData(Observable):
+    """
+    Grid of sensor readings, written by one thread (parser) and read by others (GUI).
+
+    Writes are seqlock-style: sequence is odd while a write is in progress and
+    grows by 2 with every write. Readers never lock - snapshot(), extremes() and
+    read_consistent() repeat reading until no write happened during it, so they get
+    whole written batches (binary scan lines, frames), never half of one.
+    Writers are serialised with a lock that is held only while writing
+    (readers take it only if writes keep interrupting them).
 
-    def __init__(self, size):
+    Histogram counts, percentiles and minimum and maximum of frame are updated
+    with every write (framestatistics.FrameStatistics, see statistics()).
+    """
+
+    def __init__(self, size, height = None):
+        """ size is grid width (x), grid is square if height (y) is not given """
         Observable.__init__(self)
-        self.size = size
+        self.width = size
+        self.height = size if height is None else height
+        self.size = size  # grid width, kept for square grids
 
+        # Data is stored as raw sensor readings (16 bit), 0 - no reading
         # For testing purposes, data is initially random
-        random_data = sensor.MIN_READING + np.random.random((self.size, self.size)) * (sensor.MAX_READING - sensor.MIN_READING)
-        self._data = np.array(random_data)  # dtype needed? , dtype = float
-        # self._data = np.zeros((self.size,self.size))
+        self._data = np.random.randint(sensor.MIN_READING, sensor.MAX_READING + 1, (self.height, self.width)).astype(np.uint16)
+        # self._data = np.zeros((self.height,self.width), dtype = np.uint16)
+
+        # histogram of data and minimum and maximum reading of frame, updated on every write
+        self._statistics = FrameStatistics()
+        self._statistics.add(self._data)
+        # flat index of every data-point, scratch space for finding repeated positions in batches
+        self._positions = np.zeros(self._data.shape, dtype = np.intp)
 
-        # variables to hold maximal and minimal value encountered
-        self.maximum = None
-        self.minimum = None
+        # number of data-points set since frame was started and number of data-points in frame (see new_frame())
+        self.points_received = 0
+        self.frame_points = self.width * self.height
+        self.points_written = 0  # data-points set since data was created (never reset)
+        self._frame_extremes = (None, None)  # minimum and maximum reading of previous frame (see new_frame())
+
+        # changed region for every consumer that tracks changes (see track_changes())
+        # consumer -> [first row, last row, first column, last column] or None if nothing has changed
+        self._changes = {}
+        self._changes_lock = threading.Lock()
+
+        self._sequence = 0  # odd while data is being written (see read_consistent())
+        self._write_lock = threading.Lock()
 
     def set_datapoint(self, x, y, value):
         # Limit x,y and value
-        if x < 0 or x >= self.size:
-            raise ValueError(("x-coordinate must be between {} and {} but it is {}").format(0, self.size, x))
-        if y < 0 or y >= self.size:
-            raise ValueError(("y-coordinate must be between {} and {} but it is {}").format(0, self.size, y))
+        if x < 0 or x >= self.width:
+            raise ValueError(("x-coordinate must be between {} and {} but it is {}").format(0, self.width, x))
+        if y < 0 or y >= self.height:
+            raise ValueError(("y-coordinate must be between {} and {} but it is {}").format(0, self.height, y))
         if value > sensor.MAX_READING or value < sensor.MIN_READING:
             raise ValueError(("value must be between MIN({}) and MAX({}) but it is {}").format(sensor.MIN_READING, sensor.MAX_READING, value))
 
-        # Remember maximum value in image
-        if self.maximum == None or self.maximum < value:
-            self.maximum = value
-        if self.minimum == None or self.minimum > value:
-            self.minimum = value
-
         # set data-point and notify observers of change
-        self._data[y][x] = value
+        self._begin_write()
+        try:
+            self._statistics.update_extremes(value, value)
+            self._statistics.replace_value(self._data[y][x], value)
+            self._data[y][x] = value
+            self.points_received += 1
+            self.points_written += 1
+            if self._changes:
+                self._mark_changed(y, y, x, x)
+        finally:
+            self._end_write()
+        self.notify()
+
+    def set_datapoints(self, xs, ys, values):
+        """
+        Sets many data-points at once and notifies observers only once.
+        xs, ys and values are sequences (or numpy arrays) of equal length.
+        """
+        xs = np.ravel(xs)
+        ys = np.ravel(ys)
+        values = np.ravel(values)
+        if values.size == 0:
+            return
+        (batch_minimum, batch_maximum) = self.check_datapoints(xs, ys, values)
+
+        # set data-points and notify observers of change
+        self._begin_write()
+        try:
+            self._statistics.update_extremes(batch_minimum, batch_maximum)
+            # if a position repeats in batch, only the last value is kept (like in data),
+            # old reading of the position is counted out once
+            order = np.arange(values.size)
+            self._positions[ys, xs] = order
+            kept = self._positions[ys, xs] == order
+            self._statistics.remove(self._data[ys[kept], xs[kept]])
+            self._statistics.add(values[kept])
+
+            self._data[ys, xs] = values
+            self.points_received += values.size
+            self.points_written += values.size
+            if self._changes:
+                self._mark_changed(ys.min(), ys.max(), xs.min(), xs.max())
+        finally:
+            self._end_write()
+        self.notify()
+
+    def check_datapoints(self, xs, ys, values):
+        """
+        Raises ValueError if any data-point is outside of grid or its value outside of sensor range
+        (set_datapoints() would refuse them), returns (minimum, maximum) of values.
+        """
+        xs = np.ravel(xs)
+        ys = np.ravel(ys)
+        values = np.ravel(values)
+        if xs.size != values.size or ys.size != values.size:
+            raise ValueError(("number of coordinates must be {} but it is {}, {}").format(values.size, xs.size, ys.size))
+        bad = (xs < 0) | (xs >= self.width)
+        if bad.any():
+            raise ValueError(("x-coordinate must be between {} and {} but it is {}").format(0, self.width, xs[bad][0]))
+        bad = (ys < 0) | (ys >= self.height)
+        if bad.any():
+            raise ValueError(("y-coordinate must be between {} and {} but it is {}").format(0, self.height, ys[bad][0]))
+        if values.size == 0:
+            return (None, None)
+        batch_maximum = values.max()
+        batch_minimum = values.min()
+        if batch_maximum > sensor.MAX_READING or batch_minimum < sensor.MIN_READING:
+            bad = (values > sensor.MAX_READING) | (values < sensor.MIN_READING)
+            raise ValueError(("value must be between MIN({}) and MAX({}) but it is {}").format(sensor.MIN_READING, sensor.MAX_READING, values[bad][0]))
+        return (batch_minimum, batch_maximum)
+
+    def set_failed(self, xs = None, ys = None, count = 1):
+        """
+        Counts data-points whose reading failed towards the frame (so that frame completes)
+        and notifies observers. If positions xs, ys are given, their old readings are
+        cleared (0 - no reading) and their number is counted,
+        otherwise count data-points of unknown position are counted (data is kept).
+        """
+        if xs is not None:
+            xs = np.ravel(xs)
+            ys = np.ravel(ys)
+            count = xs.size
+            bad = (xs < 0) | (xs >= self.width)
+            if bad.any():
+                raise ValueError(("x-coordinate must be between {} and {} but it is {}").format(0, self.width, xs[bad][0]))
+            bad = (ys < 0) | (ys >= self.height)
+            if bad.any():
+                raise ValueError(("y-coordinate must be between {} and {} but it is {}").format(0, self.height, ys[bad][0]))
+        if count == 0:
+            return
+
+        self._begin_write()
+        try:
+            if xs is not None:
+                # repeated positions are counted out once (see set_datapoints())
+                order = np.arange(xs.size)
+                self._positions[ys, xs] = order
+                kept = self._positions[ys, xs] == order
+                self._statistics.remove(self._data[ys[kept], xs[kept]])
+                self._data[ys, xs] = 0
+                self.points_written += count
+                if self._changes:
+                    self._mark_changed(ys.min(), ys.max(), xs.min(), xs.max())
+            self.points_received += count
+        finally:
+            self._end_write()
         self.notify()
 
     def clear_data(self):
-        self._data.fill(0)
+        self._begin_write()
+        try:
+            self._data.fill(0)
+            self._statistics.clear()
+            self.points_received = 0
+            if self._changes:
+                self._mark_changed(0, self.height - 1, 0, self.width - 1)
+        finally:
+            self._end_write()
         self.notify()
 
+    def _begin_write(self):
+        self._write_lock.acquire()
+        self._sequence += 1  # odd - readers have to wait
+
+    def _end_write(self):
+        self._sequence += 1
+        self._write_lock.release()
+
+    @property
+    def sequence(self):
+        """ number that grows by 2 with every write (odd while a write is in progress),
+            readers can compare it to know if data has changed """
+        return self._sequence
+
+    def read_consistent(self, read, retries = 16):
+        """
+        calls read() (that reads data or extremes) until no write happened during the call,
+        returns its result. Does not block writer, read() should be short.
+        If writes keep coming (retries attempts failed), read() is called holding the write lock.
+        """
+        for unused_variable in range(retries):  # @UnusedVariable
+            sequence = self._sequence
+            if sequence % 2 == 0:
+                result = read()
+                if self._sequence == sequence:
+                    return result
+            time.sleep(0)  # let writer finish
+        with self._write_lock:
+            return read()
+
+    def snapshot(self, rows = slice(None), columns = slice(None), out = None):
+        """ returns consistent copy of data (region of rows and columns slices), written into out if given """
+        if out is None:
+            out = np.empty_like(self._data[rows, columns])
+        return self.read_consistent(lambda: np.copyto(out, self._data[rows, columns]) or out)
+
+    def extremes(self):
+        """ returns consistent (minimum, maximum) reading of frame (since new_frame() or clear_data()) """
+        return self.read_consistent(lambda: (self._statistics.minimum, self._statistics.maximum))
+
+    def frame_extremes(self):
+        """ returns consistent (minimum, maximum) reading of previous frame (the one new_frame() finished),
+            frame callbacks get extremes of the frame they are given from here """
+        return self.read_consistent(lambda: self._frame_extremes)
+
+    def statistics(self):
+        """ returns consistent copy of statistics (framestatistics.FrameStatistics) of data """
+        return self.read_consistent(self._statistics.copy)
+
+    @property
+    def minimum(self):
+        """ lowest reading of frame, None if nothing was set """
+        return self._statistics.minimum
+
+    @property
+    def maximum(self):
+        """ highest reading of frame, None if nothing was set """
+        return self._statistics.maximum
+
+    def new_frame(self, points = None):
+        """ Starts counting data-points of a new frame (data is kept)
+            points - number of data-points in frame (whole grid if not given, less for window scans) """
+        self._begin_write()
+        try:
+            self._frame_extremes = (self._statistics.minimum, self._statistics.maximum)
+            self._statistics.new_frame()
+        finally:
+            self._end_write()
+        self.points_received = 0
+        self.frame_points = self.width * self.height if points is None else points
+
+    def track_changes(self, consumer):
+        """
+        Starts tracking the region of data that changes, for consumer (any hashable object).
+        Consumer can fetch the changed region with take_changes() and work only on that.
+        Initially whole data is considered changed.
+        """
+        with self._changes_lock:
+            self._changes[consumer] = [0, self.height - 1, 0, self.width - 1]
+
+    def untrack_changes(self, consumer):
+        with self._changes_lock:
+            del self._changes[consumer]
+
+    def take_changes(self, consumer):
+        """
+        returns region changed since last call as (rows, columns) slices of data
+        or None if nothing has changed. Region is reset for this consumer.
+        """
+        with self._changes_lock:
+            region = self._changes[consumer]
+            self._changes[consumer] = None
+        if region is None:
+            return None
+        (first_row, last_row, first_column, last_column) = region
+        return (slice(first_row, last_row + 1), slice(first_column, last_column + 1))
+
+    def _mark_changed(self, first_row, last_row, first_column, last_column):
+        """ grows changed region (bounding box) of every consumer """
+        (first_row, last_row, first_column, last_column) = (int(first_row), int(last_row), int(first_column), int(last_column))
+        with self._changes_lock:
+            for (consumer, region) in self._changes.items():
+                if region is None:
+                    self._changes[consumer] = [first_row, last_row, first_column, last_column]
+                else:
+                    region[0] = min(region[0], first_row)
+                    region[1] = max(region[1], last_row)
+                    region[2] = min(region[2], first_column)
+                    region[3] = max(region[3], last_column)
+
+    @property
+    def frame_complete(self):
+        """ True if as many data-points as the frame has have been set since frame was started """
+        return self.points_received >= self.frame_points
+
     @property
     def data(self):
         """
         NB! Shouldn't be used to change contents of data.
         If really needed, don't forget to call notify()
+        Data can change while it is read in another thread, use snapshot() for a consistent copy.
         """
         return self._data